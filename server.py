@@ -5,17 +5,30 @@ MCP Web Search Server
 """
 
 import asyncio
+import contextlib
+import contextvars
 import importlib.metadata
 import ipaddress
 import json
 import logging
 import os
+import random
 import re
 import socket
+import sqlite3
+import ssl
+import sys
+import threading
 import time
-from urllib.parse import parse_qs, quote_plus, urlencode, urlparse
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict, deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+from urllib.parse import parse_qs, parse_qsl, quote_plus, urlencode, urlparse
 
 import aiohttp
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
 from bs4 import BeautifulSoup
 
 # Ensure brotli is available for aiohttp to handle br encoding
@@ -59,16 +72,1231 @@ if SOCKS_PROXY:
     except ImportError:
         logger.warning("aiohttp-socks not installed, SOCKS proxy unavailable")
 
+
+def _env_int(name: str, default: int) -> int:
+    """读取整数环境变量，非法值回退到默认值"""
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"环境变量 {name}={value!r} 不是合法整数，使用默认值 {default}")
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    """读取浮点数环境变量，非法值回退到默认值"""
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(f"环境变量 {name}={value!r} 不是合法数字，使用默认值 {default}")
+        return default
+
+
+# 连接池配置（进程级共享 session/connector）
+POOL_LIMIT = _env_int("WEB_SEARCH_POOL_LIMIT", 100)  # 总连接数上限
+POOL_LIMIT_PER_HOST = _env_int("WEB_SEARCH_POOL_LIMIT_PER_HOST", 10)  # 单主机连接数上限
+POOL_KEEPALIVE_TIMEOUT = _env_float(
+    "WEB_SEARCH_KEEPALIVE_TIMEOUT", 30.0
+)  # 空闲连接保活秒数
+
+# DNS 缓存配置（SSRF 检查与连接器共用）
+DNS_CACHE_TTL = _env_float("WEB_SEARCH_DNS_TTL", 60.0)  # DNS 解析结果缓存秒数
+DNS_CACHE_MAX_SIZE = _env_int("WEB_SEARCH_DNS_CACHE_SIZE", 1024)  # 最多缓存的主机数
+
+# 搜索结果缓存配置
+SEARCH_CACHE_MAX_ENTRIES = _env_int("WEB_SEARCH_CACHE_MAX_ENTRIES", 100)  # 最大条目数
+SEARCH_CACHE_MAX_BYTES = _env_int(
+    "WEB_SEARCH_CACHE_MAX_BYTES", 8 * 1024 * 1024
+)  # 近似内存上限（字节）
+SEARCH_CACHE_TTL = _env_int("WEB_SEARCH_CACHE_TTL", 300)  # 条目有效期（秒）
+SEARCH_CACHE_STALE_SECONDS = _env_int(
+    "WEB_SEARCH_CACHE_STALE_SECONDS", 0
+)  # 过期后仍可先返回旧结果并后台刷新的宽限期（秒），0 表示关闭
+# 共享缓存后端：memory（仅进程内）/ sqlite（同一主机多进程共享）/ redis（多节点共享）
+CACHE_DB_PATH = os.environ.get("WEB_SEARCH_CACHE_DB")  # SQLite 数据库文件路径
+CACHE_BACKEND = os.environ.get(
+    "WEB_SEARCH_CACHE_BACKEND", "sqlite" if CACHE_DB_PATH else "memory"
+).lower()
+CACHE_REDIS_URL = os.environ.get(
+    "WEB_SEARCH_CACHE_REDIS_URL", "redis://localhost:6379/0"
+)
+CACHE_REDIS_TIMEOUT = _env_float(
+    "WEB_SEARCH_CACHE_REDIS_TIMEOUT", 1.0
+)  # 单次往返超时（秒）
+# 共享缓存键前缀：格式版本与包版本无关，滚动升级时新旧实例可以互相命中
+CACHE_KEY_PREFIX = "hsm:v1:"
+CACHE_DB_MAX_ENTRIES = _env_int("WEB_SEARCH_CACHE_DB_MAX_ENTRIES", 10000)
+CACHE_DB_MAX_BYTES = _env_int("WEB_SEARCH_CACHE_DB_MAX_BYTES", 64 * 1024 * 1024)
+PAGE_CACHE_TTL = _env_int("WEB_SEARCH_PAGE_CACHE_TTL", 600)  # 网页内容有效期（秒）
+PAGE_CACHE_MAX_ENTRIES = _env_int("WEB_SEARCH_PAGE_CACHE_MAX_ENTRIES", 500)
+PAGE_CACHE_MAX_BYTES = _env_int("WEB_SEARCH_PAGE_CACHE_MAX_BYTES", 4 * 1024 * 1024)
+# 过期后仍保留带 ETag/Last-Modified 的页面用于条件请求的时长（秒）
+PAGE_CACHE_REVALIDATE_SECONDS = _env_int(
+    "WEB_SEARCH_PAGE_CACHE_REVALIDATE_SECONDS", 86400
+)
+# 规范化 URL 时去掉的跟踪参数（utm_* 另外按前缀匹配）
+TRACKING_PARAMS = frozenset(
+    {
+        "gclid",
+        "dclid",
+        "fbclid",
+        "msclkid",
+        "yclid",
+        "igshid",
+        "mc_cid",
+        "mc_eid",
+        "_hsenc",
+        "_hsmi",
+    }
+)
+# 负缓存配置：失败/空结果/验证码在短时间内直接返回空结果，连续失败时指数退避
+NEGATIVE_CACHE_TTL = _env_float(
+    "WEB_SEARCH_NEGATIVE_CACHE_TTL", 10.0
+)  # 首次失败的缓存秒数，0 表示关闭
+NEGATIVE_CACHE_MAX_TTL = _env_float(
+    "WEB_SEARCH_NEGATIVE_CACHE_MAX_TTL", 300.0
+)  # 退避上限（秒）
+# 这些失败通常针对出口 IP 而非具体查询，命中后整个引擎一起退避
+ENGINE_WIDE_FAILURES = frozenset({"captcha", "short_page", "timeout"})
+# 这些失败来自本地（时间预算、限流），与查询和引擎无关，不写入负缓存
+LOCAL_FAILURES = frozenset({"deadline", "rate_limited"})
+# 熔断器：引擎连续失败达到阈值后熔断，冷却期内直接跳过，之后放行一次试探请求
+CIRCUIT_FAILURE_THRESHOLD = _env_int("WEB_SEARCH_CIRCUIT_FAILURES", 5)  # <= 0 表示关闭
+CIRCUIT_RESET_SECONDS = _env_float("WEB_SEARCH_CIRCUIT_RESET_SECONDS", 60.0)
+# 计入熔断的失败原因（空结果和调用方预算用尽不算引擎故障）
+CIRCUIT_FAILURES = frozenset(
+    {"captcha", "short_page", "http_status", "timeout", "error"}
+)
+# 每个引擎的令牌桶限速（次/秒，0 表示不限速）、突发容量和最大并发请求数（0 表示不限制）
+# 可通过 WEB_SEARCH_<ENGINE>_RATE / _BURST / _MAX_INFLIGHT 覆盖，如 WEB_SEARCH_GOOGLE_RATE=0.5
+ENGINE_RATE_LIMITS = {
+    engine: (
+        _env_float(f"WEB_SEARCH_{engine.upper()}_RATE", rate),
+        _env_int(f"WEB_SEARCH_{engine.upper()}_BURST", burst),
+        _env_int(f"WEB_SEARCH_{engine.upper()}_MAX_INFLIGHT", in_flight),
+    )
+    for engine, (rate, burst, in_flight) in {
+        "google": (1.0, 3, 2),
+        "bing": (2.0, 5, 4),
+        "duckduckgo": (5.0, 10, 8),
+        "duckduckgo_html": (3.0, 6, 4),
+        "serpapi": (0.0, 0, 8),
+        "tavily": (0.0, 0, 8),
+    }.items()
+}
+# 没有时间预算时，排队等待限流的最长秒数
+RATE_LIMIT_MAX_WAIT = _env_float("WEB_SEARCH_RATE_LIMIT_MAX_WAIT", 10.0)
+# 引擎统计与 auto 模式：按滚动统计选出预期能在时间预算内凑够结果的最便宜引擎组合
+ENGINE_STATS_WINDOW = _env_int(
+    "WEB_SEARCH_ENGINE_STATS_WINDOW", 100
+)  # 每个引擎保留最近多少次请求
+AUTO_MIN_SAMPLES = 5  # 样本不足的引擎总是被选中，以便积累统计
+AUTO_EXPLORE_RATE = _env_float(
+    "WEB_SEARCH_AUTO_EXPLORE_RATE", 0.1
+)  # 额外探索一个未选引擎的概率
+AUTO_API_COST = _env_float(
+    "WEB_SEARCH_AUTO_API_COST", 5.0
+)  # 付费 API 引擎的成本倍数（消耗额度）
+# 自适应超时：按引擎和阶段（建立连接 connect / 首字节 ttfb）的最近耗时 p99 × 系数计算，
+# 限制在 [下限, 调用处的默认总超时] 之间；样本不足时只使用默认总超时
+ADAPTIVE_TIMEOUT = (
+    os.environ.get("WEB_SEARCH_ADAPTIVE_TIMEOUT", "true").lower() == "true"
+)
+ADAPTIVE_TIMEOUT_FACTOR = _env_float("WEB_SEARCH_ADAPTIVE_TIMEOUT_FACTOR", 3.0)
+ADAPTIVE_TIMEOUT_FLOOR = _env_float("WEB_SEARCH_ADAPTIVE_TIMEOUT_FLOOR", 1.0)
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 20
+# 重试：连接被重置/断开或 5xx 时按带抖动的指数退避重试，受调用时间预算约束；
+# 进程级重试预算保证长期重试次数不超过请求数的 RETRY_BUDGET_RATIO（另有少量储备）
+RETRY_MAX_ATTEMPTS = _env_int(
+    "WEB_SEARCH_RETRY_MAX_ATTEMPTS", 2
+)  # 含首次请求，1 表示不重试
+RETRY_BASE_DELAY = _env_float("WEB_SEARCH_RETRY_BASE_DELAY", 0.2)  # 秒
+RETRY_MAX_DELAY = _env_float("WEB_SEARCH_RETRY_MAX_DELAY", 2.0)  # 秒
+RETRY_BUDGET_RATIO = _env_float("WEB_SEARCH_RETRY_BUDGET_RATIO", 0.1)
+RETRY_BUDGET_RESERVE = 10.0  # 低流量时也允许的少量重试
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+# 可以安全重试的方法；其余方法（POST 等）只在连接建立失败、请求尚未发出时重试
+IDEMPOTENT_METHODS = frozenset({"get", "head", "options"})
+# 对冲搜索：多引擎时按完成顺序合并，结果足够或到达软截止时间即返回并取消其余引擎
+HEDGE_ENABLED = os.environ.get("WEB_SEARCH_HEDGE", "true").lower() == "true"
+HEDGE_MIN_RESULTS = _env_int(
+    "WEB_SEARCH_HEDGE_MIN_RESULTS", 0
+)  # 去重结果数阈值，0 表示 max_results
+HEDGE_MIN_ENGINES = _env_int(
+    "WEB_SEARCH_HEDGE_MIN_ENGINES", 2
+)  # 至少几个引擎返回了结果
+HEDGE_SOFT_DEADLINE = _env_float(
+    "WEB_SEARCH_HEDGE_SOFT_DEADLINE", 5.0
+)  # 秒，<= 0 表示不设软截止
+# 镜像竞速：主域名在该秒数内没有响应就并行请求下一个镜像，< 0 表示逐个尝试
+MIRROR_HEDGE_DELAY = _env_float("WEB_SEARCH_MIRROR_HEDGE_DELAY", 1.0)
+MIRROR_STATS_DECAY = 0.95  # 镜像成功率统计的衰减系数，越小越偏重近期结果
+# DuckDuckGo 即时答案 API 与 HTML 页面的请求方式：
+# sequential（先 API，无结果再 HTML）/ parallel（同时请求）/ adaptive（同时请求，
+# 并按查询形态统计 API 命中率，命中率过低时跳过 API）
+DDG_MODE = os.environ.get("WEB_SEARCH_DDG_MODE", "sequential").lower()
+DDG_API_MIN_HIT_RATE = _env_float("WEB_SEARCH_DDG_API_MIN_HIT_RATE", 0.2)
+DDG_API_MIN_SAMPLES = 5  # 样本不足时不跳过 API
+DDG_API_EXPLORE_RATE = 0.1  # 被跳过的查询形态仍以该概率尝试 API，以便统计恢复
+# 每次工具调用的默认时间预算（毫秒），0 表示不限制；可被 deadline_ms 参数覆盖
+DEFAULT_DEADLINE_MS = _env_int("WEB_SEARCH_DEADLINE_MS", 0)
+# web_search_batch：单次调用最多的查询数和同时执行的查询数
+BATCH_MAX_QUERIES = _env_int("WEB_SEARCH_BATCH_MAX_QUERIES", 30)
+BATCH_CONCURRENCY = _env_int("WEB_SEARCH_BATCH_CONCURRENCY", 4)
+# get_webpage_content_batch：单次调用最多的 URL 数和同一主机同时下载的页面数
+BATCH_MAX_URLS = _env_int("WEB_SEARCH_BATCH_MAX_URLS", 20)
+BATCH_PER_HOST = _env_int("WEB_SEARCH_BATCH_PER_HOST", 2)
+# search_and_read：最多读取的结果页数和每页附带的正文摘录长度（字符）
+READ_MAX_PAGES = 10
+READ_EXCERPT_CHARS = _env_int("WEB_SEARCH_READ_EXCERPT_CHARS", 800)
+# 预取：web_search 返回后在后台下载前 K 个结果网页放入网页缓存，后续读取直接命中
+PREFETCH_COUNT = _env_int("WEB_SEARCH_PREFETCH_COUNT", 0)  # K，0 表示关闭
+PREFETCH_CONCURRENCY = _env_int(
+    "WEB_SEARCH_PREFETCH_CONCURRENCY", 2
+)  # 低优先级通道的并发数
+PREFETCH_PER_HOST = _env_int(
+    "WEB_SEARCH_PREFETCH_PER_HOST", 1
+)  # 同一主机同时预取的页面数
+# 已预取但尚未被读取的页面最多占用的网页缓存字节数
+PREFETCH_MAX_BYTES = _env_int("WEB_SEARCH_PREFETCH_MAX_BYTES", 512 * 1024)
+PREFETCH_PENDING_BYTES = 8 * 1024  # 下载中的页面按此预留（正文最多 2000 字符）
+CACHE_SWEEP_INTERVAL = _env_float(
+    "WEB_SEARCH_CACHE_SWEEP_INTERVAL", 60.0
+)  # 后台清理过期条目的间隔（秒），<= 0 表示禁用
+
 server = Server("web-search-server")
 
+# 当前引擎请求记录的失败原因（captcha / short_page / http_status / timeout / error ...）
+# 由 _cached_search 在每次请求前放入一个列表，search_* 方法通过 _note_failure() 追加
+_failure_reasons: contextvars.ContextVar[list[str] | None] = contextvars.ContextVar(
+    "failure_reasons", default=None
+)
+
+
+def _note_failure(reason: str) -> None:
+    """记录当前引擎请求的失败原因（不在引擎请求上下文中时忽略）"""
+    reasons = _failure_reasons.get()
+    if reasons is not None:
+        reasons.append(reason)
+
+
+# 当前请求所属的引擎，供连接追踪回调按引擎记录各阶段耗时
+_current_engine: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "current_engine", default=None
+)
+
+# 当前调用的截止时间（time.monotonic() 时刻），None 表示不限制
+# 由 handle_call_tool 通过 _deadline_scope() 设置，随 asyncio 任务的上下文传递
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar(
+    "deadline", default=None
+)
+
+
+@contextlib.contextmanager
+def _deadline_scope(deadline_ms: int | None):
+    """在当前上下文中设置截止时间（只会收紧已有的截止时间）"""
+    if not deadline_ms or deadline_ms <= 0:
+        yield
+        return
+    deadline = time.monotonic() + deadline_ms / 1000
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _remaining_budget() -> float | None:
+    """返回剩余的时间预算（秒），未设置截止时间时返回 None"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def _budget_exhausted() -> bool:
+    remaining = _remaining_budget()
+    return remaining is not None and remaining <= 0
+
+
+def _client_timeout(
+    total: float | None,
+    sock_connect: float | None = None,
+    sock_read: float | None = None,
+) -> aiohttp.ClientTimeout:
+    """返回不超过剩余时间预算的请求超时（sock_connect / sock_read 也不超过 total）
+
+    连接超时使用 sock_connect 而不是 connect：后者还包含等待连接池空闲连接的时间，
+    突发请求时排队等待不应被当作引擎连接超时。
+    """
+    remaining = _remaining_budget()
+    if remaining is not None:
+        total = remaining if total is None else min(total, remaining)
+        total = max(total, 0.001)
+    if total is not None:
+        sock_connect = None if sock_connect is None else min(sock_connect, total)
+        sock_read = None if sock_read is None else min(sock_read, total)
+    return aiohttp.ClientTimeout(
+        total=total, sock_connect=sock_connect, sock_read=sock_read
+    )
+
+
+def _failure_reason_for(error: BaseException) -> str:
+    """把异常归类为失败原因（调用方时间预算用尽导致的超时记为 deadline）"""
+    if isinstance(error, TimeoutError):
+        return "deadline" if _budget_exhausted() else "timeout"
+    return "error"
+
+
+def _is_private_address(ip: ipaddress.IPv4Address | ipaddress.IPv6Address) -> bool:
+    """判断 IP 是否为回环/链路本地/保留/私有/未指定地址"""
+    return (
+        ip.is_loopback
+        or ip.is_link_local
+        or ip.is_reserved
+        or ip.is_private
+        or ip.is_unspecified
+    )
+
+
+def _estimate_size(value: Any) -> int:
+    """粗略估算缓存值占用的字节数（字符串按 UTF-8 长度，容器递归求和）"""
+    if isinstance(value, str):
+        return len(value.encode("utf-8", "surrogatepass"))
+    if isinstance(value, bytes | bytearray):
+        return len(value)
+    if isinstance(value, dict):
+        return 64 + sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    if isinstance(value, list | tuple):
+        return 56 + sum(_estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """按最近使用排序的缓存，同时限制条目数与近似字节数
+
+    条目形如 (value, timestamp)，命中时 O(1) 提升到最近使用端，
+    超出任一上限时从最久未使用端淘汰。TTL 策略由调用方决定，expire() 用于批量清理。
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._data: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self._sizes: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def __getitem__(self, key: str) -> tuple[Any, float]:
+        """读取条目但不改变使用顺序"""
+        return self._data[key]
+
+    def __setitem__(self, key: str, entry: tuple[Any, float]) -> None:
+        size = _estimate_size(entry[0])
+        if key in self._data:
+            self._remove(key)
+        if size > self.max_bytes:
+            logger.debug(f"缓存条目过大 ({size} 字节)，不缓存: {key}")
+            return
+        self._data[key] = entry
+        self._sizes[key] = size
+        self.total_bytes += size
+        while len(self._data) > self.max_entries or self.total_bytes > self.max_bytes:
+            self._remove(next(iter(self._data)))
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self._data:
+            raise KeyError(key)
+        self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        del self._data[key]
+        self.total_bytes -= self._sizes.pop(key)
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        """读取条目并标记为最近使用"""
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data.move_to_end(key)
+        return entry
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        if key not in self._data:
+            return default
+        entry = self._data[key]
+        self._remove(key)
+        return entry
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._sizes.clear()
+        self.total_bytes = 0
+
+    def expire(self, ttl: float) -> int:
+        """删除写入时间早于 ttl 秒之前的条目，返回删除数量"""
+        cutoff = time.monotonic() - ttl
+        expired = [k for k, (_, ts) in self._data.items() if ts < cutoff]
+        for key in expired:
+            self._remove(key)
+        return len(expired)
+
+
+class SQLiteCache:
+    """基于 SQLite（WAL 模式）的持久化缓存
+
+    多个服务进程可以同时读写同一个数据库文件，重启或新会话可直接命中已有结果。
+    值以 JSON 存储，时间使用墙上时钟以便跨进程比较。超出条目数或字节上限时，
+    compact() 先删除过期条目，再按最近访问时间淘汰。
+    所有方法都是同步的，在事件循环中请通过 asyncio.to_thread() 调用。
+    """
+
+    COMPACT_EVERY = 200  # 每写入多少次自动整理一次
+
+    def __init__(self, path: str, max_entries: int, max_bytes: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, timeout=5.0, isolation_level=None, check_same_thread=False
+        )
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache (expires_at)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at)"
+            )
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        """返回 (值, 写入时间戳)，不存在或已过期时返回 None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM cache WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        try:
+            return json.loads(row[0]), row[1]
+        except json.JSONDecodeError:
+            self.delete(key)
+            return None
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """写入值，ttl 秒后过期"""
+        self.set_many({key: value}, ttl)
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[Any, float]]:
+        """批量读取，只返回存在且未过期的键"""
+        found = {}
+        for key in keys:
+            entry = self.get(key)
+            if entry is not None:
+                found[key] = entry
+        return found
+
+    def set_many(self, items: dict[str, Any], ttl: float) -> None:
+        """在同一事务中批量写入，累计每写入 COMPACT_EVERY 条整理一次"""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            payload = json.dumps(value, ensure_ascii=False)
+            rows.append(
+                (key, payload, len(payload.encode("utf-8")), now, now + ttl, now)
+            )
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO cache "
+                    "(key, value, size, stored_at, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+            before = self._writes
+            self._writes += len(rows)
+            should_compact = (
+                self._writes // self.COMPACT_EVERY > before // self.COMPACT_EVERY
+            )
+        if should_compact:
+            self.compact()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def compact(self) -> int:
+        """删除过期条目并把数据库收缩到上限以内，返回删除的条目数"""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM cache WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+            ).fetchone()
+            if count > self.max_entries or total > self.max_bytes:
+                # 按最近访问时间从旧到新淘汰，直到条目数和字节数都满足上限
+                excess_entries = max(0, count - self.max_entries)
+                excess_bytes = max(0, total - self.max_bytes)
+                doomed = []
+                freed = 0
+                for key, size in self._conn.execute(
+                    "SELECT key, size FROM cache ORDER BY accessed_at"
+                ):
+                    if len(doomed) >= excess_entries and freed >= excess_bytes:
+                        break
+                    doomed.append((key,))
+                    freed += size
+                self._conn.executemany("DELETE FROM cache WHERE key = ?", doomed)
+                removed += len(doomed)
+            if removed:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CacheBackend(ABC):
+    """共享缓存后端接口
+
+    进程内 LRU 缓存之外的第二级缓存，供多个进程或多个节点共享。
+    值统一以 (value, stored_at) 形式返回，stored_at 为写入时的墙上时钟时间戳。
+    调用方把任何异常都视为缓存未命中。
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def get_many(self, keys: list[str]) -> dict[str, tuple[Any, float]]:
+        """批量读取，只返回命中的 key"""
+
+    @abstractmethod
+    async def set_many(self, items: dict[str, Any], ttl: float) -> None:
+        """批量写入，ttl 秒后过期"""
+
+    async def get(self, key: str) -> tuple[Any, float] | None:
+        return (await self.get_many([key])).get(key)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self.set_many({key: value}, ttl)
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """删除单个 key"""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """清空本服务写入的所有条目"""
+
+    async def compact(self) -> None:  # noqa: B027 可选钩子，默认无需处理
+        """整理存储（默认无需处理）"""
+
+    async def close(self) -> None:  # noqa: B027 可选钩子，默认无需处理
+        """释放连接等资源"""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """进程内缓存后端：直接读写 WebSearcher 的内存 LRU 缓存，不跨进程共享
+
+    "page:" 开头的键对应网页内容缓存，其余对应搜索结果缓存，
+    因此不会在内存中再保存一份副本。LRU 中的时间戳为 time.monotonic()，
+    读写时与墙上时钟互相换算；有效期由调用方按时间戳判断，这里只受 LRU 上限约束。
+    """
+
+    name = "memory"
+
+    def __init__(self, search_cache: LRUCache, page_cache: LRUCache):
+        self.search_cache = search_cache
+        self.page_cache = page_cache
+
+    def _cache_for(self, key: str) -> LRUCache:
+        return self.page_cache if key.startswith("page:") else self.search_cache
+
+    async def get_many(self, keys: list[str]) -> dict[str, tuple[Any, float]]:
+        offset = time.time() - time.monotonic()
+        found = {}
+        for key in keys:
+            entry = self._cache_for(key).get(key)
+            if entry is not None:
+                found[key] = (entry[0], entry[1] + offset)
+        return found
+
+    async def set_many(self, items: dict[str, Any], ttl: float) -> None:
+        now = time.monotonic()
+        for key, value in items.items():
+            self._cache_for(key)[key] = (value, now)
+
+    async def delete(self, key: str) -> None:
+        self._cache_for(key).pop(key)
+
+    async def clear(self) -> None:
+        self.search_cache.clear()
+        self.page_cache.clear()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """把同步的 SQLiteCache 适配为异步后端（在线程池中执行）"""
+
+    name = "sqlite"
+
+    def __init__(self, store: SQLiteCache):
+        self.store = store
+
+    async def get_many(self, keys: list[str]) -> dict[str, tuple[Any, float]]:
+        return await asyncio.to_thread(self.store.get_many, keys)
+
+    async def set_many(self, items: dict[str, Any], ttl: float) -> None:
+        await asyncio.to_thread(self.store.set_many, items, ttl)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self.store.delete, key)
+
+    async def clear(self) -> None:
+        await asyncio.to_thread(self.store.clear)
+
+    async def compact(self) -> None:
+        await asyncio.to_thread(self.store.compact)
+
+    async def close(self) -> None:
+        self.store.close()
+
+
+class RedisError(Exception):
+    """Redis 服务端返回的错误回复"""
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis 协议（RESP2）缓存后端，供多节点部署共享缓存
+
+    不依赖第三方客户端：通过 asyncio 流直接收发命令。批量读取使用单条 MGET，
+    批量写入把多条 SET ... EX 一次性写出再依次读取回复（流水线）。
+    键统一加上 CACHE_KEY_PREFIX，值为 {"v": 值, "t": 写入时间} 的 JSON。
+    """
+
+    name = "redis"
+
+    def __init__(
+        self,
+        url: str,
+        prefix: str = CACHE_KEY_PREFIX,
+        timeout: float = CACHE_REDIS_TIMEOUT,
+    ):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.username = parsed.username
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._lock: asyncio.Lock | None = None
+        self._lock_loop: asyncio.AbstractEventLoop | None = None
+
+    @staticmethod
+    def encode_command(*args: Any) -> bytes:
+        """按 RESP 多批量字符串格式编码一条命令"""
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    @staticmethod
+    def encode_value(value: Any) -> str:
+        return json.dumps(
+            {"v": value, "t": time.time()},
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+
+    @staticmethod
+    def decode_value(raw: bytes) -> tuple[Any, float] | None:
+        try:
+            envelope = json.loads(raw)
+            return envelope["v"], float(envelope["t"])
+        except (ValueError, TypeError, KeyError):
+            return None
+
+    async def _read_reply(self) -> Any:
+        line = await self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis 连接意外关闭")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            return RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RedisError(f"无法解析的回复: {line!r}")
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password:
+            setup.append(
+                ("AUTH", self.username, self.password)
+                if self.username
+                else ("AUTH", self.password)
+            )
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            await self._roundtrip(setup)
+
+    async def _roundtrip(self, commands: list[tuple]) -> list:
+        self._writer.write(b"".join(self.encode_command(*c) for c in commands))
+        await self._writer.drain()
+        replies = [await self._read_reply() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+            self._reader = self._writer = None  # 旧连接属于其他事件循环
+        return self._lock
+
+    async def execute(self, *commands: tuple) -> list:
+        """流水线执行多条命令，按顺序返回回复；出错时断开连接，下次自动重连"""
+
+        async def run() -> list:
+            if self._writer is None or self._writer.is_closing():
+                await self._connect()
+            return await self._roundtrip(list(commands))
+
+        async with self._get_lock():
+            try:
+                return await asyncio.wait_for(run(), self.timeout)
+            except BaseException:
+                self._disconnect()
+                raise
+
+    def _disconnect(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def get_many(self, keys: list[str]) -> dict[str, tuple[Any, float]]:
+        if not keys:
+            return {}
+        (values,) = await self.execute(("MGET", *(self.prefix + k for k in keys)))
+        found = {}
+        for key, raw in zip(keys, values, strict=True):
+            if raw is not None and (entry := self.decode_value(raw)) is not None:
+                found[key] = entry
+        return found
+
+    async def set_many(self, items: dict[str, Any], ttl: float) -> None:
+        if not items:
+            return
+        seconds = max(1, int(ttl))
+        await self.execute(
+            *(
+                ("SET", self.prefix + key, self.encode_value(value), "EX", seconds)
+                for key, value in items.items()
+            )
+        )
+
+    async def delete(self, key: str) -> None:
+        await self.execute(("DEL", self.prefix + key))
+
+    async def clear(self) -> None:
+        """删除本服务写入的所有键（按前缀 SCAN，不影响同库中的其他数据）"""
+        cursor = b"0"
+        while True:
+            ((cursor, keys),) = await self.execute(
+                ("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 500)
+            )
+            if keys:
+                await self.execute(("DEL", *keys))
+            if cursor in (b"0", "0"):
+                break
+
+    async def close(self) -> None:
+        self._disconnect()
+
+
+def create_cache_backend(kind: str = CACHE_BACKEND) -> CacheBackend:
+    """按配置创建缓存后端，memory 表示只使用进程内缓存，配置有误时也退回 memory"""
+    if kind == "sqlite":
+        if CACHE_DB_PATH:
+            store = SQLiteCache(CACHE_DB_PATH, CACHE_DB_MAX_ENTRIES, CACHE_DB_MAX_BYTES)
+            return SQLiteCacheBackend(store)
+        logger.warning("WEB_SEARCH_CACHE_BACKEND=sqlite 但未设置 WEB_SEARCH_CACHE_DB")
+    elif kind == "redis":
+        return RedisCacheBackend(CACHE_REDIS_URL)
+    elif kind != "memory":
+        logger.warning(f"未知的缓存后端 {kind!r}，仅使用进程内缓存")
+    return MemoryCacheBackend(WebSearcher._search_cache, WebSearcher._page_cache)
+
+
+class EngineLimiter:
+    """单个引擎的令牌桶限速 + 最大并发数
+
+    令牌按 rate 次/秒补充，最多累积 burst 个；令牌不足时排队预约，
+    等待时间超过调用方允许的上限则放弃。取得令牌后再等待并发名额。
+    """
+
+    def __init__(self, rate: float, burst: int, max_in_flight: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_in_flight = max_in_flight
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, timeout: float | None) -> bool:
+        """等待令牌和并发名额；timeout 秒内拿不到时返回 False
+
+        没有拿到并发名额（超时或被取消）时归还已预约的令牌；
+        已被唤醒却在恢复前被取消时，把唤醒转交给下一个排队者。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        reserved = False
+        try:
+            if self.rate > 0:
+                self._refill()
+                self.tokens -= 1  # 预约一个令牌，不足时为负数，表示排队
+                reserved = True
+                wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+                if (
+                    wait > 0
+                    and deadline is not None
+                    and time.monotonic() + wait > deadline
+                ):
+                    return False
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            if self.max_in_flight > 0:
+                while self.in_flight >= self.max_in_flight:
+                    waiter = asyncio.get_running_loop().create_future()
+                    self._waiters.append(waiter)
+                    try:
+                        remaining = (
+                            None if deadline is None else deadline - time.monotonic()
+                        )
+                        if remaining is not None and remaining <= 0:
+                            return False
+                        await asyncio.wait([waiter], timeout=remaining)
+                        if not waiter.done():
+                            return False
+                    except asyncio.CancelledError:
+                        if waiter.done():
+                            # 唤醒已送达却不会使用名额，否则下一个排队者会空等到超时
+                            self._wake_next()
+                        raise
+                    finally:
+                        with contextlib.suppress(ValueError):
+                            self._waiters.remove(waiter)
+            self.in_flight += 1
+            reserved = False
+            return True
+        finally:
+            if reserved:
+                self.tokens += 1
+
+    def release(self) -> None:
+        """归还并发名额并唤醒一个排队者"""
+        self.in_flight -= 1
+        self._wake_next()
+
+    def _wake_next(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+
+class LatencyWindow:
+    """最近 window 个耗时样本的滚动窗口，用于计算分位数"""
+
+    def __init__(self, window: int = ENGINE_STATS_WINDOW):
+        self.samples: deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def add(self, latency: float) -> None:
+        self.samples.append(latency)
+
+    def percentile(self, p: float) -> float | None:
+        """p 分位数（秒，最近秩法），没有样本时返回 None"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+        return ordered[index]
+
+
+class EngineStats:
+    """单个引擎的滚动统计：最近 window 次真实请求的耗时、结果数，以及合并时独有的结果数"""
+
+    def __init__(self, window: int = ENGINE_STATS_WINDOW):
+        self.latencies = LatencyWindow(window)
+        self.results: deque[int] = deque(maxlen=window)
+        self.unique: deque[int] = deque(maxlen=window)
+
+    def record(self, latency: float, count: int) -> None:
+        self.latencies.add(latency)
+        self.results.append(count)
+
+    def record_unique(self, count: int) -> None:
+        self.unique.append(count)
+
+    @property
+    def samples(self) -> int:
+        return len(self.results)
+
+    def percentile(self, p: float) -> float | None:
+        """耗时的 p 分位数（秒），没有样本时返回 None"""
+        return self.latencies.percentile(p)
+
+    @property
+    def success_rate(self) -> float:
+        if not self.results:
+            return 0.0
+        return sum(1 for count in self.results if count) / len(self.results)
+
+    @property
+    def mean_results(self) -> float:
+        return sum(self.results) / len(self.results) if self.results else 0.0
+
+    @property
+    def mean_unique(self) -> float:
+        return sum(self.unique) / len(self.unique) if self.unique else 0.0
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "p50_ms": _to_ms(self.percentile(50)),
+            "p95_ms": _to_ms(self.percentile(95)),
+            "success_rate": round(self.success_rate, 3),
+            "mean_results": round(self.mean_results, 2),
+            "mean_unique": round(self.mean_unique, 2),
+        }
+
+
+def _to_ms(seconds: float | None) -> int | None:
+    return None if seconds is None else round(seconds * 1000)
+
+
+class RetryBudget:
+    """进程级重试预算：每个请求存入 ratio 个令牌，每次重试取出一个
+
+    余额上限为 reserve，因此长期来看重试次数不超过请求数的 ratio 倍，
+    引擎整体故障时不会因为重试而放大负载。
+    """
+
+    def __init__(self, ratio: float, reserve: float):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.balance = reserve
+
+    def record_request(self) -> None:
+        # 取整到微小精度，避免 0.1 累加的浮点误差
+        self.balance = min(self.reserve, round(self.balance + self.ratio, 9))
+
+    def try_spend(self) -> bool:
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+def _is_retryable_error(error: BaseException, idempotent: bool = True) -> bool:
+    """连接被重置、服务器断开等瞬时错误可以重试；超时和 TLS 错误不重试
+
+    非幂等请求（如 POST）只在连接没能建立时重试：请求已经发出后服务端可能已经处理，
+    重试会导致重复执行（例如付费 API 重复计费）。
+    """
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ClientSSLError)):
+        return False
+    if not idempotent:
+        return isinstance(error, aiohttp.ClientConnectorError)
+    return isinstance(error, aiohttp.ClientConnectionError)
+
+
+class CircuitBreaker:
+    """单个引擎的熔断器
+
+    closed：正常放行，连续失败 failure_threshold 次后进入 open；
+    open：直接拒绝，reset_timeout 秒后进入 half_open；
+    half_open：只放行一个试探请求，成功则 closed，失败则重新 open。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def is_open(self) -> bool:
+        """是否仍在熔断期内（open 且未超过 reset_timeout，不改变状态）"""
+        return (
+            self.state == self.OPEN
+            and time.monotonic() - self.opened_at < self.reset_timeout
+        )
+
+    def allow(self) -> bool:
+        """是否放行一次请求（half_open 时同一时间只放行一个）"""
+        if self.state == self.OPEN:
+            if self.is_open():
+                return False
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN:
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def release(self) -> None:
+        """请求没有得出结论（被取消、预算用尽、空结果）时归还试探名额"""
+        self._trial_in_flight = False
+
+
+class CachingResolver(AbstractResolver):
+    """带 TTL 缓存的异步 DNS 解析器
+
+    同一个实例既挂在共享连接器上，也用于 SSRF 重定向检查：检查时解析并缓存的地址
+    就是随后建立连接时使用的地址，每个主机在 TTL 内只解析一次，SSRF 判定也只计算一次。
+    底层解析交给 aiohttp 默认解析器（线程池或 aiodns），不会阻塞事件循环。
+    """
+
+    def __init__(self, ttl: float = DNS_CACHE_TTL, max_size: int = DNS_CACHE_MAX_SIZE):
+        self._ttl = ttl
+        self._max_size = max_size
+        # (host, family) -> (解析结果, SSRF 判定, 过期时间)
+        self._cache: dict[tuple[str, int], tuple[list[dict], bool, float]] = {}
+        self._pending: dict[tuple[str, int], asyncio.Task] = {}
+        self._resolver: AbstractResolver | None = None
+        self._resolver_loop: asyncio.AbstractEventLoop | None = None
+
+    def _get_resolver(self) -> AbstractResolver:
+        """懒加载底层解析器（部分实现绑定事件循环，循环切换时重建）"""
+        loop = asyncio.get_running_loop()
+        if self._resolver is None or self._resolver_loop is not loop:
+            self._resolver = DefaultResolver()
+            self._resolver_loop = loop
+            self._pending.clear()
+        return self._resolver
+
+    async def _lookup(self, host: str, family: int) -> tuple[list[dict], bool]:
+        """返回 (解析结果, 是否包含私有地址)，优先命中缓存，并发查询同一主机只解析一次"""
+        key = (host, family)
+        entry = self._cache.get(key)
+        if entry is not None and entry[2] > time.monotonic():
+            return entry[0], entry[1]
+
+        resolver = self._get_resolver()
+        pending = self._pending.get(key)
+        if pending is None:
+            # 在独立任务中解析：发起者被取消时，其他等待者仍能拿到结果
+            pending = asyncio.ensure_future(self._resolve_and_store(resolver, key))
+            self._pending[key] = pending
+            pending.add_done_callback(
+                lambda t: (
+                    self._pending.pop(key) if self._pending.get(key) is t else None
+                )
+            )
+        return await asyncio.shield(pending)
+
+    async def _resolve_and_store(
+        self, resolver: AbstractResolver, key: tuple[str, int]
+    ) -> tuple[list[dict], bool]:
+        host, family = key
+        hosts = await resolver.resolve(host, 0, family=family)
+        private = any(
+            _is_private_address(ipaddress.ip_address(h["host"])) for h in hosts
+        )
+        if len(self._cache) >= self._max_size:
+            self._evict_expired()
+        if len(self._cache) >= self._max_size:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = (hosts, private, time.monotonic() + self._ttl)
+        return hosts, private
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, v in self._cache.items() if v[2] <= now]:
+            del self._cache[key]
+
+    async def resolve(
+        self, host: str, port: int = 0, family: int = socket.AF_INET
+    ) -> list[dict]:
+        hosts, _ = await self._lookup(host, family)
+        return [{**h, "port": port} for h in hosts]
+
+    async def is_private(self, host: str) -> bool:
+        """主机名解析后的任一地址为私有/保留地址时返回 True，解析失败视为私有"""
+        try:
+            return _is_private_address(ipaddress.ip_address(host))
+        except ValueError:
+            pass
+        try:
+            _, private = await self._lookup(host, socket.AF_UNSPEC)
+        except (OSError, ValueError):
+            return True  # DNS failure → treat as private
+        return private
+
+    def clear(self) -> None:
+        """清空 DNS 缓存"""
+        self._cache.clear()
+
+    async def close(self) -> None:
+        if self._resolver is not None:
+            await self._resolver.close()
+            self._resolver = None
+            self._resolver_loop = None
+
 
 class WebSearcher:
     """网页搜索器类"""
 
     # 类级别的缓存（搜索结果缓存）
-    _search_cache: dict = {}  # key -> (results, timestamp)
-    _cache_max_size: int = 100
-    _cache_ttl_seconds: int = 300  # 5 minutes default TTL
+    _cache_ttl_seconds: int = SEARCH_CACHE_TTL  # 5 minutes default TTL
+    _cache_stale_seconds: int = (
+        SEARCH_CACHE_STALE_SECONDS  # stale-while-revalidate 宽限期
+    )
+    _search_cache: LRUCache = LRUCache(
+        SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_MAX_BYTES
+    )  # key -> (results, timestamp)
+    # 网页正文缓存（与搜索缓存分开限制大小）：
+    # 规范化 URL -> ({"content", "etag", "last_modified"}, timestamp)
+    _page_cache: LRUCache = LRUCache(PAGE_CACHE_MAX_ENTRIES, PAGE_CACHE_MAX_BYTES)
+    _cache_sweeper: asyncio.Task | None = None
+    # 缓存后端（由 WEB_SEARCH_CACHE_BACKEND 选择，懒加载；默认 memory 即上面两个内存缓存）
+    _shared_cache: CacheBackend | None = None
+
+    # 负缓存：key -> ((失效时间, 连续失败次数, 原因), 记录时间)
+    _negative_cache: LRUCache = LRUCache(4096, 1024 * 1024)
+    # 运行计数（缓存命中、失败原因等），通过 get_metrics() 读取
+    _metrics: Counter = Counter()
+
+    # 进行中的请求（singleflight）：key -> 任务，相同 key 的并发调用共享同一结果
+    _inflight: dict[str, asyncio.Task] = {}
+    # 镜像域名的成功率统计：host -> [成功次数, 尝试次数]（指数衰减）
+    _mirror_stats: dict[str, list[float]] = {}
+    # DuckDuckGo 即时答案 API 按查询形态的命中统计：shape -> [有结果次数, 尝试次数]
+    _ddg_api_stats: dict[str, list[float]] = {}
+    # 各引擎的滚动统计（懒创建）
+    _engine_stats: dict[str, EngineStats] = {}
+    # 各引擎单次 HTTP 请求的分阶段耗时：(引擎, "connect" / "ttfb") -> 滚动窗口
+    _phase_latency: dict[tuple[str, str], LatencyWindow] = {}
+    _retry_budget: RetryBudget = RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_RESERVE)
+    # 各引擎的限流器（懒创建）
+    _limiters: dict[str, EngineLimiter] = {}
+    # 各引擎的熔断器（懒创建）
+    _breakers: dict[str, CircuitBreaker] = {}
+    # 进行中任务的等待者数量；最后一个等待者取消时任务也随之取消
+    _inflight_waiters: Counter = Counter()
+    # 已预取但尚未被读取的页面：缓存 key -> 正文大小（排队或下载中为 None）
+    _prefetched: dict[str, int | None] = {}
+    # 还在预取通道中排队、尚未开始下载的页面
+    _prefetch_queued: set[str] = set()
+    # 上次写入日志时已结束的预取数，没有变化时不重复记录
+    _prefetch_logged: int = 0
+    # 各主机正在预取的页面数
+    _prefetch_hosts: Counter = Counter()
+    _prefetch_tasks: set[asyncio.Task] = set()
+    # 预取通道（低优先级，按事件循环懒创建）
+    _prefetch_lane: asyncio.Semaphore | None = None
+    _prefetch_lane_loop: asyncio.AbstractEventLoop | None = None
+
+    # 进程级共享的 session（懒加载，复用连接池与 TLS 会话，进程退出时关闭）
+    _shared_session: aiohttp.ClientSession | None = None
+    _shared_session_loop: asyncio.AbstractEventLoop | None = None
+    _ssl_context: ssl.SSLContext | None = None
+    # 进程级共享的 DNS 缓存解析器（SSRF 检查与连接器共用）
+    _resolver: CachingResolver = CachingResolver()
 
     # 更好的 headers 来避免被网站阻止
     DEFAULT_HEADERS = {
@@ -95,70 +1323,950 @@ class WebSearcher:
         return re.sub(r"\s+", " ", query.lower()).strip()
 
     @staticmethod
-    def _get_cache_key(query: str, engine: str, max_results: int) -> str:
-        """生成缓存键"""
+    def _get_cache_key(query: str, engine: str) -> str:
+        """生成缓存键（与 max_results 无关，同一查询的不同结果数共用一个条目）"""
         normalized = WebSearcher._normalize_query(query)
-        return f"{engine}:{normalized}:{max_results}"
+        return f"{engine}:{normalized}"
+
+    @staticmethod
+    def _make_cache_value(results: list, requested: int | None = None) -> dict:
+        """构造缓存值：结果列表及请求时的 max_results
+
+        requested 大于结果数说明引擎已经没有更多结果，之后更大的请求也可以直接复用。
+        """
+        return {
+            "results": results,
+            "requested": max(requested or 0, len(results)),
+        }
+
+    @staticmethod
+    def _is_cache_value(value: Any) -> bool:
+        """校验从共享缓存读到的值结构，防止异常数据污染内存缓存"""
+        return (
+            isinstance(value, dict)
+            and isinstance(value.get("results"), list)
+            and isinstance(value.get("requested"), int)
+        )
 
     @staticmethod
-    def _get_from_cache(key: str) -> list | None:
-        """从缓存获取结果，检查 TTL"""
+    def _covers(value: dict, max_results: int | None) -> bool:
+        """缓存值是否足以满足 max_results 条结果的请求"""
+        return (
+            max_results is None
+            or len(value["results"]) >= max_results
+            or value["requested"] >= max_results
+        )
+
+    @staticmethod
+    def _lookup_cache(
+        key: str, max_results: int | None = None
+    ) -> tuple[list, bool] | None:
+        """查找缓存，返回 (结果, 是否已过期)
+
+        超过 TTL 但仍在 stale-while-revalidate 宽限期内的条目标记为过期返回，
+        超过 TTL + 宽限期的条目被删除。缓存的结果不足 max_results 条
+        （且当时请求的数量也更少）时按未命中处理，足够时按 max_results 截取。
+        """
         entry = WebSearcher._search_cache.get(key)
         if entry is None:
             return None
-        results, ts = entry
-        if time.monotonic() - ts > WebSearcher._cache_ttl_seconds:
+        value, ts = entry
+        age = time.monotonic() - ts
+        if age > WebSearcher._cache_ttl_seconds + WebSearcher._cache_stale_seconds:
             del WebSearcher._search_cache[key]
             return None
-        return results
+        if not WebSearcher._covers(value, max_results):
+            return None
+        results = value["results"]
+        if max_results is not None:
+            results = results[:max_results]
+        return results, age > WebSearcher._cache_ttl_seconds
 
     @staticmethod
-    def _set_to_cache(key: str, results: list) -> None:
-        """设置缓存结果（带时间戳）"""
-        # 简单LRU：超过最大 size 时清除最早的一半
-        if len(WebSearcher._search_cache) >= WebSearcher._cache_max_size:
-            # 清除一半缓存
-            keys_to_remove = list(WebSearcher._search_cache.keys())[
-                : WebSearcher._cache_max_size // 2
-            ]
-            for k in keys_to_remove:
-                del WebSearcher._search_cache[k]
-        WebSearcher._search_cache[key] = (results, time.monotonic())
+    def _get_from_cache(key: str, max_results: int | None = None) -> list | None:
+        """从缓存获取结果，检查 TTL（只返回未过期的结果）"""
+        hit = WebSearcher._lookup_cache(key, max_results)
+        if hit is None or hit[1]:
+            return None
+        return hit[0]
+
+    @staticmethod
+    def _set_to_cache(key: str, results: list, requested: int | None = None) -> bool:
+        """设置缓存结果（带时间戳），超出条目数或字节上限时淘汰最久未使用的条目
+
+        并发的较小请求可能晚于较大请求完成：已有未过期且覆盖更多结果的条目时保留它，
+        返回 False 表示没有写入。
+        """
+        value = WebSearcher._make_cache_value(results, requested)
+        entry = WebSearcher._search_cache.get(key)
+        if entry is not None:
+            current, ts = entry
+            if (
+                time.monotonic() - ts <= WebSearcher._cache_ttl_seconds
+                and current["requested"] > value["requested"]
+            ):
+                return False
+        WebSearcher._search_cache[key] = (value, time.monotonic())
+        return True
+
+    @staticmethod
+    def _negative_keys(engine: str, cache_key: str) -> list[str]:
+        """负缓存键：单个查询，以及引擎级的各类失败"""
+        return [cache_key] + [f"{engine}:!{reason}" for reason in ENGINE_WIDE_FAILURES]
+
+    @staticmethod
+    def _check_negative_cache(engine: str, cache_key: str) -> tuple[str, float] | None:
+        """查询或引擎仍处于失败退避期时返回 (原因, 剩余秒数)"""
+        now = time.monotonic()
+        for key in WebSearcher._negative_keys(engine, cache_key):
+            entry = WebSearcher._negative_cache.get(key)
+            if entry is not None and entry[0][0] > now:
+                return entry[0][2], entry[0][0] - now
+        return None
+
+    @staticmethod
+    def _record_failure(key: str, reason: str) -> float:
+        """记录一次失败，返回退避秒数（连续失败时翻倍，不超过上限）"""
+        now = time.monotonic()
+        strikes = 1
+        previous = WebSearcher._negative_cache.get(key)
+        if previous is not None and now - previous[1] < NEGATIVE_CACHE_MAX_TTL * 2:
+            strikes = previous[0][1] + 1
+        ttl = min(NEGATIVE_CACHE_TTL * 2 ** (strikes - 1), NEGATIVE_CACHE_MAX_TTL)
+        WebSearcher._negative_cache[key] = ((now + ttl, strikes, reason), now)
+        return ttl
+
+    @staticmethod
+    def _update_negative_cache(
+        engine: str, cache_key: str, query: str, results: list, reasons: list[str]
+    ) -> None:
+        """根据一次真实请求的结果更新负缓存：成功则清除，失败则退避"""
+        if results:
+            for key in WebSearcher._negative_keys(engine, cache_key):
+                WebSearcher._negative_cache.pop(key)
+            return
+        reason = reasons[-1] if reasons else "empty"
+        WebSearcher._metrics[f"{engine}.failure.{reason}"] += 1
+        # 调用方时间预算用尽或本地限流不代表引擎出错，不写入负缓存
+        if NEGATIVE_CACHE_TTL <= 0 or reason in LOCAL_FAILURES:
+            return
+        ttl = WebSearcher._record_failure(cache_key, reason)
+        if reason in ENGINE_WIDE_FAILURES:
+            ttl = max(ttl, WebSearcher._record_failure(f"{engine}:!{reason}", reason))
+        logger.info(f"{engine} 请求失败 ({reason})，{ttl:.0f} 秒内不再重试: {query}")
+
+    @classmethod
+    def _get_engine_stats(cls, engine: str) -> EngineStats:
+        stats = cls._engine_stats.get(engine)
+        if stats is None:
+            stats = cls._engine_stats[engine] = EngineStats()
+        return stats
+
+    @staticmethod
+    def get_engine_stats() -> dict[str, dict[str, Any]]:
+        """返回各引擎的滚动统计（p50/p95 耗时、成功率、平均结果数、平均独有结果数）"""
+        return {engine: s.snapshot() for engine, s in WebSearcher._engine_stats.items()}
+
+    @classmethod
+    def _record_contributions(cls, finished: dict[str, list]) -> None:
+        """记录每个完成的引擎贡献了多少其他引擎没有的结果"""
+        urls = {
+            engine: {item["url"] for item in results if item.get("url")}
+            for engine, results in finished.items()
+        }
+        for engine, own in urls.items():
+            others = set().union(*(u for e, u in urls.items() if e != engine))
+            cls._get_engine_stats(engine).record_unique(len(own - others))
+
+    @classmethod
+    def _select_engines(cls, candidates: list[str], max_results: int) -> list[str]:
+        """auto 模式：选出预期能在时间预算内凑够 max_results 条结果的最便宜引擎组合
+
+        样本不足的引擎总是选中；熔断期内的引擎和 p95 耗时超过剩余预算、
+        或平均没有结果的引擎被排除；其余按“中位耗时 / 平均结果数”的单位成本
+        从低到高加入，直到预期结果数足够。偶尔额外加入一个未选中的引擎
+        （包括被统计排除的引擎），让统计保持新鲜。
+        """
+        remaining = _remaining_budget()
+        selected: list[str] = []
+        ranked: list[tuple[float, str]] = []
+        rest: list[str] = []
+        expected = 0.0
+        for engine in candidates:
+            breaker = cls._breakers.get(engine)
+            if breaker is not None and breaker.is_open():
+                continue
+            stats = cls._engine_stats.get(engine)
+            if stats is None or stats.samples < AUTO_MIN_SAMPLES:
+                selected.append(engine)
+                continue
+            p95 = stats.percentile(95)
+            if remaining is not None and p95 is not None and p95 > remaining:
+                rest.append(engine)
+                continue
+            if stats.mean_results <= 0:
+                rest.append(engine)
+                continue
+            cost = (stats.percentile(50) or 0.0) + 0.001
+            if engine in ("serpapi", "tavily"):
+                cost *= AUTO_API_COST
+            ranked.append((cost / stats.mean_results, engine))
+        ranked.sort()
+        for engine in selected:
+            stats = cls._engine_stats.get(engine)
+            expected += stats.mean_results if stats and stats.samples else max_results
+        for _, engine in ranked:
+            if expected < max_results:
+                selected.append(engine)
+                expected += cls._engine_stats[engine].mean_results
+            else:
+                rest.append(engine)
+        if rest and random.random() < AUTO_EXPLORE_RATE:
+            selected.append(random.choice(rest))
+        if not selected:
+            # 全部被排除时退回到默认引擎
+            selected = candidates[:1]
+        # 保持候选列表中的优先级顺序
+        return [engine for engine in candidates if engine in selected]
+
+    @classmethod
+    def _record_phase(cls, engine: str, phase: str, latency: float) -> None:
+        window = cls._phase_latency.get((engine, phase))
+        if window is None:
+            window = cls._phase_latency[(engine, phase)] = LatencyWindow()
+        window.add(latency)
+
+    @classmethod
+    def _adaptive_timeout(cls, engine: str, phase: str, ceiling: float) -> float | None:
+        """按阶段耗时 p99 × 系数计算超时，限制在 [下限, ceiling]；样本不足时返回 None"""
+        window = cls._phase_latency.get((engine, phase))
+        if window is None or len(window) < ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+            return None
+        timeout = window.percentile(99) * ADAPTIVE_TIMEOUT_FACTOR
+        return min(max(timeout, ADAPTIVE_TIMEOUT_FLOOR), ceiling)
+
+    @classmethod
+    def _request_timeout(cls, total: float) -> aiohttp.ClientTimeout:
+        """当前引擎请求的超时：total 为上限，连接和读取超时按该引擎的历史耗时收紧
+
+        健康时很快的引擎挂起后能被尽早放弃，较慢但正常的引擎不会被误杀。
+        """
+        engine = _current_engine.get()
+        if not ADAPTIVE_TIMEOUT or engine is None:
+            return _client_timeout(total)
+        return _client_timeout(
+            total,
+            sock_connect=cls._adaptive_timeout(engine, "connect", total),
+            sock_read=cls._adaptive_timeout(engine, "ttfb", total),
+        )
+
+    @classmethod
+    def _create_trace_config(cls) -> aiohttp.TraceConfig:
+        """追踪每个请求的建立连接耗时和首字节耗时，按当前引擎记录"""
+
+        async def on_request_start(session, ctx, params) -> None:
+            ctx.engine = _current_engine.get()
+            ctx.started = time.monotonic()
+
+        async def on_connection_create_start(session, ctx, params) -> None:
+            ctx.connect_started = time.monotonic()
+
+        async def on_connection_create_end(session, ctx, params) -> None:
+            ctx.connect_ended = True
+            if getattr(ctx, "engine", None) and hasattr(ctx, "connect_started"):
+                cls._record_phase(
+                    ctx.engine, "connect", time.monotonic() - ctx.connect_started
+                )
+
+        async def on_request_end(session, ctx, params) -> None:
+            # 响应头到达即触发，近似首字节耗时
+            if getattr(ctx, "engine", None):
+                cls._record_phase(ctx.engine, "ttfb", time.monotonic() - ctx.started)
+
+        async def on_request_exception(session, ctx, params) -> None:
+            # 超时的请求按已等待的时长记为样本：引擎变慢但仍正常时超时随之放宽，
+            # 否则只有成功的请求留下样本，收紧后的超时再也无法恢复
+            if not getattr(ctx, "engine", None) or not isinstance(
+                params.exception, asyncio.TimeoutError
+            ):
+                return
+            now = time.monotonic()
+            if hasattr(ctx, "connect_started") and not getattr(
+                ctx, "connect_ended", False
+            ):
+                cls._record_phase(ctx.engine, "connect", now - ctx.connect_started)
+            else:
+                cls._record_phase(ctx.engine, "ttfb", now - ctx.started)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+    @classmethod
+    def _retry_delay(
+        cls,
+        attempt: int,
+        error: BaseException | None = None,
+        status: int | None = None,
+        idempotent: bool = True,
+    ) -> float | None:
+        """第 attempt 次（从 0 开始）请求失败后是否重试：返回退避秒数，不重试时返回 None
+
+        非幂等请求的 5xx 响应说明服务端已经收到请求，不重试。
+        """
+        if error is not None and not _is_retryable_error(error, idempotent):
+            return None
+        if error is None and (not idempotent or status not in RETRY_STATUSES):
+            return None
+        if attempt + 1 >= RETRY_MAX_ATTEMPTS:
+            return None
+        # full jitter：在 [0, base * 2^attempt] 内随机，避免重试同时到达
+        delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+        remaining = _remaining_budget()
+        if remaining is not None and delay >= remaining:
+            return None
+        if not cls._retry_budget.try_spend():
+            cls._metrics["retry.budget_exhausted"] += 1
+            return None
+        cls._metrics["retry.attempt"] += 1
+        return delay
+
+    @contextlib.asynccontextmanager
+    async def _request(self, method: str, url: str, **kwargs):
+        """发送请求，对可重试的连接错误和 5xx 响应按退避策略重试
+
+        用法与 session.get/post 相同（async with）；只有在拿到响应之前的失败会重试，
+        读取响应体时的错误交给调用方处理。POST 等非幂等请求只在连接建立失败时重试。
+        """
+        self._retry_budget.record_request()
+        idempotent = method.lower() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            stack = contextlib.AsyncExitStack()
+            try:
+                response = await stack.enter_async_context(
+                    getattr(self.session, method)(url, **kwargs)
+                )
+            except Exception as e:
+                await stack.aclose()
+                delay = self._retry_delay(attempt, error=e, idempotent=idempotent)
+                if delay is None:
+                    raise
+                logger.info(f"请求失败，{delay:.2f} 秒后重试 {url}: {e}")
+            else:
+                delay = (
+                    self._retry_delay(
+                        attempt, status=response.status, idempotent=idempotent
+                    )
+                    if isinstance(response.status, int)
+                    else None
+                )
+                if delay is None:
+                    async with stack:
+                        yield response
+                    return
+                await stack.aclose()
+                logger.info(f"服务器返回 {response.status}，{delay:.2f} 秒后重试 {url}")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @classmethod
+    def _get_limiter(cls, engine: str) -> EngineLimiter | None:
+        """返回引擎的限流器，没有配置限流和并发上限时返回 None"""
+        limiter = cls._limiters.get(engine)
+        if limiter is None:
+            rate, burst, max_in_flight = ENGINE_RATE_LIMITS.get(engine, (0.0, 0, 0))
+            if rate <= 0 and max_in_flight <= 0:
+                return None
+            limiter = EngineLimiter(rate, burst, max_in_flight)
+            cls._limiters[engine] = limiter
+        return limiter
+
+    @staticmethod
+    def _rate_limit_wait() -> float:
+        """排队等待限流的上限：剩余时间预算与 RATE_LIMIT_MAX_WAIT 取小"""
+        remaining = _remaining_budget()
+        return (
+            RATE_LIMIT_MAX_WAIT
+            if remaining is None
+            else min(remaining, RATE_LIMIT_MAX_WAIT)
+        )
+
+    @classmethod
+    def _get_breaker(cls, engine: str) -> CircuitBreaker | None:
+        """返回引擎的熔断器，未启用熔断时返回 None"""
+        if CIRCUIT_FAILURE_THRESHOLD <= 0:
+            return None
+        breaker = cls._breakers.get(engine)
+        if breaker is None:
+            breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+            cls._breakers[engine] = breaker
+        return breaker
+
+    @staticmethod
+    def _update_breaker(
+        engine: str, breaker: CircuitBreaker, results: list, reasons: list[str]
+    ) -> None:
+        """根据一次真实请求的结果更新熔断器状态"""
+        previous = breaker.state
+        if results:
+            breaker.record_success()
+        elif reasons and reasons[-1] in CIRCUIT_FAILURES:
+            breaker.record_failure()
+        else:
+            breaker.release()
+        if breaker.state != previous:
+            WebSearcher._metrics[f"{engine}.circuit_{breaker.state}"] += 1
+            logger.warning(f"{engine} 熔断器状态: {previous} -> {breaker.state}")
+
+    @staticmethod
+    def get_circuit_states() -> dict[str, str]:
+        """返回各引擎熔断器的当前状态"""
+        return {engine: b.state for engine, b in WebSearcher._breakers.items()}
+
+    @staticmethod
+    def get_metrics() -> dict[str, int]:
+        """返回运行计数的快照"""
+        return dict(WebSearcher._metrics)
+
+    @classmethod
+    def _get_shared_cache(cls) -> CacheBackend:
+        """返回缓存后端，创建失败时退回进程内缓存"""
+        if cls._shared_cache is None:
+            try:
+                cls._shared_cache = create_cache_backend(CACHE_BACKEND)
+            except (sqlite3.Error, OSError, ValueError) as e:
+                logger.warning(f"无法创建共享缓存后端 {CACHE_BACKEND}: {e}")
+                cls._shared_cache = create_cache_backend("memory")
+            logger.info(f"缓存后端已启用: {cls._shared_cache.name}")
+        return cls._shared_cache
+
+    @staticmethod
+    async def _shared_cache_get_many(
+        keys: list[str], max_age: float
+    ) -> dict[str, tuple[Any, float]]:
+        """批量读取共享缓存中不超过 max_age 秒的值，返回 {key: (值, 已存在秒数)}
+
+        读取失败时按未命中处理。
+        """
+        if not keys:
+            return {}
+        try:
+            stored = await WebSearcher._get_shared_cache().get_many(keys)
+        except Exception as e:
+            logger.warning(f"读取共享缓存失败: {e}")
+            return {}
+        now = time.time()
+        found = {}
+        for key, (value, stored_at) in stored.items():
+            age = max(0.0, now - stored_at)
+            if age <= max_age:
+                found[key] = (value, age)
+        return found
+
+    @staticmethod
+    async def _shared_cache_get(key: str, max_age: float) -> tuple[Any, float] | None:
+        """读取单个键，见 _shared_cache_get_many()"""
+        return (await WebSearcher._shared_cache_get_many([key], max_age)).get(key)
+
+    @staticmethod
+    async def _shared_cache_set(key: str, value: Any, ttl: float) -> None:
+        """写入共享缓存，失败时只记录日志"""
+        try:
+            await WebSearcher._get_shared_cache().set(key, value, ttl)
+        except Exception as e:
+            logger.warning(f"写入共享缓存失败: {e}")
+
+    @staticmethod
+    async def warm_search_cache(keys: list[str], max_results: int | None = None) -> int:
+        """一次往返批量读取共享缓存，把足够的搜索结果放入内存缓存，返回命中数"""
+        missing = [
+            k for k in keys if WebSearcher._get_from_cache(k, max_results) is None
+        ]
+        stored = await WebSearcher._shared_cache_get_many(
+            missing, WebSearcher._cache_ttl_seconds
+        )
+        warmed = 0
+        for key, (value, age) in stored.items():
+            if WebSearcher._is_cache_value(value) and WebSearcher._covers(
+                value, max_results
+            ):
+                # 以原始写入时间放入内存缓存，避免延长有效期
+                WebSearcher._search_cache[key] = (value, time.monotonic() - age)
+                warmed += 1
+        return warmed
+
+    @classmethod
+    def _ensure_cache_sweeper(cls) -> None:
+        """启动后台任务，定期清理过期缓存条目"""
+        if CACHE_SWEEP_INTERVAL <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        task = cls._cache_sweeper
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        cls._cache_sweeper = loop.create_task(cls._sweep_cache_periodically())
+
+    @classmethod
+    async def _sweep_cache_periodically(cls) -> None:
+        while True:
+            await asyncio.sleep(CACHE_SWEEP_INTERVAL)
+            removed = cls._search_cache.expire(
+                cls._cache_ttl_seconds + cls._cache_stale_seconds
+            ) + cls._page_cache.expire(PAGE_CACHE_TTL + PAGE_CACHE_REVALIDATE_SECONDS)
+            if removed:
+                logger.debug(f"清理过期缓存条目 {removed} 个")
+            cls._log_prefetch_stats()
+            backend = cls._shared_cache
+            if backend is not None:
+                try:
+                    await backend.compact()
+                except Exception as e:
+                    logger.warning(f"整理共享缓存失败: {e}")
+
+    @staticmethod
+    def _get_inflight(
+        key: str, factory: Callable[[], Awaitable[Any]], detached: bool = False
+    ) -> asyncio.Task:
+        """返回 key 对应的进行中任务，不存在时用 factory() 创建
+
+        detached=True 表示后台任务（如 stale-while-revalidate 刷新），
+        不会因为等待者全部取消而被取消。
+        """
+        task = WebSearcher._inflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+
+            async def run() -> Any:
+                # 共享任务不受发起者的时间预算限制，各等待者自行限定等待时间
+                _deadline.set(None)
+                return await factory()
+
+            task = asyncio.ensure_future(run())
+            WebSearcher._inflight[key] = task
+
+            def cleanup(t: asyncio.Task) -> None:
+                WebSearcher._inflight_waiters.pop(t, None)
+                if WebSearcher._inflight.get(key) is t:
+                    WebSearcher._inflight.pop(key)
+
+            task.add_done_callback(cleanup)
+        else:
+            logger.debug(f"合并进行中的请求: {key}")
+        if detached:
+            WebSearcher._inflight_waiters[task] += 1
+        return task
+
+    @staticmethod
+    async def _coalesce(
+        key: str, factory: Callable[[], Awaitable[Any]], default: Any = None
+    ) -> Any:
+        """合并相同 key 的并发请求（singleflight）
+
+        首个调用者在独立任务中执行 factory()，后来者直接等待该任务，
+        不再重复访问网络。每个等待者只等待自己剩余的时间预算，
+        超时返回 default；发起者被取消或超时不会影响其他等待者，
+        所有等待者都离开后，进行中的请求也会被取消以释放连接。
+        """
+        if _budget_exhausted():
+            _note_failure("deadline")
+            return default
+        task = WebSearcher._get_inflight(key, factory)
+        waiters = WebSearcher._inflight_waiters
+        waiters[task] += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), _remaining_budget())
+        except asyncio.TimeoutError:
+            if waiters[task] <= 1 and not task.done():
+                task.cancel()
+            _note_failure("deadline")
+            logger.info(f"等待进行中的请求超出时间预算: {key}")
+            return default
+        except asyncio.CancelledError:
+            if waiters[task] <= 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            if not task.done():
+                waiters[task] -= 1
+
+    async def _cached_search(
+        self,
+        engine: str,
+        query: str,
+        max_results: int,
+        fetch: Callable[[str, int], Awaitable[list]],
+    ) -> list:
+        """带缓存和请求合并的搜索：命中缓存直接返回，否则相同查询只发起一次请求
+
+        每个 (引擎, 查询) 只缓存取到的最大结果列表，较小的 max_results 直接截取。
+        失败或空结果写入负缓存，退避期内直接返回空列表。
+        开启 stale-while-revalidate 时，宽限期内的过期结果会立即返回，
+        同时在后台刷新；超过宽限期则阻塞等待新结果。
+        """
+        cache_key = self._get_cache_key(query, engine)
+
+        async def fetch_and_cache(count: int) -> list:
+            # 其他进程或节点可能已经写入了共享缓存
+            stored = await self._shared_cache_get(cache_key, self._cache_ttl_seconds)
+            if stored is not None:
+                value, age = stored
+                if self._is_cache_value(value) and self._covers(value, count):
+                    logger.debug(f"{engine} 共享缓存命中: {query}")
+                    # 以原始写入时间放入内存缓存，避免延长有效期
+                    self._search_cache[cache_key] = (value, time.monotonic() - age)
+                    return value["results"]
+            blocked = self._check_negative_cache(engine, cache_key)
+            if blocked is not None:
+                reason, remaining = blocked
+                self._metrics[f"{engine}.negative_cache_hit"] += 1
+                logger.info(
+                    f"{engine} 命中失败缓存 ({reason})，剩余 {remaining:.0f} 秒: {query}"
+                )
+                return []
+            breaker = self._get_breaker(engine)
+            if breaker is not None and not breaker.allow():
+                self._metrics[f"{engine}.circuit_open"] += 1
+                logger.info(f"{engine} 处于熔断状态，跳过: {query}")
+                return []
+            limiter = self._get_limiter(engine)
+            outer = _failure_reasons.get()
+            reasons: list[str] = []
+            token = _failure_reasons.set(reasons)
+            engine_token = _current_engine.set(engine)
+            try:
+                if limiter is not None and not await limiter.acquire(
+                    self._rate_limit_wait()
+                ):
+                    self._metrics[f"{engine}.rate_limited"] += 1
+                    logger.warning(f"{engine} 限流排队超时，跳过: {query}")
+                    _note_failure("rate_limited")
+                    results = []
+                else:
+                    started = time.monotonic()
+                    try:
+                        results = await fetch(query, count)
+                    finally:
+                        if limiter is not None:
+                            limiter.release()
+                    if not (reasons and reasons[-1] in LOCAL_FAILURES):
+                        self._get_engine_stats(engine).record(
+                            time.monotonic() - started, len(results)
+                        )
+            except BaseException:
+                if breaker is not None:
+                    breaker.release()
+                raise
+            finally:
+                _current_engine.reset(engine_token)
+                _failure_reasons.reset(token)
+            if breaker is not None:
+                self._update_breaker(engine, breaker, results, reasons)
+            if outer is not None:
+                # 嵌套的缓存搜索（如 DuckDuckGo 的 HTML 回退）把失败原因传给外层
+                outer.extend(reasons)
+            self._update_negative_cache(engine, cache_key, query, results, reasons)
+            if results and self._set_to_cache(cache_key, results, count):
+                await self._shared_cache_set(
+                    cache_key,
+                    self._make_cache_value(results, count),
+                    self._cache_ttl_seconds + self._cache_stale_seconds,
+                )
+            return results
+
+        hit = self._lookup_cache(cache_key, max_results)
+        if hit is not None:
+            results, stale = hit
+            if stale:
+                self._metrics[f"{engine}.cache_stale_hit"] += 1
+                logger.debug(f"{engine} 返回过期缓存并后台刷新: {query}")
+                # 按之前取过的最大数量刷新，避免较小的请求缩小缓存条目
+                count = max(max_results, self._search_cache[cache_key][0]["requested"])
+                self._get_inflight(
+                    f"{cache_key}#{count}",
+                    lambda: fetch_and_cache(count),
+                    detached=True,
+                )
+            else:
+                self._metrics[f"{engine}.cache_hit"] += 1
+                logger.debug(f"{engine} 缓存命中: {query}")
+            return results
+
+        # 只与请求数量相同的进行中请求合并，保证结果数足够
+        results = await self._coalesce(
+            f"{cache_key}#{max_results}", lambda: fetch_and_cache(max_results), []
+        )
+        return results[:max_results]
+
+    async def _hedged_gather(
+        self,
+        searches: dict[str, Awaitable[list]],
+        max_results: int,
+        on_result: Callable[[str, list], Awaitable[None]] | None = None,
+    ) -> dict[str, list]:
+        """并发执行多个引擎搜索，按完成顺序收集结果
+
+        去重结果数达到阈值且足够多的引擎返回了结果，或超过软截止时间且已有结果时
+        立即返回，其余引擎任务被取消。返回 {引擎: 结果}，只包含已完成的引擎。
+        on_result 在每个引擎完成时被调用（用于流式推送部分结果）。
+        """
+        tasks = {
+            asyncio.ensure_future(coro): engine for engine, coro in searches.items()
+        }
+        target = HEDGE_MIN_RESULTS or max_results
+        min_engines = min(HEDGE_MIN_ENGINES, len(tasks))
+        loop = asyncio.get_running_loop()
+        soft_deadline = (
+            loop.time() + HEDGE_SOFT_DEADLINE
+            if HEDGE_ENABLED and HEDGE_SOFT_DEADLINE > 0
+            else None
+        )
+        finished: dict[str, list] = {}
+        seen_urls: set[str] = set()
+        pending = set(tasks)
+        try:
+            while pending:
+                timeout = (
+                    None
+                    if soft_deadline is None
+                    else max(0.0, soft_deadline - loop.time())
+                )
+                remaining = _remaining_budget()
+                if remaining is not None:
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    engine = tasks[task]
+                    try:
+                        results = task.result()
+                    except Exception as e:
+                        logger.error(f"{engine} 搜索异常: {e}")
+                        results = []
+                    finished[engine] = results
+                    seen_urls.update(item["url"] for item in results if item.get("url"))
+                    if on_result is not None:
+                        try:
+                            await on_result(engine, results)
+                        except Exception as e:
+                            logger.debug(f"推送 {engine} 部分结果失败: {e}")
+                if pending and _budget_exhausted():
+                    logger.info(f"时间预算已用尽，返回已有的 {len(seen_urls)} 条结果")
+                    break
+                if not HEDGE_ENABLED or not pending:
+                    continue
+                contributing = sum(1 for results in finished.values() if results)
+                if len(seen_urls) >= target and contributing >= min_engines:
+                    logger.debug(f"结果已足够，提前返回（{len(seen_urls)} 条）")
+                    break
+                if soft_deadline is not None and loop.time() >= soft_deadline:
+                    if seen_urls:
+                        logger.info(
+                            f"到达软截止时间，返回已有的 {len(seen_urls)} 条结果"
+                        )
+                        break
+                    soft_deadline = None  # 还没有任何结果，继续等待剩余引擎
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                self._metrics["hedge.cancelled"] += len(pending)
+                logger.debug(
+                    f"取消未完成的引擎: {', '.join(tasks[t] for t in pending)}"
+                )
+                await asyncio.gather(*pending, return_exceptions=True)
+        return finished
+
+    @classmethod
+    def _order_mirrors(cls, urls: list[str]) -> list[str]:
+        """按镜像历史成功率排序（拉普拉斯平滑，分数相同保持默认顺序）"""
+
+        def score(url: str) -> float:
+            successes, attempts = cls._mirror_stats.get(
+                urlparse(url).hostname, (0.0, 0.0)
+            )
+            return (successes + 1) / (attempts + 2)
+
+        return sorted(urls, key=score, reverse=True)
+
+    @classmethod
+    def _record_mirror(cls, url: str, success: bool) -> None:
+        stats = cls._mirror_stats.setdefault(urlparse(url).hostname, [0.0, 0.0])
+        stats[0] = stats[0] * MIRROR_STATS_DECAY + (1 if success else 0)
+        stats[1] = stats[1] * MIRROR_STATS_DECAY + 1
+
+    async def _race_mirrors(
+        self, engine: str, urls: list[str], attempt: Callable[[str], Awaitable[list]]
+    ) -> list:
+        """在多个镜像域名之间竞速，返回第一个非空的解析结果
+
+        按成功率从高到低启动镜像：当前镜像失败时立即启动下一个，
+        超过 MIRROR_HEDGE_DELAY 秒仍无响应时也提前启动下一个；
+        拿到结果后取消其余请求。
+        """
+        queue = self._order_mirrors(urls)
+        racing = MIRROR_HEDGE_DELAY >= 0
+        tasks: dict[asyncio.Task, str] = {}
+        launch_next = True
+        try:
+            while True:
+                if launch_next and queue and not _budget_exhausted():
+                    url = queue.pop(0)
+                    tasks[asyncio.ensure_future(attempt(url))] = url
+                if not tasks:
+                    if _budget_exhausted():
+                        _note_failure("deadline")
+                    return []
+                timeout = MIRROR_HEDGE_DELAY if racing and queue else None
+                remaining = _remaining_budget()
+                if remaining is not None:
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                done, _ = await asyncio.wait(
+                    tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if _budget_exhausted():
+                        _note_failure("deadline")
+                        return []
+                    logger.debug(
+                        f"{engine} 镜像 {MIRROR_HEDGE_DELAY}s 内无响应，启动下一个"
+                    )
+                    launch_next = True
+                    continue
+                launch_next = False
+                for task in done:
+                    url = tasks.pop(task)
+                    results = task.result()
+                    self._record_mirror(url, bool(results))
+                    if results:
+                        self._metrics[f"{engine}.mirror.{urlparse(url).hostname}"] += 1
+                        return results
+                    # 当前镜像失败，立即启动下一个
+                    launch_next = True
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
 
     @staticmethod
     def clear_cache() -> None:
-        """清空搜索缓存"""
+        """清空搜索缓存、网页内容缓存以及引擎失败状态（负缓存、熔断器）"""
         WebSearcher._search_cache.clear()
-
-    async def __aenter__(self):
-        # 配置SSL验证
-        # SSL_VERIFY=True 时启用验证，SSL_VERIFY=False 时禁用验证（用于开发环境）
-        ssl_verify = SSL_VERIFY  # ssl=False 禁用验证，True/ssl.SSLContext 启用验证
+        WebSearcher._page_cache.clear()
+        WebSearcher._negative_cache.clear()
+        WebSearcher._breakers.clear()
+        WebSearcher._prefetched.clear()
+        WebSearcher._prefetch_queued.clear()
+
+    @classmethod
+    def _get_ssl_context(cls) -> ssl.SSLContext | bool:
+        """返回进程内复用的 SSL 上下文（SSL_VERIFY=False 时返回 False 禁用验证）"""
+        if not SSL_VERIFY:
+            return False
+        if cls._ssl_context is None:
+            cls._ssl_context = ssl.create_default_context()
+        return cls._ssl_context
+
+    @classmethod
+    def _create_connector(cls) -> aiohttp.BaseConnector:
+        """创建共享连接器，SOCKS 代理可用时使用 ProxyConnector"""
+        ssl_context = cls._get_ssl_context()
+        pool_kwargs = {
+            "limit": POOL_LIMIT,
+            "limit_per_host": POOL_LIMIT_PER_HOST,
+            "keepalive_timeout": POOL_KEEPALIVE_TIMEOUT,
+        }
 
         # SOCKS 代理支持
         if SOCKS_PROXY and aiohttp_socks:
             connector = aiohttp_socks.ProxyConnector.from_url(
-                SOCKS_PROXY, ssl=ssl_verify
+                SOCKS_PROXY, ssl=ssl_context, **pool_kwargs
             )
             logger.info(f"SOCKS connector created: {SOCKS_PROXY}")
-        else:
-            connector = aiohttp.TCPConnector(
-                ssl=ssl_verify,  # 根据 WEB_SEARCH_SSL_VERIFY 环境变量配置
-                limit=10,
-                force_close=False,
-                enable_cleanup_closed=True,
-            )
+            return connector
+
+        return aiohttp.TCPConnector(
+            ssl=ssl_context,  # 根据 WEB_SEARCH_SSL_VERIFY 环境变量配置
+            force_close=False,
+            enable_cleanup_closed=True,
+            resolver=cls._resolver,
+            use_dns_cache=False,  # 由 CachingResolver 统一缓存，保证与 SSRF 检查使用同一结果
+            family=socket.AF_UNSPEC,
+            **pool_kwargs,
+        )
+
+    @classmethod
+    def get_shared_session(cls) -> aiohttp.ClientSession:
+        """获取进程级共享 session，不存在、已关闭或事件循环已切换时重新创建
 
-        self.session = aiohttp.ClientSession(
-            headers=self.headers,
-            connector=connector,
+        所有工具调用共用同一个连接池，避免每次调用都重新进行 DNS/TCP/TLS 握手。
+        """
+        loop = asyncio.get_running_loop()
+        session = cls._shared_session
+        if (
+            session is not None
+            and not session.closed
+            and cls._shared_session_loop is loop
+        ):
+            return session
+
+        if session is not None and not session.closed:
+            # 旧 session 绑定在已失效的事件循环上，无法在当前循环中关闭，直接丢弃
+            logger.debug("事件循环已切换，重新创建共享 session")
+
+        cls._shared_session = aiohttp.ClientSession(
+            headers=cls.DEFAULT_HEADERS,
+            connector=cls._create_connector(),
             trust_env=True,  # 信任环境变量中的代理配置
+            trace_configs=[cls._create_trace_config()],
         )
+        cls._shared_session_loop = loop
+        cls._ensure_cache_sweeper()
+        return cls._shared_session
+
+    @classmethod
+    async def close_shared_session(cls) -> None:
+        """关闭共享 session（进程退出时调用）"""
+        session = cls._shared_session
+        cls._shared_session = None
+        cls._shared_session_loop = None
+        if session is not None and not session.closed:
+            await session.close()
+        await cls._resolver.close()
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        """释放进程级资源：停止后台清理和预取任务、关闭共享 session 和共享缓存后端"""
+        task = cls._cache_sweeper
+        cls._cache_sweeper = None
+        if task is not None and not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        prefetches = list(cls._prefetch_tasks)
+        for task in prefetches:
+            task.cancel()
+        await asyncio.gather(*prefetches, return_exceptions=True)
+        cls._log_prefetch_stats()
+        await cls.close_shared_session()
+        backend = cls._shared_cache
+        cls._shared_cache = None
+        if backend is not None:
+            await backend.close()
+
+    async def __aenter__(self):
+        self.session = self.get_shared_session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        # 共享 session 由进程持有，在 close_shared_session() 中统一关闭；
+        # 保留引用，供退出后仍在运行的后台刷新任务使用
+        pass
 
     @staticmethod
     def _validate_url(url: str) -> str | None:
@@ -213,22 +2321,41 @@ class WebSearcher:
         return url
 
     @staticmethod
-    def _is_ip_private(hostname: str) -> bool:
-        """检查主机名解析后的 IP 是否为私有/保留地址（用于重定向后的二次检查）"""
+    def _canonicalize_url(url: str) -> str:
+        """规范化 URL 作为网页缓存键
+
+        协议和主机名转小写、去掉默认端口和片段、去掉 utm_* 等跟踪参数，
+        其余查询参数保持原有顺序。
+        """
+        parsed = urlparse(url)
+        scheme = parsed.scheme.lower()
+        host = (parsed.hostname or "").lower()
+        if ":" in host:
+            host = f"[{host}]"  # IPv6
         try:
-            ip = ipaddress.ip_address(hostname)
-            return ip.is_loopback or ip.is_link_local or ip.is_reserved or ip.is_private or ip.is_unspecified
+            port = parsed.port
         except ValueError:
-            # hostname is a domain name, resolve it to IPs
-            try:
-                addrinfos = socket.getaddrinfo(hostname, None)
-            except (socket.gaierror, OSError):
-                return True  # DNS failure → treat as private
-            for _, _, _, _, sockaddr in addrinfos:
-                ip = ipaddress.ip_address(sockaddr[0])
-                if ip.is_loopback or ip.is_link_local or ip.is_reserved or ip.is_private or ip.is_unspecified:
-                    return True
-            return False
+            # 端口越界或不是数字：保留原始 netloc（去掉用户信息），交给下载环节报错
+            host = parsed.netloc.rpartition("@")[2].lower()
+            port = None
+        if port and (scheme, port) not in (("http", 80), ("https", 443)):
+            host = f"{host}:{port}"
+        params = [
+            (k, v)
+            for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+            if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+        ]
+        query = f"?{urlencode(params)}" if params else ""
+        return f"{scheme}://{host}{parsed.path or '/'}{query}"
+
+    @staticmethod
+    async def _is_host_private(hostname: str) -> bool:
+        """异步检查主机名是否解析到私有/保留地址（用于重定向后的二次检查）
+
+        结果按主机缓存 DNS_CACHE_TTL 秒，连接器复用同一解析结果，
+        因此实际连接的地址就是通过检查的地址。
+        """
+        return await WebSearcher._resolver.is_private(hostname)
 
     async def _safe_get(
         self, url: str, max_redirects: int = 5, **kwargs
@@ -246,10 +2373,24 @@ class WebSearcher:
         redirect_history = []  # 记录访问过的 URL 用于检测循环
         redirect_history_urls = set()  # O(1) lookup for cycle detection
 
+        timeout = kwargs.get("timeout")
         while redirect_count < max_redirects:
+            # 每一跳都只使用剩余的时间预算
+            if _budget_exhausted():
+                logger.warning(f"时间预算已用尽，放弃请求: {current_url}")
+                _note_failure("deadline")
+                return None
+            if _remaining_budget() is not None:
+                kwargs["timeout"] = (
+                    _client_timeout(
+                        timeout.total, timeout.sock_connect, timeout.sock_read
+                    )
+                    if timeout
+                    else _client_timeout(None)
+                )
             try:
-                async with self.session.get(
-                    current_url, allow_redirects=False, **kwargs
+                async with self._request(
+                    "get", current_url, allow_redirects=False, **kwargs
                 ) as response:
                     # 如果是重定向（301, 302, 303, 307, 308）
                     if response.status in (301, 302, 303, 307, 308):
@@ -265,11 +2406,12 @@ class WebSearcher:
                         # SSRF redirect check: block redirects to private/internal IPs
                         parsed = urlparse(location)
                         redirect_host = parsed.hostname
-                        if redirect_host and self._is_ip_private(redirect_host):
+                        if redirect_host and await self._is_host_private(redirect_host):
                             logger.warning(
                                 f"SSRF blocked: redirect to private IP via {redirect_host} "
                                 f"(from {current_url})"
                             )
+                            _note_failure("redirect")
                             return None
 
                         # 剥离 mkt 参数以防止 Bing 重定向循环
@@ -293,6 +2435,7 @@ class WebSearcher:
                         # 通用循环检测：检查 URL 是否已在历史中
                         if current_url in redirect_history_urls:
                             logger.warning(f"检测到重定向循环，URL: {current_url}")
+                            _note_failure("redirect")
                             return None
                         redirect_history.append((current_url, response.status))
                         redirect_history_urls.add(current_url)
@@ -304,25 +2447,83 @@ class WebSearcher:
                     return response
             except Exception as e:
                 logger.error(f"请求失败 {current_url}: {e}")
+                _note_failure(_failure_reason_for(e))
                 return None
 
         # 超过最大重定向次数
         logger.warning(f"超过最大重定向次数 ({max_redirects})，URL: {url}")
+        _note_failure("redirect")
         return None
 
-    async def search_duckduckgo(self, query: str, max_results: int = 10) -> list:
-        """使用DuckDuckGo进行搜索"""
-        cache_key = self._get_cache_key(query, "duckduckgo", max_results)
-        cached = self._get_from_cache(cache_key)
-        if cached is not None:
-            logger.debug(f"DuckDuckGo 缓存命中: {query}")
-            return cached
+    async def search_duckduckgo(self, query: str, max_results: int = 10) -> list:
+        """使用DuckDuckGo进行搜索"""
+        return await self._cached_search(
+            "duckduckgo", query, max_results, self._search_duckduckgo
+        )
+
+    async def _search_duckduckgo(self, query: str, max_results: int) -> list:
+        """实际请求 DuckDuckGo（不经过缓存）
+
+        按 DDG_MODE 组合即时答案 API 与 HTML 页面：API 有结果时优先返回，
+        否则使用 HTML 页面的结果（HTML 结果单独缓存）。
+        """
+        shape = self._query_shape(query)
+        if DDG_MODE == "adaptive" and not self._ddg_api_worthwhile(shape):
+            self._metrics["duckduckgo.api_skipped"] += 1
+            logger.debug(f"DuckDuckGo API 对该类查询命中率低，直接使用 HTML: {query}")
+            return await self.search_html_duckduckgo(query, max_results)
+
+        if DDG_MODE not in ("parallel", "adaptive"):
+            results = await self._search_duckduckgo_api(query, max_results)
+            self._record_ddg_api(shape, bool(results))
+            return results or await self.search_html_duckduckgo(query, max_results)
+
+        # 同时请求 HTML 页面，API 没有结果时无需再等一次往返
+        html_task = asyncio.ensure_future(
+            self.search_html_duckduckgo(query, max_results)
+        )
+        try:
+            results = await self._search_duckduckgo_api(query, max_results)
+            self._record_ddg_api(shape, bool(results))
+            return results or await html_task
+        finally:
+            if not html_task.done():
+                html_task.cancel()
+                await asyncio.gather(html_task, return_exceptions=True)
+
+    @staticmethod
+    def _query_shape(query: str) -> str:
+        """粗略描述查询形态：词数、是否为问句、是否含中日韩文字"""
+        words = len(query.split())
+        bucket = "1" if words <= 1 else "2-3" if words <= 3 else "4+"
+        question = query.rstrip().endswith(("?", "？")) or bool(
+            re.match(r"(?i)(what|who|when|where|why|how|define)\b", query.strip())
+        )
+        cjk = bool(re.search(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]", query))
+        return f"{bucket}:{'q' if question else 'k'}:{'cjk' if cjk else 'latin'}"
+
+    @classmethod
+    def _record_ddg_api(cls, shape: str, hit: bool) -> None:
+        stats = cls._ddg_api_stats.setdefault(shape, [0.0, 0.0])
+        stats[0] = stats[0] * MIRROR_STATS_DECAY + (1 if hit else 0)
+        stats[1] = stats[1] * MIRROR_STATS_DECAY + 1
+
+    @classmethod
+    def _ddg_api_worthwhile(cls, shape: str) -> bool:
+        """该形态的查询是否值得请求即时答案 API（样本不足或偶尔探索时返回 True）"""
+        hits, attempts = cls._ddg_api_stats.get(shape, (0.0, 0.0))
+        if attempts < DDG_API_MIN_SAMPLES or random.random() < DDG_API_EXPLORE_RATE:
+            return True
+        return hits / attempts >= DDG_API_MIN_HIT_RATE
+
+    async def _search_duckduckgo_api(self, query: str, max_results: int) -> list:
+        """请求 DuckDuckGo 即时答案 API，失败或没有结果时返回空列表"""
         try:
             # DuckDuckGo即时答案API
             url = f"https://api.duckduckgo.com/?q={quote_plus(query)}&format=json&no_html=1&skip_disambig=1"
 
-            async with self.session.get(
-                url, timeout=aiohttp.ClientTimeout(total=10)
+            async with self._request(
+                "get", url, timeout=self._request_timeout(10)
             ) as response:
                 if response.status in (200, 202):
                     # 尝试获取文本，手动解析JSON
@@ -339,12 +2540,10 @@ class WebSearcher:
                                 logger.warning(
                                     "DuckDuckGo API返回非JSON响应，尝试备用方法"
                                 )
-                                return await self.search_html_duckduckgo(
-                                    query, max_results
-                                )
+                                return []
                         else:
                             logger.warning("DuckDuckGo API返回非JSON响应，尝试备用方法")
-                            return await self.search_html_duckduckgo(query, max_results)
+                            return []
 
                     results = []
                     seen_urls: set[str] = set()
@@ -402,28 +2601,29 @@ class WebSearcher:
                                 }
                             )
 
-                    # 如果没有返回任何结果，尝试HTML模式
-                    if not results:
-                        return await self.search_html_duckduckgo(query, max_results)
-
-                    self._set_to_cache(cache_key, results)
                     return results
                 else:
                     logger.warning(
                         f"DuckDuckGo API 返回非预期状态码: {response.status}"
                     )
-                    return await self.search_html_duckduckgo(query, max_results)
+                    return []
         except Exception as e:
-            logger.error(f"DuckDuckGo搜索错误: {e}")
+            logger.error(f"DuckDuckGo API 错误: {e}")
             return []
 
     async def search_html_duckduckgo(self, query: str, max_results: int = 10) -> list:
         """通过HTML页面搜索DuckDuckGo"""
+        return await self._cached_search(
+            "duckduckgo_html", query, max_results, self._search_html_duckduckgo
+        )
+
+    async def _search_html_duckduckgo(self, query: str, max_results: int) -> list:
+        """实际请求 DuckDuckGo HTML 页面（不经过缓存）"""
         try:
             url = f"https://html.duckduckgo.com/html/?q={quote_plus(query)}"
 
-            async with self.session.get(
-                url, timeout=aiohttp.ClientTimeout(total=10)
+            async with self._request(
+                "get", url, timeout=self._request_timeout(10)
             ) as response:
                 if response.status == 200:
                     html = await response.text()
@@ -459,9 +2659,11 @@ class WebSearcher:
                     logger.warning(
                         f"DuckDuckGo HTML 返回非预期状态码: {response.status}"
                     )
+                    _note_failure("http_status")
                     return []
         except Exception as e:
             logger.error(f"DuckDuckGo HTML搜索错误: {e}")
+            _note_failure(_failure_reason_for(e))
             return []
 
     async def search_bing(self, query: str, max_results: int = 10) -> list:
@@ -471,36 +2673,31 @@ class WebSearcher:
         注意: 不在 URL 中使用 mkt 参数，因为 Bing 会通过 mkt=zh-CN 在 bing.com 和 cn.bing.com
         之间形成无限重定向循环 (_safe_get 会自动剥离该参数)
         """
-        cache_key = self._get_cache_key(query, "bing", max_results)
-        cached = self._get_from_cache(cache_key)
-        if cached is not None:
-            logger.debug(f"Bing 缓存命中: {query}")
-            return cached
-        try:
-            # 不使用 mkt 参数，避免 Bing 重定向循环问题
-            url = (
-                f"https://www.bing.com/search?q={quote_plus(query)}&count={max_results}"
-            )
+        return await self._cached_search("bing", query, max_results, self._search_bing)
+
+    async def _search_bing(self, query: str, max_results: int) -> list:
+        """实际请求 Bing（不经过缓存），www.bing.com 与 cn.bing.com 竞速"""
+        # 不使用 mkt 参数，避免 Bing 重定向循环问题
+        path = f"/search?q={quote_plus(query)}&count={max_results}"
+        return await self._race_mirrors(
+            "bing",
+            [f"https://www.bing.com{path}", f"https://cn.bing.com{path}"],
+            lambda url: self._search_bing_mirror(url, max_results),
+        )
 
+    async def _search_bing_mirror(self, url: str, max_results: int) -> list:
+        """请求单个 Bing 域名并解析结果"""
+        try:
             response = await self._safe_get(
-                url, max_redirects=5, timeout=aiohttp.ClientTimeout(total=10)
+                url, max_redirects=5, timeout=self._request_timeout(10)
             )
-            if response is None or response.status != 200:
-                logger.warning(
-                    f"必应搜索失败: {response.status if response else 'None'}"
-                )
-                # 尝试 cn.bing.com 作为备用
-                cn_url = f"https://cn.bing.com/search?q={quote_plus(query)}&count={max_results}"
-                response = await self._safe_get(
-                    cn_url, max_redirects=5, timeout=aiohttp.ClientTimeout(total=10)
-                )
-
             if response is None:
                 return []
 
             # 只有在状态码为 200 时才读取响应体
             if response.status != 200:
                 logger.warning(f"必应返回非200状态码: {response.status}")
+                _note_failure("http_status")
                 return []
 
             html = await response.text()
@@ -513,6 +2710,7 @@ class WebSearcher:
                 or "captcha" in html_lower
             ):
                 logger.warning("Bing返回了验证码挑战页面，无法获取搜索结果")
+                _note_failure("captcha")
                 return []
 
             soup = BeautifulSoup(html, "html.parser")
@@ -534,8 +2732,8 @@ class WebSearcher:
             # 备用: 任何包含 h2 和 a 标签的 li
             if not result_items:
                 for li in soup.find_all("li"):
-                    h2_elem = li.find('h2')
-                    if h2_elem and h2_elem.find('a'):
+                    h2_elem = li.find("h2")
+                    if h2_elem and h2_elem.find("a"):
                         result_items.append(li)
                         if len(result_items) >= max_results * 2:
                             break
@@ -607,10 +2805,10 @@ class WebSearcher:
                     }
                 )
 
-            self._set_to_cache(cache_key, results)
             return results
         except Exception as e:
-            logger.error(f"必应搜索错误: {e}")
+            logger.error(f"必应搜索错误 ({url}): {e}")
+            _note_failure(_failure_reason_for(e))
             return []
 
     async def search_google(self, query: str, max_results: int = 10) -> list:
@@ -620,131 +2818,132 @@ class WebSearcher:
         特别是在非桌面环境中。此方法为尽力而为，不保证始终可用。
         建议使用 DuckDuckGo 作为默认搜索引擎。
         """
-        cache_key = self._get_cache_key(query, "google", max_results)
-        cached = self._get_from_cache(cache_key)
-        if cached is not None:
-            logger.debug(f"Google 缓存命中: {query}")
-            return cached
+        return await self._cached_search(
+            "google", query, max_results, self._search_google
+        )
+
+    async def _search_google(self, query: str, max_results: int) -> list:
+        """实际请求 Google（不经过缓存），多个域名竞速"""
+        params = urlencode(
+            {
+                "q": query,
+                "num": min(max_results, 10),
+                "hl": "en",
+            }
+        )
+        # 默认优先级，实际顺序由各域名的历史成功率决定
+        urls = [
+            f"https://www.google.com/search?{params}",
+            f"https://www.google.com.hk/search?{params}",
+            f"https://www.google.co.jp/search?{params}",
+        ]
+        return await self._race_mirrors(
+            "google", urls, lambda url: self._search_google_mirror(url, max_results)
+        )
+
+    async def _search_google_mirror(self, url: str, max_results: int) -> list:
+        """请求单个 Google 域名并解析结果"""
         try:
-            params = urlencode(
-                {
-                    "q": query,
-                    "num": min(max_results, 10),
-                    "hl": "en",
-                }
+            # 使用 _safe_get 避免重定向问题
+            response = await self._safe_get(
+                url,
+                max_redirects=3,
+                headers=self.headers,
+                timeout=self._request_timeout(10),
             )
-            # 按优先级尝试不同域名
-            urls_to_try = [
-                f"https://www.google.com/search?{params}",
-                f"https://www.google.com.hk/search?{params}",
-                f"https://www.google.co.jp/search?{params}",
-            ]
+            if response is None:
+                return []
+            if response.status != 200:
+                _note_failure("http_status")
+                return []
 
-            for url in urls_to_try:
-                try:
-                    # 使用 _safe_get 避免重定向问题
-                    response = await self._safe_get(
-                        url,
-                        max_redirects=3,
-                        headers=self.headers,
-                        timeout=aiohttp.ClientTimeout(total=10),
-                    )
-                    if response is None or response.status != 200:
-                        continue
+            html = await response.text()
 
-                    html = await response.text()
+            # 检测阻止
+            if not html or len(html) < 500:
+                logger.warning("Google 返回了空白或过短的页面，跳过")
+                _note_failure("short_page")
+                return []
+            if "captcha" in html.lower():
+                logger.warning("Google 返回了验证码页面，跳过")
+                _note_failure("captcha")
+                return []
 
-                    # 检测阻止
-                    if not html or len(html) < 500:
-                        logger.warning("Google 返回了空白或过短的页面，跳过")
-                        continue
-                    if "captcha" in html.lower():
-                        logger.warning("Google 返回了验证码页面，跳过")
-                        continue
+            soup = BeautifulSoup(html, "html.parser")
+            results = []
 
-                    soup = BeautifulSoup(html, "html.parser")
-                    results = []
+            # Google 搜索结果在 div#search 或 div#main 中
+            search_div = (
+                soup.find("div", id="search") or soup.find("div", id="main") or soup
+            )
 
-                    # Google 搜索结果在 div#search 或 div#main 中
-                    search_div = (
-                        soup.find("div", id="search")
-                        or soup.find("div", id="main")
-                        or soup
-                    )
+            # 方法1: 从 h3 中提取（标准搜索结果）
+            for h3 in search_div.find_all("h3"):
+                link = h3.find_parent("a")
+                if not link:
+                    link = h3.find("a")
+                if not link:
+                    continue
 
-                    # 方法1: 从 h3 中提取（标准搜索结果）
-                    for h3 in search_div.find_all("h3"):
-                        link = h3.find_parent("a")
-                        if not link:
-                            link = h3.find("a")
-                        if not link:
-                            continue
-
-                        href = link.get("href", "")
-                        # 处理 Google 的 /url?q= 重定向链接
-                        if href.startswith("/url?q="):
-                            parsed = urlparse(href)
-                            qs = parse_qs(parsed.query)
-                            href = qs.get("q", [href])[0]
-                        elif href.startswith("/"):
-                            href = "https://www.google.com" + href
-
-                        if not href.startswith("http"):
-                            continue
-
-                        title = h3.get_text(strip=True)
-                        if not title:
-                            continue
-
-                        # 查找摘要
-                        snippet = ""
-                        parent = link
-                        for _ in range(5):
-                            parent = parent.find_parent()
-                            if parent is None:
-                                break
-                            for cls_pattern in [
-                                r"st|aCOpRe",
-                                r"VwiC3b",
-                                r"lEBKPb",
-                                r"BNeawe",
-                            ]:
-                                snippet_div = parent.find(
-                                    "span", class_=re.compile(cls_pattern)
-                                )
-                                if snippet_div:
-                                    snippet = snippet_div.get_text(strip=True)
-                                    break
-                            if snippet:
-                                break
+                href = link.get("href", "")
+                # 处理 Google 的 /url?q= 重定向链接
+                if href.startswith("/url?q="):
+                    parsed = urlparse(href)
+                    qs = parse_qs(parsed.query)
+                    href = qs.get("q", [href])[0]
+                elif href.startswith("/"):
+                    href = "https://www.google.com" + href
 
-                        results.append(
-                            {
-                                "title": title,
-                                "url": href,
-                                "snippet": snippet[:300] if snippet else "",
-                                "type": "google_result",
-                            }
-                        )
+                if not href.startswith("http"):
+                    continue
 
-                        if len(results) >= max_results:
+                title = h3.get_text(strip=True)
+                if not title:
+                    continue
+
+                # 查找摘要
+                snippet = ""
+                parent = link
+                for _ in range(5):
+                    parent = parent.find_parent()
+                    if parent is None:
+                        break
+                    for cls_pattern in [
+                        r"st|aCOpRe",
+                        r"VwiC3b",
+                        r"lEBKPb",
+                        r"BNeawe",
+                    ]:
+                        snippet_div = parent.find(
+                            "span", class_=re.compile(cls_pattern)
+                        )
+                        if snippet_div:
+                            snippet = snippet_div.get_text(strip=True)
                             break
+                    if snippet:
+                        break
 
-                    if results:
-                        logger.info(f"Google 搜索返回 {len(results)} 条结果")
-                        self._set_to_cache(cache_key, results)
-                        return results
-                    else:
-                        logger.info("Google 搜索返回 0 条结果")
+                results.append(
+                    {
+                        "title": title,
+                        "url": href,
+                        "snippet": snippet[:300] if snippet else "",
+                        "type": "google_result",
+                    }
+                )
 
-                except (TimeoutError, aiohttp.ClientError) as e:
-                    logger.warning(f"Google 搜索 URL ({url}) 失败: {e}")
-                    continue
+                if len(results) >= max_results:
+                    break
 
-            return []
+            if results:
+                logger.info(f"Google 搜索返回 {len(results)} 条结果")
+            else:
+                logger.info("Google 搜索返回 0 条结果")
+            return results
 
         except Exception as e:
-            logger.error(f"Google 搜索错误: {e}")
+            logger.warning(f"Google 搜索 URL ({url}) 失败: {e}")
+            _note_failure(_failure_reason_for(e))
             return []
 
     async def search_serpapi(self, query: str, max_results: int = 10) -> list:
@@ -752,11 +2951,12 @@ class WebSearcher:
         文档: https://serpapi.com/search-api
         免费额度: 每月 100 次
         """
-        cache_key = self._get_cache_key(query, "serpapi", max_results)
-        cached = self._get_from_cache(cache_key)
-        if cached is not None:
-            logger.debug(f"SerpAPI 缓存命中: {query}")
-            return cached
+        return await self._cached_search(
+            "serpapi", query, max_results, self._search_serpapi
+        )
+
+    async def _search_serpapi(self, query: str, max_results: int) -> list:
+        """实际请求 SerpAPI（不经过缓存）"""
         try:
             if not SERPAPI_KEY:
                 logger.warning("SerpAPI Key 未配置")
@@ -770,8 +2970,8 @@ class WebSearcher:
                 "engine": "google",
             }
 
-            async with self.session.get(
-                url, params=params, timeout=aiohttp.ClientTimeout(total=30)
+            async with self._request(
+                "get", url, params=params, timeout=self._request_timeout(30)
             ) as response:
                 if response.status == 200:
                     data = await response.json()
@@ -790,16 +2990,18 @@ class WebSearcher:
                         )
 
                     logger.info(f"SerpAPI 返回 {len(results)} 条结果")
-                    self._set_to_cache(cache_key, results)
                     return results
                 elif response.status == 403:
                     logger.error("SerpAPI API Key 无效或配额用尽")
+                    _note_failure("auth")
                     return []
                 else:
                     logger.error(f"SerpAPI 请求失败: {response.status}")
+                    _note_failure("http_status")
                     return []
         except Exception as e:
             logger.error(f"SerpAPI 搜索错误: {e}")
+            _note_failure(_failure_reason_for(e))
             return []
 
     async def search_tavily(self, query: str, max_results: int = 10) -> list:
@@ -807,11 +3009,12 @@ class WebSearcher:
         文档: https://docs.tavily.com/
         免费额度: 每月 1000 次
         """
-        cache_key = self._get_cache_key(query, "tavily", max_results)
-        cached = self._get_from_cache(cache_key)
-        if cached is not None:
-            logger.debug(f"Tavily 缓存命中: {query}")
-            return cached
+        return await self._cached_search(
+            "tavily", query, max_results, self._search_tavily
+        )
+
+    async def _search_tavily(self, query: str, max_results: int) -> list:
+        """实际请求 Tavily（不经过缓存）"""
         try:
             if not TAVILY_API_KEY:
                 logger.warning("Tavily API Key 未配置")
@@ -827,8 +3030,8 @@ class WebSearcher:
                 "include_images": False,
             }
 
-            async with self.session.post(
-                url, json=payload, timeout=aiohttp.ClientTimeout(total=30)
+            async with self._request(
+                "post", url, json=payload, timeout=self._request_timeout(30)
             ) as response:
                 if response.status == 200:
                     data = await response.json()
@@ -847,32 +3050,341 @@ class WebSearcher:
                         )
 
                     logger.info(f"Tavily 返回 {len(results)} 条结果")
-                    self._set_to_cache(cache_key, results)
                     return results
                 elif response.status == 401:
                     logger.error("Tavily API Key 无效")
+                    _note_failure("auth")
                     return []
                 else:
                     logger.error(f"Tavily 请求失败: {response.status}")
+                    _note_failure("http_status")
                     return []
         except Exception as e:
             logger.error(f"Tavily 搜索错误: {e}")
+            _note_failure(_failure_reason_for(e))
             return []
 
-    async def get_page_content(self, url: str) -> str:
-        """获取网页内容"""
+    @classmethod
+    def _plan_engines(cls, search_engine: str, max_results: int) -> list[str]:
+        """search_engine 参数实际要查询的引擎（auto 按滚动统计挑选）"""
+        engines = _resolve_engines(search_engine)
+        if search_engine == "auto":
+            engines = cls._select_engines(engines, max_results)
+        return engines
+
+    async def _search_engine(self, engine: str, query: str, max_results: int) -> list:
+        """单个搜索引擎搜索"""
+        if engine == "duckduckgo":
+            # search_duckduckgo() 内部已有三层回退到 HTML，
+            # 无需在外层重复调用 search_html_duckduckgo()
+            return await self.search_duckduckgo(query, max_results)
+        elif engine == "bing":
+            return await self.search_bing(query, max_results)
+        elif engine == "google":
+            return await self.search_google(query, max_results)
+        elif engine == "serpapi":
+            return await self.search_serpapi(query, max_results)
+        elif engine == "tavily":
+            return await self.search_tavily(query, max_results)
+        return []
+
+    async def search(
+        self,
+        query: str,
+        max_results: int = 10,
+        search_engine: str = "both",
+        on_result: Callable[[str, list], Awaitable[None]] | None = None,
+        engines: list[str] | None = None,
+    ) -> tuple[list, list[str]]:
+        """按 search_engine 选择引擎并发搜索，合并去重
+
+        返回 (结果, 实际使用的引擎)。on_result 在每个引擎完成时被调用；
+        engines 为 _plan_engines() 预先选好的引擎，省略时在此选择。
+        """
+        if engines is None:
+            engines = self._plan_engines(search_engine, max_results)
+
+        # 一次往返从共享缓存预热所有引擎的结果
+        await self.warm_search_cache(
+            [self._get_cache_key(query, e) for e in engines], max_results
+        )
+
+        # 并发执行所有搜索，结果足够时不再等待较慢的引擎
+        finished = await self._hedged_gather(
+            {e: self._search_engine(e, query, max_results) for e in engines},
+            max_results,
+            on_result,
+        )
+
+        self._record_contributions(finished)
+
+        # 按引擎优先级合并结果并去重
+        seen_urls = set()
+        results = []
+        for e in engines:
+            for item in finished.get(e, []):
+                url = item.get("url", "")
+                if url and url not in seen_urls:
+                    seen_urls.add(url)
+                    results.append(item)
+
+        # 如果选择 both / auto，限制总结果数量
+        if search_engine in ("both", "auto"):
+            results = results[:max_results]
+        return results, engines
+
+    async def get_page_content(self, url: str, prefetch: bool = False) -> str:
+        """获取网页内容（prefetch=True 表示后台预取，不计入预取命中）"""
         # SSRF 防护：验证 URL 安全性
         validated = self._validate_url(url)
         if validated is None:
             logger.warning(f"SSRF 防护：拒绝访问不安全的 URL: {url}")
             return ""
+        canonical = self._canonicalize_url(validated)
+        cache_key = f"page:{canonical}"
+        if not prefetch and cache_key in self._prefetched:
+            # 预取正在下载（合并到同一请求）或结果仍在缓存中才算命中；
+            # 还在排队的预取被放弃，由本次读取自己下载
+            size = self._prefetched.pop(cache_key)
+            entry = self._page_cache.get(cache_key)
+            if cache_key in self._prefetch_queued:
+                self._prefetch_queued.discard(cache_key)
+                self._metrics["prefetch.late"] += 1
+            elif size is None or (
+                entry is not None and time.monotonic() - entry[1] <= PAGE_CACHE_TTL
+            ):
+                self._metrics["prefetch.hit"] += 1
+                logger.debug(f"预取命中: {canonical}")
+            else:
+                self._metrics["prefetch.wasted"] += 1
+
+        entry = self._page_cache.get(cache_key)
+        if entry is not None:
+            page, ts = entry
+            if time.monotonic() - ts <= PAGE_CACHE_TTL:
+                self._metrics["page.cache_hit"] += 1
+                logger.debug(f"网页内容缓存命中: {canonical}")
+                return page["content"]
+
+        async def fetch_and_cache() -> str:
+            # 过期但带校验器的条目用于条件请求，命中 304 时无需重新下载和解析
+            stale = None
+            entry = self._page_cache.get(cache_key)
+            if entry is not None and self._has_validators(entry[0]):
+                stale = entry[0]
+            stored = await self._shared_cache_get(
+                cache_key, PAGE_CACHE_TTL + PAGE_CACHE_REVALIDATE_SECONDS
+            )
+            if stored is not None:
+                page, age = self._as_page(stored[0]), stored[1]
+                if age <= PAGE_CACHE_TTL:
+                    logger.debug(f"网页内容共享缓存命中: {canonical}")
+                    self._page_cache[cache_key] = (page, time.monotonic() - age)
+                    return page["content"]
+                if stale is None and self._has_validators(page):
+                    stale = page
+
+            page = dict(stale) if stale is not None else {}
+            self._metrics["page.fetch"] += 1
+            content = await self._fetch_page_content(validated, page)
+            if content:
+                page = {
+                    "content": content,
+                    "etag": page.get("etag"),
+                    "last_modified": page.get("last_modified"),
+                }
+                self._page_cache[cache_key] = (page, time.monotonic())
+                await self._shared_cache_set(
+                    cache_key, page, PAGE_CACHE_TTL + PAGE_CACHE_REVALIDATE_SECONDS
+                )
+            else:
+                self._page_cache.pop(cache_key)
+            return content
+
+        return await self._coalesce(cache_key, fetch_and_cache, "")
+
+    @classmethod
+    def schedule_prefetch(cls, urls: list[str]) -> int:
+        """在后台预取前 PREFETCH_COUNT 个 URL 的网页正文，返回实际安排的数量
+
+        预取在低优先级通道中执行（最多 PREFETCH_CONCURRENCY 个同时下载），
+        同一主机超过 PREFETCH_PER_HOST 个或未读取的预取页面超过字节预算时跳过。
+        """
+        if PREFETCH_COUNT <= 0:
+            return 0
+        scheduled = 0
+        for url in urls[:PREFETCH_COUNT]:
+            try:
+                validated = cls._validate_url(url)
+                if validated is None:
+                    continue
+                cache_key = f"page:{cls._canonicalize_url(validated)}"
+                host = urlparse(validated).hostname or ""
+            except Exception as e:
+                # 搜索结果中的畸形 URL 直接跳过，预取不能影响搜索结果的返回
+                logger.debug(f"跳过无法预取的 URL {url}: {e}")
+                continue
+            entry = cls._page_cache.get(cache_key)
+            if cache_key in cls._prefetched or (
+                entry is not None and time.monotonic() - entry[1] <= PAGE_CACHE_TTL
+            ):
+                continue
+            if cls._prefetch_hosts[host] >= PREFETCH_PER_HOST:
+                cls._metrics["prefetch.skipped_host"] += 1
+                continue
+            if cls._prefetch_bytes() + PREFETCH_PENDING_BYTES > PREFETCH_MAX_BYTES:
+                cls._metrics["prefetch.skipped_budget"] += 1
+                break
+            cls._prefetched[cache_key] = None
+            cls._prefetch_queued.add(cache_key)
+            cls._prefetch_hosts[host] += 1
+            cls._metrics["prefetch.scheduled"] += 1
+            task = asyncio.ensure_future(cls._prefetch(validated, cache_key, host))
+            cls._prefetch_tasks.add(task)
+            task.add_done_callback(cls._prefetch_tasks.discard)
+            scheduled += 1
+        return scheduled
+
+    @classmethod
+    def _get_prefetch_lane(cls) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if cls._prefetch_lane is None or cls._prefetch_lane_loop is not loop:
+            cls._prefetch_lane = asyncio.Semaphore(max(1, PREFETCH_CONCURRENCY))
+            cls._prefetch_lane_loop = loop
+        return cls._prefetch_lane
+
+    @classmethod
+    async def _prefetch(cls, url: str, cache_key: str, host: str) -> None:
+        # 后台任务不受触发它的工具调用的时间预算限制
+        _deadline.set(None)
+        content = ""
+        try:
+            async with cls._get_prefetch_lane():
+                if cache_key not in cls._prefetched:
+                    return  # 排队期间已被读取
+                cls._prefetch_queued.discard(cache_key)
+                async with WebSearcher() as searcher:
+                    content = await searcher.get_page_content(url, prefetch=True)
+        except asyncio.CancelledError:
+            cls._prefetched.pop(cache_key, None)
+            cls._prefetch_queued.discard(cache_key)
+            raise
+        except Exception as e:
+            logger.debug(f"预取网页失败 {url}: {e}")
+        finally:
+            cls._prefetch_hosts[host] -= 1
+            if cls._prefetch_hosts[host] <= 0:
+                del cls._prefetch_hosts[host]
+        if cache_key not in cls._prefetched:
+            return  # 下载期间已被读取，已计入命中
+        if content:
+            cls._prefetched[cache_key] = _estimate_size(content)
+        else:
+            cls._prefetched.pop(cache_key)
+            cls._metrics["prefetch.failed"] += 1
+
+    @classmethod
+    def _prefetch_bytes(cls) -> int:
+        """未读取的预取页面占用的字节数；已过期或被淘汰的页面计为浪费并移除"""
+        now = time.monotonic()
+        total = 0
+        for cache_key, size in list(cls._prefetched.items()):
+            if size is None:
+                total += PREFETCH_PENDING_BYTES
+                continue
+            entry = cls._page_cache.get(cache_key)
+            if entry is None or now - entry[1] > PAGE_CACHE_TTL:
+                del cls._prefetched[cache_key]
+                cls._metrics["prefetch.wasted"] += 1
+                continue
+            total += size
+        return total
+
+    @classmethod
+    def get_prefetch_stats(cls) -> dict[str, Any]:
+        """返回预取的命中/浪费统计，用于调整 PREFETCH_COUNT
+
+        hit_ratio / waste_ratio 分别是已结束的预取中被读取、未被读取就过期或淘汰的比例；
+        late 是读取先于预取开始下载（预取被放弃）的次数。
+        """
+        pending_bytes = cls._prefetch_bytes()
+        metrics = cls._metrics
+        hits, wasted, failed, late = (
+            metrics["prefetch.hit"],
+            metrics["prefetch.wasted"],
+            metrics["prefetch.failed"],
+            metrics["prefetch.late"],
+        )
+        settled = hits + wasted + failed + late
+        return {
+            "scheduled": metrics["prefetch.scheduled"],
+            "settled": settled,
+            "hits": hits,
+            "wasted": wasted,
+            "failed": failed,
+            "late": late,
+            "pending": len(cls._prefetched),
+            "pending_bytes": pending_bytes,
+            "hit_ratio": round(hits / settled, 3) if settled else None,
+            "waste_ratio": round(wasted / settled, 3) if settled else None,
+        }
+
+    @classmethod
+    def _log_prefetch_stats(cls) -> None:
+        """把预取命中/浪费统计写入日志（由定期清理任务和 shutdown 调用）"""
+        stats = cls.get_prefetch_stats()
+        if stats["settled"] == cls._prefetch_logged:
+            return
+        cls._prefetch_logged = stats["settled"]
+        logger.info(
+            f"预取统计: 安排 {stats['scheduled']}，命中 {stats['hits']}，"
+            f"浪费 {stats['wasted']}，失败 {stats['failed']}，过晚 {stats['late']}，"
+            f"命中率 {stats['hit_ratio']}，浪费率 {stats['waste_ratio']}"
+        )
+
+    @staticmethod
+    def _as_page(value: Any) -> dict:
+        """将缓存值转换为页面条目（兼容旧版只存正文字符串的共享缓存）"""
+        if isinstance(value, dict):
+            return value
+        return {"content": value, "etag": None, "last_modified": None}
+
+    @staticmethod
+    def _has_validators(page: dict) -> bool:
+        return bool(page.get("etag") or page.get("last_modified"))
+
+    async def _fetch_page_content(self, url: str, page: dict | None = None) -> str:
+        """下载并提取网页正文（URL 需已通过 SSRF 验证）
+
+        page 为缓存的页面条目时发送 If-None-Match/If-Modified-Since，
+        服务器返回 304 则直接复用缓存正文；响应中的 ETag/Last-Modified
+        会写回 page 供下次条件请求使用。
+        """
+        if page is None:
+            page = {}
+        headers = {}
+        if page.get("etag"):
+            headers["If-None-Match"] = page["etag"]
+        if page.get("last_modified"):
+            headers["If-Modified-Since"] = page["last_modified"]
         try:
             response = await self._safe_get(
-                validated, max_redirects=3, timeout=aiohttp.ClientTimeout(total=10)
+                url,
+                max_redirects=3,
+                timeout=self._request_timeout(10),
+                **({"headers": headers} if headers else {}),
             )
-            if response is None or response.status != 200:
+            if response is None:
+                return ""
+            if response.status == 304 and page.get("content"):
+                self._metrics["page.not_modified"] += 1
+                logger.debug(f"网页未修改 (304)，复用缓存内容: {url}")
+                return page["content"]
+            if response.status != 200:
                 return ""
 
+            page["etag"] = response.headers.get("ETag")
+            page["last_modified"] = response.headers.get("Last-Modified")
             html = await response.text()
             soup = BeautifulSoup(html, "html.parser")
 
@@ -894,6 +3406,152 @@ class WebSearcher:
             return ""
 
 
+def _resolve_engines(search_engine: str) -> list[str]:
+    """search_engine 参数对应的候选引擎列表（含已配置 Key 的 API 引擎）"""
+    # 优先级：免费引擎 -> API Key 增强引擎
+    engines = {
+        "duckduckgo": ["duckduckgo"],
+        "bing": ["bing"],
+        "google": ["google"],
+        "serpapi": ["serpapi"],
+        "tavily": ["tavily"],
+        "both": ["duckduckgo", "google", "bing"],
+        "auto": ["duckduckgo", "google", "bing"],
+    }.get(search_engine, ["duckduckgo"])
+
+    # 如果有 SerpAPI Key，添加 SerpAPI 搜索（优先级最高）
+    if SERPAPI_KEY and "serpapi" not in engines:
+        engines.append("serpapi")
+
+    # 如果有 Tavily API Key，添加 Tavily 搜索
+    if TAVILY_API_KEY and "tavily" not in engines:
+        engines.append("tavily")
+    return engines
+
+
+def _format_results(results: list, excerpts: dict[str, str] | None = None) -> str:
+    """把搜索结果格式化为编号列表；excerpts 中有的 URL 附带正文摘录"""
+    formatted_results = []
+    for i, result in enumerate(results, 1):
+        text = (
+            f"{i}. **{result['title']}**\n"
+            f"   URL: {result['url']}\n"
+            f"   摘要: {result['snippet']}\n"
+            f"   类型: {result['type']}\n"
+        )
+        if excerpts is not None and result["url"] in excerpts:
+            text += (
+                f"   内容摘录: {excerpts[result['url']] or '（无法获取网页内容）'}\n"
+            )
+        formatted_results.append(text)
+    return "\n".join(formatted_results)
+
+
+def _host_semaphore(
+    limits: dict[str, asyncio.Semaphore], url: str
+) -> asyncio.Semaphore:
+    """按主机限制同时下载的页面数（BATCH_PER_HOST）"""
+    host = urlparse(url).hostname or ""
+    if host not in limits:
+        limits[host] = asyncio.Semaphore(max(1, BATCH_PER_HOST))
+    return limits[host]
+
+
+def _engine_description(search_engine: str, engines: list[str]) -> str:
+    """搜索引擎的展示名称"""
+    search_engines_used = {
+        "duckduckgo": "DuckDuckGo",
+        "bing": "必应",
+        "google": "Google",
+        "serpapi": "SerpAPI",
+        "tavily": "Tavily",
+        "both": "DuckDuckGo + Google + 必应",
+    }
+
+    # 添加活跃的 API 引擎
+    active_engines = []
+    if SERPAPI_KEY and search_engine != "serpapi":
+        active_engines.append("SerpAPI")
+    if TAVILY_API_KEY and search_engine != "tavily":
+        active_engines.append("Tavily")
+
+    engine_desc = search_engines_used.get(search_engine, "DuckDuckGo")
+    if active_engines:
+        engine_desc += " + " + " + ".join(active_engines)
+    if search_engine == "auto":
+        engine_desc = "自动选择: " + " + ".join(search_engines_used[e] for e in engines)
+    return engine_desc
+
+
+def _parse_max_results(value: Any, default: int = 10) -> int:
+    """解析 max_results 参数并限制在 schema 范围 1-20 内"""
+    try:
+        return max(1, min(int(value), 20))
+    except (ValueError, TypeError):
+        return default
+
+
+class _StreamNotifier:
+    """把单个引擎（或批量中单个查询）的结果推送给客户端
+
+    每次调用发送一条日志通知（data 中带该引擎的结果），
+    客户端请求了进度（progressToken）时同时发送进度通知。
+    批量工具通过 item_query 参数标明结果所属的查询。
+    """
+
+    def __init__(self, ctx: Any, tool: str, query: str | None, total: int):
+        self.ctx = ctx
+        self.tool = tool
+        self.query = query
+        self.total = total
+        self.completed = 0
+        self.progress_token = (
+            getattr(ctx.meta, "progressToken", None) if ctx.meta else None
+        )
+
+    async def __call__(
+        self, engine: str, results: list, item_query: str | None = None
+    ) -> None:
+        self.completed += 1
+        await self.ctx.session.send_log_message(
+            level="info",
+            data={
+                "tool": self.tool,
+                "query": self.query if item_query is None else item_query,
+                "engine": engine,
+                "results": results,
+            },
+            logger="web-search-server",
+        )
+        if self.progress_token is not None:
+            await self.ctx.session.send_progress_notification(
+                self.progress_token, self.completed, self.total
+            )
+
+    async def finish(self) -> None:
+        """返回最终结果前把进度补齐到 total（对冲取消的引擎不会单独推送）"""
+        if self.progress_token is None or self.completed >= self.total:
+            return
+        self.completed = self.total
+        try:
+            await self.ctx.session.send_progress_notification(
+                self.progress_token, self.total, self.total
+            )
+        except Exception as e:
+            logger.debug(f"发送最终进度失败: {e}")
+
+
+def _stream_notifier(
+    tool: str, query: str | None, total: int
+) -> _StreamNotifier | None:
+    """返回推送部分结果的回调；不在 MCP 请求上下文中时返回 None"""
+    try:
+        ctx = server.request_context
+    except LookupError:
+        return None
+    return _StreamNotifier(ctx, tool, query, total)
+
+
 @server.list_tools()
 async def handle_list_tools() -> list[Tool]:
     """列出可用工具"""
@@ -914,25 +3572,190 @@ async def handle_list_tools() -> list[Tool]:
                     },
                     "search_engine": {
                         "type": "string",
-                        "description": "搜索引擎选择：duckduckgo / bing / google / serpapi / tavily / both",
-                        "enum": ["duckduckgo", "bing", "google", "serpapi", "tavily", "both"],
+                        "description": "搜索引擎选择：duckduckgo / bing / google / serpapi / tavily / both / auto（按历史耗时和成功率自动选择）",
+                        "enum": [
+                            "duckduckgo",
+                            "bing",
+                            "google",
+                            "serpapi",
+                            "tavily",
+                            "both",
+                            "auto",
+                        ],
                         "default": "both",
                     },
+                    "deadline_ms": {
+                        "type": "integer",
+                        "description": "时间预算（毫秒），用尽时返回已获得的部分结果",
+                        "minimum": 1,
+                    },
+                    "stream": {
+                        "type": "boolean",
+                        "description": "每个搜索引擎完成时通过日志/进度通知推送其结果，最后仍返回合并结果",
+                        "default": False,
+                    },
                 },
                 "required": ["query"],
             },
         ),
+        Tool(
+            name="web_search_batch",
+            description="一次调用执行多个搜索查询（共享连接池、限制并发、相同查询只搜索一次），结果按查询分组返回",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "queries": {
+                        "type": "array",
+                        "description": f"查询列表（最多 {BATCH_MAX_QUERIES} 个），每项可单独指定引擎和结果数",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "query": {
+                                    "type": "string",
+                                    "description": "搜索查询字符串",
+                                },
+                                "max_results": {
+                                    "type": "integer",
+                                    "description": "最大结果数量（默认取外层 max_results）",
+                                    "minimum": 1,
+                                    "maximum": 20,
+                                },
+                                "search_engine": {
+                                    "type": "string",
+                                    "description": "搜索引擎选择（默认取外层 search_engine）",
+                                    "enum": [
+                                        "duckduckgo",
+                                        "bing",
+                                        "google",
+                                        "serpapi",
+                                        "tavily",
+                                        "both",
+                                        "auto",
+                                    ],
+                                },
+                            },
+                            "required": ["query"],
+                        },
+                        "minItems": 1,
+                        "maxItems": BATCH_MAX_QUERIES,
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": "每个查询的默认最大结果数量",
+                        "default": 10,
+                        "minimum": 1,
+                        "maximum": 20,
+                    },
+                    "search_engine": {
+                        "type": "string",
+                        "description": "每个查询的默认搜索引擎",
+                        "enum": [
+                            "duckduckgo",
+                            "bing",
+                            "google",
+                            "serpapi",
+                            "tavily",
+                            "both",
+                            "auto",
+                        ],
+                        "default": "both",
+                    },
+                    "deadline_ms": {
+                        "type": "integer",
+                        "description": "整个批量调用的时间预算（毫秒），用尽时返回已完成的查询",
+                        "minimum": 1,
+                    },
+                    "stream": {
+                        "type": "boolean",
+                        "description": "每个查询完成时通过日志/进度通知推送其结果，最后仍返回全部结果",
+                        "default": False,
+                    },
+                },
+                "required": ["queries"],
+            },
+        ),
         Tool(
             name="get_webpage_content",
             description="获取指定网页的文本内容",
             inputSchema={
                 "type": "object",
                 "properties": {
-                    "url": {"type": "string", "description": "要获取内容的网页URL"}
+                    "url": {"type": "string", "description": "要获取内容的网页URL"},
+                    "deadline_ms": {
+                        "type": "integer",
+                        "description": "时间预算（毫秒）",
+                        "minimum": 1,
+                    },
                 },
                 "required": ["url"],
             },
         ),
+        Tool(
+            name="get_webpage_content_batch",
+            description="并发获取多个网页的文本内容（同一主机限制并发），逐个返回内容或错误及耗时",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "urls": {
+                        "type": "array",
+                        "description": f"要获取内容的网页URL列表（最多 {BATCH_MAX_URLS} 个）",
+                        "items": {"type": "string"},
+                        "minItems": 1,
+                        "maxItems": BATCH_MAX_URLS,
+                    },
+                    "deadline_ms": {
+                        "type": "integer",
+                        "description": "整个批量调用的时间预算（毫秒），用尽时返回已完成的网页",
+                        "minimum": 1,
+                    },
+                },
+                "required": ["urls"],
+            },
+        ),
+        Tool(
+            name="search_and_read",
+            description="搜索并读取排名靠前的结果网页，返回附带正文摘录的搜索结果（引擎返回结果后立即开始下载网页）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "搜索查询字符串"},
+                    "max_results": {
+                        "type": "integer",
+                        "description": "最大结果数量",
+                        "default": 10,
+                        "minimum": 1,
+                        "maximum": 20,
+                    },
+                    "search_engine": {
+                        "type": "string",
+                        "description": "搜索引擎选择（同 web_search）",
+                        "enum": [
+                            "duckduckgo",
+                            "bing",
+                            "google",
+                            "serpapi",
+                            "tavily",
+                            "both",
+                            "auto",
+                        ],
+                        "default": "both",
+                    },
+                    "read_count": {
+                        "type": "integer",
+                        "description": "读取正文的前几个结果",
+                        "default": 3,
+                        "minimum": 1,
+                        "maximum": READ_MAX_PAGES,
+                    },
+                    "deadline_ms": {
+                        "type": "integer",
+                        "description": "搜索和读取网页共用的时间预算（毫秒），用尽时返回已获得的部分结果",
+                        "minimum": 1,
+                    },
+                },
+                "required": ["query"],
+            },
+        ),
     ]
 
 
@@ -942,111 +3765,51 @@ async def handle_call_tool(name: str, arguments: dict | None) -> list[TextConten
     if arguments is None:
         arguments = {}
 
+    try:
+        deadline_ms = int(arguments.get("deadline_ms") or DEFAULT_DEADLINE_MS)
+    except (ValueError, TypeError):
+        deadline_ms = DEFAULT_DEADLINE_MS
+
+    with _deadline_scope(deadline_ms):
+        return await _call_tool(name, arguments)
+
+
+async def _call_tool(name: str, arguments: dict) -> list[TextContent]:
+    """按工具名分发（在调用的时间预算内执行）"""
     if name == "web_search":
         query = arguments.get("query", "")
-        max_results = arguments.get("max_results", 10)
-        try:
-            max_results = max(1, min(int(max_results), 20))  # enforce schema bounds
-        except (ValueError, TypeError):
-            max_results = 10
+        max_results = _parse_max_results(arguments.get("max_results", 10))
         search_engine = arguments.get("search_engine", "both")
 
         if not query:
             return [TextContent(type="text", text="错误：搜索查询不能为空")]
 
         async with WebSearcher() as searcher:
-            # 并发执行多个搜索引擎搜索
-            async def search_with_fallback(engine: str):
-                """单个搜索引擎搜索，带备用方法"""
-                if engine == "duckduckgo":
-                    # search_duckduckgo() 内部已有三层回退到 HTML，
-                    # 无需在外层重复调用 search_html_duckduckgo()
-                    return await searcher.search_duckduckgo(query, max_results)
-                elif engine == "bing":
-                    return await searcher.search_bing(query, max_results)
-                elif engine == "google":
-                    return await searcher.search_google(query, max_results)
-                elif engine == "serpapi":
-                    return await searcher.search_serpapi(query, max_results)
-                elif engine == "tavily":
-                    return await searcher.search_tavily(query, max_results)
-                return []
-
-            # 根据选择的搜索引擎构建任务列表
-            # 优先级：免费引擎 -> API Key 增强引擎
-            engines = {
-                "duckduckgo": ["duckduckgo"],
-                "bing": ["bing"],
-                "google": ["google"],
-                "serpapi": ["serpapi"],
-                "tavily": ["tavily"],
-                "both": ["duckduckgo", "google", "bing"],
-            }.get(search_engine, ["duckduckgo"])
-
-            # 如果有 SerpAPI Key，添加 SerpAPI 搜索（优先级最高）
-            if SERPAPI_KEY and "serpapi" not in engines:
-                engines.append("serpapi")
-
-            # 如果有 Tavily API Key，添加 Tavily 搜索
-            if TAVILY_API_KEY and "tavily" not in engines:
-                engines.append("tavily")
-
-            # 并发执行所有搜索
-            tasks = [search_with_fallback(e) for e in engines]
-            results_list = await asyncio.gather(*tasks)
-
-            # 合并结果并去重
-            seen_urls = set()
-            results = []
-            for r in results_list:
-                for item in r:
-                    url = item.get("url", "")
-                    if url and url not in seen_urls:
-                        seen_urls.add(url)
-                        results.append(item)
-
-            # 如果选择 both，限制总结果数量
-            if search_engine == "both":
-                results = results[:max_results]
-
-            if not results:
-                return [TextContent(type="text", text="未找到相关搜索结果")]
-
-            # 格式化结果
-            formatted_results = []
-            for i, result in enumerate(results, 1):
-                formatted_results.append(
-                    f"{i}. **{result['title']}**\n"
-                    f"   URL: {result['url']}\n"
-                    f"   摘要: {result['snippet']}\n"
-                    f"   类型: {result['type']}\n"
-                )
-
-            search_engines_used = {
-                "duckduckgo": "DuckDuckGo",
-                "bing": "必应",
-                "google": "Google",
-                "serpapi": "SerpAPI",
-                "tavily": "Tavily",
-                "both": "DuckDuckGo + Google + 必应",
-            }
+            engines = searcher._plan_engines(search_engine, max_results)
+            notifier = (
+                _stream_notifier("web_search", query, len(engines))
+                if arguments.get("stream")
+                else None
+            )
+            results, engines = await searcher.search(
+                query, max_results, search_engine, notifier, engines
+            )
+            if notifier is not None:
+                await notifier.finish()
+            # 在后台预取排名靠前的网页，随后的 get_webpage_content 可以直接命中缓存
+            searcher.schedule_prefetch([item["url"] for item in results])
 
-            # 添加活跃的 API 引擎
-            active_engines = []
-            if SERPAPI_KEY and search_engine != "serpapi":
-                active_engines.append("SerpAPI")
-            if TAVILY_API_KEY and search_engine != "tavily":
-                active_engines.append("Tavily")
+        if not results:
+            return [TextContent(type="text", text="未找到相关搜索结果")]
 
-            engine_desc = search_engines_used.get(search_engine, "DuckDuckGo")
-            if active_engines:
-                engine_desc += " + " + " + ".join(active_engines)
+        response_text = (
+            f"搜索查询: {query}\n搜索引擎: {_engine_description(search_engine, engines)}\n\n"
+            + _format_results(results)
+        )
+        return [TextContent(type="text", text=response_text)]
 
-            response_text = (
-                f"搜索查询: {query}\n搜索引擎: {engine_desc}\n\n"
-                + "\n".join(formatted_results)
-            )
-            return [TextContent(type="text", text=response_text)]
+    elif name == "web_search_batch":
+        return await _web_search_batch(arguments)
 
     elif name == "get_webpage_content":
         url = arguments.get("url", "")
@@ -1056,7 +3819,11 @@ async def handle_call_tool(name: str, arguments: dict | None) -> list[TextConten
 
         # SSRF 防护：在入口处即验证 URL
         if WebSearcher._validate_url(url) is None:
-            return [TextContent(type="text", text="错误：URL 不安全，仅允许公网 HTTP(S) 地址")]
+            return [
+                TextContent(
+                    type="text", text="错误：URL 不安全，仅允许公网 HTTP(S) 地址"
+                )
+            ]
 
         async with WebSearcher() as searcher:
             content = await searcher.get_page_content(url)
@@ -1067,27 +3834,279 @@ async def handle_call_tool(name: str, arguments: dict | None) -> list[TextConten
             response_text = f"网页URL: {url}\n\n内容:\n{content}"
             return [TextContent(type="text", text=response_text)]
 
+    elif name == "get_webpage_content_batch":
+        return await _get_webpage_content_batch(arguments)
+
+    elif name == "search_and_read":
+        return await _search_and_read(arguments)
+
     else:
         return [TextContent(type="text", text=f"未知工具: {name}")]
 
 
+async def _web_search_batch(arguments: dict) -> list[TextContent]:
+    """批量搜索：相同的 (查询, 引擎) 只搜索一次，最多 BATCH_CONCURRENCY 个查询同时执行
+
+    所有查询共用进程级 session 和各引擎的限流器；结果按查询分组、按输入顺序返回，
+    stream 为 true 时每个查询完成即推送。
+    """
+    queries = arguments.get("queries")
+    if not isinstance(queries, list) or not queries:
+        return [TextContent(type="text", text="错误：查询列表不能为空")]
+    if len(queries) > BATCH_MAX_QUERIES:
+        return [
+            TextContent(type="text", text=f"错误：一次最多 {BATCH_MAX_QUERIES} 个查询")
+        ]
+    default_max = _parse_max_results(arguments.get("max_results", 10))
+    default_engine = arguments.get("search_engine", "both")
+
+    # 去重：(归一化查询, 引擎) -> [查询, 引擎, 最大结果数]，保持首次出现的顺序
+    batch: dict[tuple[str, str], list] = {}
+    for item in queries:
+        if isinstance(item, str):
+            item = {"query": item}
+        if not isinstance(item, dict):
+            continue
+        query = item.get("query")
+        if not isinstance(query, str) or not query.strip():
+            continue
+        engine = item.get("search_engine") or default_engine
+        max_results = _parse_max_results(
+            item.get("max_results", default_max), default_max
+        )
+        key = (WebSearcher._normalize_query(query), engine)
+        if key in batch:
+            batch[key][2] = max(batch[key][2], max_results)
+        else:
+            batch[key] = [query, engine, max_results]
+    if not batch:
+        return [TextContent(type="text", text="错误：查询列表不能为空")]
+
+    notifier = (
+        _stream_notifier("web_search_batch", None, len(batch))
+        if arguments.get("stream")
+        else None
+    )
+    semaphore = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+    outcomes: dict[tuple[str, str], tuple[list, list[str]]] = {}
+
+    async with WebSearcher() as searcher:
+
+        async def run(key: tuple[str, str]) -> None:
+            query, engine, max_results = batch[key]
+            async with semaphore:
+                if _budget_exhausted():
+                    return
+                try:
+                    outcomes[key] = await searcher.search(query, max_results, engine)
+                except Exception as e:
+                    logger.error(f"批量搜索 {query!r} 异常: {e}")
+                    outcomes[key] = ([], [])
+            if notifier is not None:
+                try:
+                    await notifier(engine, outcomes[key][0], item_query=query)
+                except Exception as e:
+                    logger.debug(f"推送查询 {query!r} 的结果失败: {e}")
+
+        tasks = [asyncio.ensure_future(run(key)) for key in batch]
+        try:
+            await asyncio.wait(tasks, timeout=_remaining_budget())
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    if notifier is not None:
+        await notifier.finish()
+
+    sections = []
+    for key, (query, engine, _) in batch.items():
+        if key not in outcomes:
+            body = "时间预算已用尽，未完成"
+        elif not outcomes[key][0]:
+            body = "未找到相关搜索结果"
+        else:
+            results, engines = outcomes[key]
+            body = (
+                f"搜索引擎: {_engine_description(engine, engines)}\n\n"
+                + _format_results(results)
+            )
+        sections.append(f"## 搜索查询: {query}\n{body}")
+
+    header = f"批量搜索: {len(queries)} 个查询"
+    if len(batch) < len(queries):
+        header += f"（去重后 {len(batch)} 个）"
+    return [TextContent(type="text", text=header + "\n\n" + "\n\n".join(sections))]
+
+
+async def _get_webpage_content_batch(arguments: dict) -> list[TextContent]:
+    """批量获取网页正文：先对所有 URL 做 SSRF 验证，再通过共享连接池并发下载
+
+    同一主机最多 BATCH_PER_HOST 个页面同时下载；每个 URL 单独返回正文或错误及耗时，
+    结果按输入顺序排列，重复的 URL 只下载一次。
+    """
+    urls = arguments.get("urls")
+    if not isinstance(urls, list) or not urls:
+        return [TextContent(type="text", text="错误：URL 列表不能为空")]
+    if len(urls) > BATCH_MAX_URLS:
+        return [
+            TextContent(type="text", text=f"错误：一次最多 {BATCH_MAX_URLS} 个 URL")
+        ]
+    urls = [url if isinstance(url, str) else "" for url in urls]
+
+    # SSRF 防护：在入口处验证全部 URL，不安全的直接报错，不发起任何请求
+    outcomes: dict[str, tuple[str | None, str | None, float]] = {}
+    pending: list[str] = []
+    for url in urls:
+        if url in outcomes or url in pending:
+            continue
+        if not url:
+            outcomes[url] = (None, "URL不能为空", 0.0)
+        elif WebSearcher._validate_url(url) is None:
+            outcomes[url] = (None, "URL 不安全，仅允许公网 HTTP(S) 地址", 0.0)
+        else:
+            pending.append(url)
+
+    host_limits: dict[str, asyncio.Semaphore] = {}
+
+    async with WebSearcher() as searcher:
+
+        async def fetch(url: str) -> None:
+            async with _host_semaphore(host_limits, url):
+                started = time.monotonic()
+                if _budget_exhausted():
+                    return
+                content = await searcher.get_page_content(url)
+                elapsed = time.monotonic() - started
+            if content:
+                outcomes[url] = (content, None, elapsed)
+            else:
+                outcomes[url] = (None, "无法获取网页内容或网页为空", elapsed)
+
+        tasks = [asyncio.ensure_future(fetch(url)) for url in pending]
+        try:
+            if tasks:
+                await asyncio.wait(tasks, timeout=_remaining_budget())
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    sections = []
+    seen = set()
+    for url in urls:
+        if url in seen:
+            continue
+        seen.add(url)
+        if url not in outcomes:
+            sections.append(f"## 网页URL: {url}\n错误：时间预算已用尽，未完成")
+            continue
+        content, error, elapsed = outcomes[url]
+        if error:
+            body = f"错误：{error}"
+        else:
+            body = f"内容:\n{content}"
+        sections.append(f"## 网页URL: {url}\n耗时: {_to_ms(elapsed)} ms\n\n{body}")
+
+    header = f"批量获取网页: {len(seen)} 个 URL"
+    return [TextContent(type="text", text=header + "\n\n" + "\n\n".join(sections))]
+
+
+async def _search_and_read(arguments: dict) -> list[TextContent]:
+    """搜索并读取前 read_count 个结果的网页正文（流水线执行）
+
+    每个引擎返回时即开始下载其排名靠前的网页，不必等所有引擎合并；
+    合并后只等待最终排在前面的网页，其余预先开始的下载被取消
+    （已下载完成的仍留在网页缓存中）。搜索和读取共用同一时间预算。
+    """
+    query = arguments.get("query", "")
+    if not query:
+        return [TextContent(type="text", text="错误：搜索查询不能为空")]
+    max_results = _parse_max_results(arguments.get("max_results", 10))
+    search_engine = arguments.get("search_engine", "both")
+    try:
+        read_count = max(1, min(int(arguments.get("read_count", 3)), READ_MAX_PAGES))
+    except (ValueError, TypeError):
+        read_count = 3
+    read_count = min(read_count, max_results)
+
+    fetches: dict[str, asyncio.Task] = {}
+    host_limits: dict[str, asyncio.Semaphore] = {}
+
+    async with WebSearcher() as searcher:
+
+        async def read(url: str) -> str:
+            async with _host_semaphore(host_limits, url):
+                return await searcher.get_page_content(url)
+
+        def start(url: str) -> None:
+            if (
+                url
+                and url not in fetches
+                and WebSearcher._validate_url(url) is not None
+            ):
+                fetches[url] = asyncio.ensure_future(read(url))
+
+        async def on_result(engine: str, results: list) -> None:
+            for item in results[:read_count]:
+                start(item.get("url", ""))
+
+        try:
+            results, engines = await searcher.search(
+                query, max_results, search_engine, on_result
+            )
+            top = [item["url"] for item in results[:read_count]]
+            for url in top:
+                start(url)
+            wanted = [fetches[url] for url in top if url in fetches]
+            if wanted:
+                await asyncio.wait(wanted, timeout=_remaining_budget())
+        finally:
+            unused = [task for url, task in fetches.items() if not task.done()]
+            for task in unused:
+                task.cancel()
+            await asyncio.gather(*unused, return_exceptions=True)
+
+    if not results:
+        return [TextContent(type="text", text="未找到相关搜索结果")]
+
+    excerpts = {}
+    for url in top:
+        task = fetches.get(url)
+        content = ""
+        if task is not None and not task.cancelled() and task.exception() is None:
+            content = task.result()
+        excerpts[url] = content[:READ_EXCERPT_CHARS]
+    discarded = sum(1 for url in fetches if url not in excerpts)
+    if discarded:
+        WebSearcher._metrics["read.discarded"] += discarded
+
+    response_text = (
+        f"搜索查询: {query}\n搜索引擎: {_engine_description(search_engine, engines)}\n\n"
+        + _format_results(results, excerpts)
+    )
+    return [TextContent(type="text", text=response_text)]
+
+
 async def main():
     # 运行服务器使用stdio传输
     from mcp.server.stdio import stdio_server
 
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="web-search-server",
-                server_version=__version__,
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="web-search-server",
+                    server_version=__version__,
+                    capabilities=server.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={},
+                    ),
                 ),
-            ),
-        )
+            )
+    finally:
+        await WebSearcher.shutdown()
 
 
 if __name__ == "__main__":
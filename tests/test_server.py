@@ -2,13 +2,16 @@
 测试用例 for heventure-search-mcp
 """
 
+import asyncio
 import json
 import os
 import sys
 from unittest.mock import AsyncMock, MagicMock
+from urllib.parse import urlparse
 
 import aiohttp
 import pytest
+import pytest_asyncio
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -28,6 +31,21 @@ spec.loader.exec_module(server)
 WebSearcher = server.WebSearcher
 
 
+@pytest.fixture(autouse=True)
+def reset_rate_limiters():
+    """每个测试使用全新的限流器，避免令牌在测试之间耗尽"""
+    WebSearcher._limiters.clear()
+    yield
+    WebSearcher._limiters.clear()
+
+
+@pytest_asyncio.fixture
+async def close_session():
+    """测试结束时关闭期间创建的共享 session"""
+    yield
+    await WebSearcher.close_shared_session()
+
+
 class TestWebSearcher:
     """WebSearcher 测试类"""
 
@@ -206,6 +224,7 @@ class TestWebSearcher:
         # 创建正确的异步上下文管理器 mock
         mock_response = AsyncMock()
         mock_response.status = 200
+        mock_response.headers = {}
         mock_response.text = async_text
 
         # 创建一个支持 async with 的 mock
@@ -660,13 +679,15 @@ class TestCache:
 
     def test_cache_lru_eviction(self):
         """测试缓存超过最大大小时触发淘汰"""
-        for i in range(WebSearcher._cache_max_size):
+        for i in range(WebSearcher._search_cache.max_entries):
             WebSearcher._set_to_cache(f"key_{i}", [{"title": f"Result {i}"}])
-        assert len(WebSearcher._search_cache) == WebSearcher._cache_max_size
+        assert len(WebSearcher._search_cache) == WebSearcher._search_cache.max_entries
 
-        # 写入第 101 个条目，触发淘汰（清除前 50 个）
+        # 写入第 101 个条目，触发淘汰（淘汰最久未使用的条目）
         WebSearcher._set_to_cache("overflow_key", [{"title": "Overflow"}])
-        assert len(WebSearcher._search_cache) < WebSearcher._cache_max_size + 1
+        assert (
+            len(WebSearcher._search_cache) < WebSearcher._search_cache.max_entries + 1
+        )
         # overflow_key 应该存在
         assert WebSearcher._get_from_cache("overflow_key") is not None
 
@@ -680,7 +701,10 @@ class TestCache:
 
         # 手动修改时间戳使其过期
         results_stored, old_ts = WebSearcher._search_cache[key]
-        WebSearcher._search_cache[key] = (results, old_ts - WebSearcher._cache_ttl_seconds - 1)
+        WebSearcher._search_cache[key] = (
+            results,
+            old_ts - WebSearcher._cache_ttl_seconds - 1,
+        )
 
         # 应该返回 None 并清理过期条目
         assert WebSearcher._get_from_cache(key) is None
@@ -688,32 +712,30 @@ class TestCache:
 
     def test_cache_key_generation(self):
         """测试缓存键生成"""
-        key1 = WebSearcher._get_cache_key("test query", "google", 10)
-        key2 = WebSearcher._get_cache_key("test query", "bing", 10)
-        key3 = WebSearcher._get_cache_key("test query", "google", 5)
+        key1 = WebSearcher._get_cache_key("test query", "google")
+        key2 = WebSearcher._get_cache_key("test query", "bing")
         assert key1 != key2  # 不同引擎
-        assert key1 != key3  # 不同 max_results
-        assert key1 == WebSearcher._get_cache_key("test query", "google", 10)
+        assert key1 == WebSearcher._get_cache_key("test query", "google")
 
     def test_cache_key_query_normalization(self):
         """测试缓存键的查询归一化：语义相同的查询产生相同缓存键"""
         # 大小写归一化
-        key1 = WebSearcher._get_cache_key("Python Tutorial", "google", 10)
-        key2 = WebSearcher._get_cache_key("python tutorial", "google", 10)
+        key1 = WebSearcher._get_cache_key("Python Tutorial", "google")
+        key2 = WebSearcher._get_cache_key("python tutorial", "google")
         assert key1 == key2, "大小写不同应产生相同缓存键"
 
         # 多空格归一化
-        key3 = WebSearcher._get_cache_key("Python  tutorial", "google", 10)
-        key4 = WebSearcher._get_cache_key("Python   tutorial", "google", 10)
+        key3 = WebSearcher._get_cache_key("Python  tutorial", "google")
+        key4 = WebSearcher._get_cache_key("Python   tutorial", "google")
         assert key3 == key4, "多空格应合并为单空格"
 
         # 首尾空格归一化
-        key5 = WebSearcher._get_cache_key("  Python tutorial  ", "google", 10)
-        key6 = WebSearcher._get_cache_key("Python tutorial", "google", 10)
+        key5 = WebSearcher._get_cache_key("  Python tutorial  ", "google")
+        key6 = WebSearcher._get_cache_key("Python tutorial", "google")
         assert key5 == key6, "首尾空格应被去除"
 
         # 组合场景
-        key7 = WebSearcher._get_cache_key("  Python  tutorial  ", "google", 10)
+        key7 = WebSearcher._get_cache_key("  Python  tutorial  ", "google")
         assert key7 == key6, "组合归一化应产生相同缓存键"
 
     def test_normalize_query(self):
@@ -721,19 +743,668 @@ class TestCache:
         assert WebSearcher._normalize_query("Hello World") == "hello world"
         assert WebSearcher._normalize_query("  spaces  ") == "spaces"
         assert WebSearcher._normalize_query("multiple   spaces") == "multiple spaces"
-        assert WebSearcher._normalize_query("Mixed CASE  With   Spaces") == "mixed case with spaces"
+        assert (
+            WebSearcher._normalize_query("Mixed CASE  With   Spaces")
+            == "mixed case with spaces"
+        )
 
     @pytest.mark.asyncio
     async def test_cache_hit_skips_network(self):
         """测试缓存命中时不发起网络请求"""
         WebSearcher._set_to_cache(
-            "duckduckgo:cached query:5",
-            [{"title": "Cached", "url": "https://cached.com", "snippet": "", "type": "cached"}],
+            "duckduckgo:cached query",
+            [
+                {
+                    "title": "Cached",
+                    "url": "https://cached.com",
+                    "snippet": "",
+                    "type": "cached",
+                }
+            ],
+            5,
         )
         async with WebSearcher() as searcher:
             results = await searcher.search_duckduckgo("cached query", max_results=5)
             assert len(results) == 1
             assert results[0]["title"] == "Cached"
+        await WebSearcher.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_larger_cached_list_serves_smaller_request(self):
+        """缓存了 20 条结果时，5 条的请求直接截取"""
+        results = [{"title": f"R{i}", "url": f"https://a.com/{i}"} for i in range(20)]
+        WebSearcher._set_to_cache(WebSearcher._get_cache_key("q", "bing"), results, 20)
+        searcher = WebSearcher()
+        searcher._search_bing = AsyncMock(return_value=[])
+        assert await searcher.search_bing("q", 5) == results[:5]
+        searcher._search_bing.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_smaller_cached_list_is_miss_when_more_needed(self):
+        """缓存的结果不够时重新请求，并用更大的列表替换缓存"""
+        key = WebSearcher._get_cache_key("q", "bing")
+        WebSearcher._set_to_cache(key, [{"title": f"R{i}"} for i in range(5)], 5)
+        more = [{"title": f"R{i}"} for i in range(10)]
+        searcher = WebSearcher()
+        searcher._search_bing = AsyncMock(return_value=more)
+        assert await searcher.search_bing("q", 10) == more
+        searcher._search_bing.assert_awaited_once_with("q", 10)
+        assert WebSearcher._get_from_cache(key, 10) == more
+
+    @pytest.mark.asyncio
+    async def test_smaller_result_finishing_last_keeps_larger_entry(self):
+        """并发的 20 条和 5 条请求，5 条的请求后完成时不覆盖 20 条的缓存"""
+        key = WebSearcher._get_cache_key("race", "bing")
+        large = [{"title": f"R{i}", "url": f"https://a.com/{i}"} for i in range(20)]
+
+        async def fetch(query, max_results):
+            if max_results == 5:
+                await asyncio.sleep(0.02)
+            return large[:max_results]
+
+        searcher = WebSearcher()
+        searcher._search_bing = fetch
+        await asyncio.gather(
+            searcher.search_bing("race", 20), searcher.search_bing("race", 5)
+        )
+        assert WebSearcher._get_from_cache(key, 20) == large
+
+    def test_exhausted_result_list_covers_larger_requests(self):
+        """引擎返回的结果少于请求数时，更大的请求也直接命中"""
+        key = WebSearcher._get_cache_key("rare query", "google")
+        WebSearcher._set_to_cache(key, [{"title": "only"}], 10)
+        assert WebSearcher._get_from_cache(key, 8) == [{"title": "only"}]
+        assert WebSearcher._get_from_cache(key, 20) is None
+
+    def test_cache_hit_promotes_entry(self):
+        """命中的条目被提升，淘汰时保留热点条目"""
+        for i in range(WebSearcher._search_cache.max_entries):
+            WebSearcher._set_to_cache(f"key_{i}", [{"title": f"Result {i}"}])
+        assert WebSearcher._get_from_cache("key_0") is not None
+
+        WebSearcher._set_to_cache("overflow_key", [{"title": "Overflow"}])
+        assert len(WebSearcher._search_cache) == WebSearcher._search_cache.max_entries
+        assert WebSearcher._get_from_cache("key_0") is not None
+        assert WebSearcher._get_from_cache("key_1") is None
+
+    def test_lru_cache_byte_bound(self):
+        """超过字节上限时淘汰最久未使用的条目"""
+        cache = server.LRUCache(max_entries=100, max_bytes=1000)
+        cache["a"] = ("x" * 400, 0.0)
+        cache["b"] = ("y" * 400, 0.0)
+        cache["c"] = ("z" * 400, 0.0)
+        assert "a" not in cache
+        assert "b" in cache and "c" in cache
+        assert cache.total_bytes == 800
+
+    def test_lru_cache_rejects_oversized_entry(self):
+        """单个条目超过字节上限时不缓存"""
+        cache = server.LRUCache(max_entries=10, max_bytes=100)
+        cache["small"] = ("s", 0.0)
+        cache["huge"] = ("h" * 1000, 0.0)
+        assert "huge" not in cache
+        assert "small" in cache
+
+    def test_lru_cache_overwrite_updates_size(self):
+        """覆盖写入时字节计数正确更新"""
+        cache = server.LRUCache(max_entries=10, max_bytes=1000)
+        cache["k"] = ("a" * 100, 0.0)
+        cache["k"] = ("b" * 10, 0.0)
+        assert len(cache) == 1
+        assert cache.total_bytes == 10
+        cache.pop("k")
+        assert cache.total_bytes == 0
+
+    def test_cache_expire_removes_stale_entries(self):
+        """expire() 批量清理过期条目"""
+        WebSearcher._set_to_cache("fresh", [{"title": "F"}])
+        WebSearcher._set_to_cache("stale", [{"title": "S"}])
+        results, ts = WebSearcher._search_cache["stale"]
+        WebSearcher._search_cache["stale"] = (
+            results,
+            ts - WebSearcher._cache_ttl_seconds - 1,
+        )
+
+        removed = WebSearcher._search_cache.expire(WebSearcher._cache_ttl_seconds)
+        assert removed == 1
+        assert "stale" not in WebSearcher._search_cache
+        assert "fresh" in WebSearcher._search_cache
+
+    @pytest.mark.asyncio
+    async def test_background_sweeper_expires_entries(self, monkeypatch):
+        """后台任务定期清理过期条目"""
+        monkeypatch.setattr(server, "CACHE_SWEEP_INTERVAL", 0.01)
+        WebSearcher._set_to_cache("stale", [{"title": "S"}])
+        results, ts = WebSearcher._search_cache["stale"]
+        WebSearcher._search_cache["stale"] = (
+            results,
+            ts - WebSearcher._cache_ttl_seconds - 1,
+        )
+        try:
+            WebSearcher.get_shared_session()
+            await asyncio.sleep(0.05)
+            assert "stale" not in WebSearcher._search_cache
+        finally:
+            await WebSearcher.shutdown()
+        assert WebSearcher._cache_sweeper is None
+
+
+class TestStaleWhileRevalidate:
+    """stale-while-revalidate 测试"""
+
+    @pytest.fixture
+    def searcher(self, monkeypatch):
+        WebSearcher.clear_cache()
+        monkeypatch.setattr(WebSearcher, "_cache_stale_seconds", 600)
+        return WebSearcher()
+
+    @staticmethod
+    def _age_entry(key, seconds):
+        results, ts = WebSearcher._search_cache[key]
+        WebSearcher._search_cache[key] = (results, ts - seconds)
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_returned_and_refreshed(self, searcher):
+        """宽限期内返回旧结果，后台刷新后缓存更新"""
+        key = WebSearcher._get_cache_key("q", "bing")
+        WebSearcher._set_to_cache(key, [{"title": "old"}], 5)
+        self._age_entry(key, WebSearcher._cache_ttl_seconds + 10)
+
+        fetch = AsyncMock(return_value=[{"title": "new"}])
+        searcher._search_bing = fetch
+
+        results = await searcher.search_bing("q", 5)
+        assert results == [{"title": "old"}]
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        fetch.assert_awaited_once()
+        assert WebSearcher._get_from_cache(key) == [{"title": "new"}]
+
+    @pytest.mark.asyncio
+    async def test_refresh_ignores_caller_deadline(self, searcher):
+        """后台刷新不继承触发它的调用的时间预算"""
+        key = WebSearcher._get_cache_key("q", "bing")
+        WebSearcher._set_to_cache(key, [{"title": "old"}], 5)
+        self._age_entry(key, WebSearcher._cache_ttl_seconds + 10)
+        budgets = []
+
+        async def fetch(query, max_results):
+            budgets.append(server._remaining_budget())
+            return [{"title": "new"}]
+
+        searcher._search_bing = fetch
+        with server._deadline_scope(1):
+            assert await searcher.search_bing("q", 5) == [{"title": "old"}]
+        await asyncio.sleep(0.01)
+        assert budgets == [None]
+        assert WebSearcher._get_from_cache(key) == [{"title": "new"}]
+
+    @pytest.mark.asyncio
+    async def test_entry_past_max_staleness_blocks(self, searcher):
+        """超过宽限期后阻塞等待新结果"""
+        key = WebSearcher._get_cache_key("q", "bing")
+        WebSearcher._set_to_cache(key, [{"title": "old"}], 5)
+        self._age_entry(key, WebSearcher._cache_ttl_seconds + 601)
+
+        searcher._search_bing = AsyncMock(return_value=[{"title": "new"}])
+        assert await searcher.search_bing("q", 5) == [{"title": "new"}]
+
+    @pytest.mark.asyncio
+    async def test_failed_refresh_keeps_stale_entry(self, searcher):
+        """后台刷新失败时保留旧结果"""
+        key = WebSearcher._get_cache_key("q", "bing")
+        WebSearcher._set_to_cache(key, [{"title": "old"}], 5)
+        self._age_entry(key, WebSearcher._cache_ttl_seconds + 10)
+
+        searcher._search_bing = AsyncMock(return_value=[])
+        assert await searcher.search_bing("q", 5) == [{"title": "old"}]
+        await asyncio.sleep(0)
+        assert WebSearcher._lookup_cache(key) == ([{"title": "old"}], True)
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self, monkeypatch):
+        """宽限期为 0 时过期条目按未命中处理"""
+        WebSearcher.clear_cache()
+        monkeypatch.setattr(WebSearcher, "_cache_stale_seconds", 0)
+        key = WebSearcher._get_cache_key("q", "bing")
+        WebSearcher._set_to_cache(key, [{"title": "old"}], 5)
+        self._age_entry(key, WebSearcher._cache_ttl_seconds + 1)
+
+        searcher = WebSearcher()
+        searcher._search_bing = AsyncMock(return_value=[{"title": "new"}])
+        assert await searcher.search_bing("q", 5) == [{"title": "new"}]
+
+
+class TestMemoryCacheBackend:
+    """进程内缓存后端测试"""
+
+    def test_memory_is_default_and_fallback(self, monkeypatch):
+        """memory、未知后端和缺少数据库路径的 sqlite 都使用进程内缓存"""
+        monkeypatch.setattr(server, "CACHE_DB_PATH", None)
+        for kind in ("memory", "unknown", "sqlite"):
+            backend = server.create_cache_backend(kind)
+            assert isinstance(backend, server.MemoryCacheBackend)
+            assert backend.search_cache is WebSearcher._search_cache
+            assert backend.page_cache is WebSearcher._page_cache
+
+    @pytest.mark.asyncio
+    async def test_reads_and_writes_in_process_caches(self):
+        """按键前缀读写搜索缓存和网页缓存，不额外保存副本"""
+        WebSearcher.clear_cache()
+        backend = server.create_cache_backend("memory")
+        value = {"results": [], "requested": 5}
+        await backend.set_many({"bing:q": value, "page:https://a.com/": {}}, ttl=60)
+        assert WebSearcher._search_cache["bing:q"][0] is value
+        assert "page:https://a.com/" in WebSearcher._page_cache
+        stored, stored_at = (await backend.get_many(["bing:q", "missing"]))["bing:q"]
+        assert stored is value
+        assert abs(stored_at - server.time.time()) < 1
+        await backend.delete("bing:q")
+        assert await backend.get("bing:q") is None
+        await backend.clear()
+        assert len(WebSearcher._page_cache) == 0
+
+
+class TestSQLiteCache:
+    """持久化缓存测试"""
+
+    @pytest.fixture
+    def db_path(self, tmp_path):
+        return str(tmp_path / "cache" / "search.db")
+
+    def test_set_and_get_roundtrip(self, db_path):
+        """写入后可读取，值经 JSON 往返"""
+        cache = server.SQLiteCache(db_path, max_entries=10, max_bytes=10000)
+        cache.set("k", [{"title": "标题"}], ttl=60)
+        value, stored_at = cache.get("k")
+        assert value == [{"title": "标题"}]
+        assert stored_at <= server.time.time()
+        cache.close()
+
+    def test_expired_entry_not_returned(self, db_path):
+        """过期条目不返回，并在整理时删除"""
+        cache = server.SQLiteCache(db_path, max_entries=10, max_bytes=10000)
+        cache.set("k", "v", ttl=-1)
+        assert cache.get("k") is None
+        assert cache.compact() == 1
+        cache.close()
+
+    def test_shared_between_connections(self, db_path):
+        """两个连接（模拟两个进程）共享同一数据库"""
+        writer = server.SQLiteCache(db_path, max_entries=10, max_bytes=10000)
+        reader = server.SQLiteCache(db_path, max_entries=10, max_bytes=10000)
+        writer.set("k", "v", ttl=60)
+        assert reader.get("k")[0] == "v"
+        mode = reader._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+        writer.close()
+        reader.close()
+
+    def test_compact_evicts_least_recently_accessed(self, db_path):
+        """超出条目上限时按最近访问时间淘汰"""
+        cache = server.SQLiteCache(db_path, max_entries=2, max_bytes=10000)
+        cache.set("a", "1", ttl=60)
+        cache.set("b", "2", ttl=60)
+        cache.set("c", "3", ttl=60)
+        cache._conn.execute("UPDATE cache SET accessed_at = 0 WHERE key = 'b'")
+        assert cache.compact() == 1
+        assert cache.get("b") is None
+        assert cache.get("a") is not None and cache.get("c") is not None
+        cache.close()
+
+    def test_compact_enforces_byte_limit(self, db_path):
+        """超出字节上限时淘汰到上限以内"""
+        cache = server.SQLiteCache(db_path, max_entries=100, max_bytes=50)
+        for i in range(5):
+            cache.set(f"k{i}", "x" * 18, ttl=60)  # 每条 20 字节（含引号）
+        cache.compact()
+        total = cache._conn.execute("SELECT SUM(size) FROM cache").fetchone()[0]
+        assert total <= 50
+        cache.close()
+
+    @pytest.mark.asyncio
+    async def test_backend_batch_writes_trigger_compaction(self, db_path, monkeypatch):
+        """通过后端接口批量写入时也按写入次数自动整理，不依赖后台清理"""
+        monkeypatch.setattr(server.SQLiteCache, "COMPACT_EVERY", 4)
+        backend = server.SQLiteCacheBackend(
+            server.SQLiteCache(db_path, max_entries=2, max_bytes=10000)
+        )
+        await backend.set_many({"a": "1", "b": "2", "c": "3"}, ttl=60)
+        await backend.set("d", "4", ttl=60)
+        (count,) = backend.store._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        assert count == 2
+        await backend.close()
+
+    @pytest.mark.asyncio
+    async def test_new_process_starts_warm(self, db_path, monkeypatch):
+        """内存缓存为空时从持久化缓存读取，不访问引擎"""
+        WebSearcher.clear_cache()
+        monkeypatch.setattr(server, "CACHE_DB_PATH", db_path)
+        monkeypatch.setattr(server, "CACHE_BACKEND", "sqlite")
+        monkeypatch.setattr(WebSearcher, "_shared_cache", None)
+        try:
+            searcher = WebSearcher()
+            results = [
+                {"title": "T", "url": "https://a.com", "snippet": "", "type": "x"}
+            ]
+            searcher._search_bing = AsyncMock(return_value=results)
+            assert await searcher.search_bing("q", 5) == results
+
+            WebSearcher.clear_cache()  # 模拟新进程
+            fresh = WebSearcher()
+            fresh._search_bing = AsyncMock(return_value=[])
+            assert await fresh.search_bing("q", 5) == results
+            fresh._search_bing.assert_not_awaited()
+            assert (
+                WebSearcher._get_from_cache(WebSearcher._get_cache_key("q", "bing"))
+                == results
+            )
+        finally:
+            await WebSearcher.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_page_content_persisted(self, db_path, monkeypatch):
+        """网页内容写入持久化缓存"""
+        monkeypatch.setattr(server, "CACHE_DB_PATH", db_path)
+        monkeypatch.setattr(server, "CACHE_BACKEND", "sqlite")
+        monkeypatch.setattr(WebSearcher, "_shared_cache", None)
+        try:
+            searcher = WebSearcher()
+            searcher._fetch_page_content = AsyncMock(return_value="content")
+            assert (
+                await searcher.get_page_content("https://example.com/doc") == "content"
+            )
+
+            other = WebSearcher()
+            other._fetch_page_content = AsyncMock(return_value="")
+            assert await other.get_page_content("https://example.com/doc") == "content"
+            other._fetch_page_content.assert_not_awaited()
+        finally:
+            await WebSearcher.shutdown()
+
+
+class FakeRedisServer:
+    """本地 Redis 协议替身：支持 GET/MGET/SET EX/DEL/SCAN，记录每次读到的命令批次"""
+
+    def __init__(self):
+        self.data = {}
+        self.batches = []
+        self.server = None
+        self.port = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    @staticmethod
+    async def _read_command(reader):
+        header = await reader.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    @staticmethod
+    def _bulk(value):
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _reply(self, args):
+        cmd = args[0].upper()
+        if cmd == b"MGET":
+            out = b"*%d\r\n" % (len(args) - 1)
+            return out + b"".join(self._bulk(self.data.get(k)) for k in args[1:])
+        if cmd == b"GET":
+            return self._bulk(self.data.get(args[1]))
+        if cmd == b"SET":
+            self.data[args[1]] = args[2]
+            return b"+OK\r\n"
+        if cmd == b"DEL":
+            removed = sum(1 for k in args[1:] if self.data.pop(k, None) is not None)
+            return b":%d\r\n" % removed
+        if cmd == b"SCAN":
+            prefix = args[3].rstrip(b"*")
+            keys = [k for k in self.data if k.startswith(prefix)]
+            return b"*2\r\n$1\r\n0\r\n*%d\r\n" % len(keys) + b"".join(
+                self._bulk(k) for k in keys
+            )
+        return b"-ERR unknown command\r\n"
+
+    async def _handle(self, reader, writer):
+        while True:
+            args = await self._read_command(reader)
+            if args is None:
+                break
+            batch = [args]
+            # 把已经到达缓冲区的命令视为同一批（流水线）
+            while reader._buffer:
+                batch.append(await self._read_command(reader))
+            self.batches.append([a[0].upper() for a in batch])
+            writer.write(b"".join(self._reply(a) for a in batch))
+            await writer.drain()
+        writer.close()
+
+
+class TestRedisCacheBackend:
+    """Redis 协议缓存后端测试"""
+
+    def test_cache_backend_is_abstract(self):
+        """后端必须实现读写、删除和清空接口"""
+        with pytest.raises(TypeError):
+            server.CacheBackend()
+
+    @pytest_asyncio.fixture
+    async def redis(self):
+        fake = await FakeRedisServer().start()
+        yield fake
+        await fake.stop()
+
+    @pytest.mark.asyncio
+    async def test_set_and_get_many(self, redis):
+        """批量写入后批量读取，MGET 只用一条命令"""
+        backend = server.RedisCacheBackend(f"redis://127.0.0.1:{redis.port}/0")
+        await backend.set_many({"a": [1], "b": {"x": "中文"}}, ttl=60)
+        found = await backend.get_many(["a", "b", "missing"])
+        assert found["a"][0] == [1]
+        assert found["b"][0] == {"x": "中文"}
+        assert "missing" not in found
+        assert redis.batches[-1] == [b"MGET"]
+        await backend.close()
+
+    @pytest.mark.asyncio
+    async def test_set_many_is_pipelined(self, redis):
+        """批量写入的多条 SET 在一次发送中到达服务端"""
+        backend = server.RedisCacheBackend(f"redis://127.0.0.1:{redis.port}/0")
+        await backend.set_many({f"k{i}": i for i in range(5)}, ttl=60)
+        assert redis.batches[-1] == [b"SET"] * 5
+        await backend.close()
+
+    @pytest.mark.asyncio
+    async def test_keys_and_values_are_stable(self, redis):
+        """键带固定版本前缀，值为与包版本无关的 JSON 信封"""
+        backend = server.RedisCacheBackend(f"redis://127.0.0.1:{redis.port}/0")
+        await backend.set("bing:q:5", ["r"], ttl=60)
+        raw = redis.data[b"hsm:v1:bing:q:5"]
+        envelope = json.loads(raw)
+        assert envelope["v"] == ["r"]
+        assert set(envelope) == {"v", "t"}
+        await backend.close()
+
+    @pytest.mark.asyncio
+    async def test_clear_only_removes_prefixed_keys(self, redis):
+        """clear() 只删除本服务前缀下的键"""
+        redis.data[b"other"] = b"keep"
+        backend = server.RedisCacheBackend(f"redis://127.0.0.1:{redis.port}/0")
+        await backend.set("k", 1, ttl=60)
+        await backend.clear()
+        assert redis.data == {b"other": b"keep"}
+        await backend.close()
+
+    @pytest.mark.asyncio
+    async def test_unreachable_server_treated_as_miss(self, redis, monkeypatch):
+        """后端不可用时按未命中处理，不影响搜索"""
+        port = redis.port
+        await redis.stop()
+        backend = server.RedisCacheBackend(f"redis://127.0.0.1:{port}/0", timeout=0.5)
+        monkeypatch.setattr(WebSearcher, "_shared_cache", backend)
+        WebSearcher.clear_cache()
+        searcher = WebSearcher()
+        searcher._search_bing = AsyncMock(return_value=[{"title": "T"}])
+        assert await searcher.search_bing("q", 5) == [{"title": "T"}]
+
+    @pytest.mark.asyncio
+    async def test_warm_search_cache_batches_engines(self, redis, monkeypatch):
+        """多个引擎的缓存键一次 MGET 预热到内存缓存"""
+        backend = server.RedisCacheBackend(f"redis://127.0.0.1:{redis.port}/0")
+        monkeypatch.setattr(WebSearcher, "_shared_cache", backend)
+        WebSearcher.clear_cache()
+        keys = [WebSearcher._get_cache_key("q", e) for e in ("bing", "google")]
+        await backend.set_many(
+            {k: WebSearcher._make_cache_value([{"title": k}], 5) for k in keys}, ttl=60
+        )
+
+        assert await WebSearcher.warm_search_cache(keys, 5) == 2
+        assert redis.batches[-1] == [b"MGET"]
+        assert WebSearcher._get_from_cache(keys[0]) == [{"title": keys[0]}]
+        await backend.close()
+
+
+class TestNegativeCache:
+    """失败结果负缓存测试"""
+
+    @pytest.fixture
+    def searcher(self):
+        WebSearcher.clear_cache()
+        WebSearcher._metrics.clear()
+        return WebSearcher()
+
+    @staticmethod
+    def _failing(reason):
+        async def fetch(query, max_results):
+            server._note_failure(reason)
+            return []
+
+        return AsyncMock(side_effect=fetch)
+
+    @pytest.mark.asyncio
+    async def test_captcha_failure_fails_fast(self, searcher):
+        """验证码失败后，相同查询不再访问引擎"""
+        searcher._search_google = self._failing("captcha")
+        assert await searcher.search_google("q", 5) == []
+        assert await searcher.search_google("q", 5) == []
+        assert searcher._search_google.await_count == 1
+        metrics = WebSearcher.get_metrics()
+        assert metrics["google.failure.captcha"] == 1
+        assert metrics["google.negative_cache_hit"] == 1
+
+    @pytest.mark.asyncio
+    async def test_engine_wide_failure_blocks_other_queries(self, searcher):
+        """验证码属于引擎级失败，其他查询也被跳过"""
+        searcher._search_bing = self._failing("captcha")
+        await searcher.search_bing("a", 5)
+        assert await searcher.search_bing("b", 5) == []
+        assert searcher._search_bing.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_empty_result_only_blocks_same_query(self, searcher):
+        """空结果只对同一查询生效"""
+        searcher._search_bing = AsyncMock(return_value=[])
+        await searcher.search_bing("a", 5)
+        await searcher.search_bing("a", 5)
+        await searcher.search_bing("b", 5)
+        assert searcher._search_bing.await_count == 2
+        assert WebSearcher.get_metrics()["bing.failure.empty"] == 2
+
+    def test_backoff_grows_and_is_capped(self, monkeypatch):
+        """连续失败时退避时间翻倍，且不超过上限"""
+        WebSearcher.clear_cache()
+        monkeypatch.setattr(server, "NEGATIVE_CACHE_TTL", 10.0)
+        monkeypatch.setattr(server, "NEGATIVE_CACHE_MAX_TTL", 35.0)
+        ttls = [WebSearcher._record_failure("k", "timeout") for _ in range(4)]
+        assert ttls == [10.0, 20.0, 35.0, 35.0]
+
+    @pytest.mark.asyncio
+    async def test_success_clears_failures(self, searcher):
+        """成功的请求清除该查询和引擎级的失败记录"""
+        key = WebSearcher._get_cache_key("q", "google")
+        # 已过退避期但仍保留连续失败次数的引擎级记录
+        WebSearcher._negative_cache["google:!timeout"] = ((0, 1, "timeout"), 0)
+        searcher._search_google = AsyncMock(return_value=[{"title": "ok"}])
+        assert await searcher.search_google("q", 5) == [{"title": "ok"}]
+        assert WebSearcher._check_negative_cache("google", key) is None
+        assert "google:!timeout" not in WebSearcher._negative_cache
+
+    @pytest.mark.asyncio
+    async def test_disabled_when_ttl_zero(self, searcher, monkeypatch):
+        """NEGATIVE_CACHE_TTL 为 0 时不缓存失败"""
+        monkeypatch.setattr(server, "NEGATIVE_CACHE_TTL", 0)
+        searcher._search_google = self._failing("captcha")
+        await searcher.search_google("q", 5)
+        await searcher.search_google("q", 5)
+        assert searcher._search_google.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_real_google_captcha_recorded(self, searcher):
+        """search_google 检测到验证码时记录 captcha 原因"""
+        html = "<html>" + "x" * 600 + "captcha</html>"
+        mock_response = AsyncMock()
+        mock_response.status = 200
+        mock_response.text = AsyncMock(return_value=html)
+        searcher._safe_get = AsyncMock(return_value=mock_response)
+        assert await searcher.search_google("q", 5) == []
+        assert WebSearcher.get_metrics()["google.failure.captcha"] == 1
+
+
+class TestSharedSession:
+    """进程级共享 session 测试"""
+
+    @pytest.mark.asyncio
+    async def test_searchers_share_one_session(self):
+        """多个 WebSearcher 复用同一个 session，退出上下文不关闭它"""
+        try:
+            async with WebSearcher() as s1:
+                first = s1.session
+            async with WebSearcher() as s2:
+                assert s2.session is first
+            assert not first.closed
+        finally:
+            await WebSearcher.shutdown()
+        assert first.closed
+
+    @pytest.mark.asyncio
+    async def test_session_recreated_after_close(self):
+        """关闭后再次获取会懒加载新的 session"""
+        try:
+            first = WebSearcher.get_shared_session()
+            await WebSearcher.close_shared_session()
+            second = WebSearcher.get_shared_session()
+            assert second is not first
+            assert not second.closed
+        finally:
+            await WebSearcher.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_connector_uses_pool_settings(self, monkeypatch):
+        """连接器使用配置的连接池参数和复用的 SSL 上下文"""
+        monkeypatch.setattr(server, "POOL_LIMIT", 42)
+        monkeypatch.setattr(server, "POOL_LIMIT_PER_HOST", 7)
+        monkeypatch.setattr(server, "SSL_VERIFY", True)
+        try:
+            session = WebSearcher.get_shared_session()
+            assert session.connector.limit == 42
+            assert session.connector.limit_per_host == 7
+            assert WebSearcher._get_ssl_context() is WebSearcher._get_ssl_context()
+        finally:
+            await WebSearcher.shutdown()
 
 
 class TestSearchSerpAPI:
@@ -935,13 +1606,15 @@ class TestHandleListTools:
     """Test handle_list_tools MCP dispatch"""
 
     @pytest.mark.asyncio
-    async def test_list_tools_returns_two_tools(self):
-        """Verify handle_list_tools returns web_search and get_webpage_content"""
+    async def test_list_tools_returns_all_tools(self):
+        """Verify handle_list_tools returns the search and page content tools"""
         tools = await server.handle_list_tools()
-        assert len(tools) == 2
         names = [t.name for t in tools]
         assert "web_search" in names
+        assert "web_search_batch" in names
         assert "get_webpage_content" in names
+        assert "get_webpage_content_batch" in names
+        assert "search_and_read" in names
 
     @pytest.mark.asyncio
     async def test_list_tools_web_search_schema(self):
@@ -1146,7 +1819,9 @@ class TestHandleCallTool:
 
         async with WebSearcher() as searcher:
             results = await searcher.search_duckduckgo("empty url test", max_results=10)
-        assert len(results) == 1, f"Expected 1 result (empty URL dedup), got {len(results)}"
+        assert len(results) == 1, (
+            f"Expected 1 result (empty URL dedup), got {len(results)}"
+        )
         assert results[0]["url"] == ""
 
     @pytest.mark.asyncio
@@ -1478,14 +2153,19 @@ class TestHandleCallTool:
         monkeypatch.setattr(WebSearcher, "__aenter__", mock_init)
         monkeypatch.setattr(WebSearcher, "__aexit__", mock_close)
         monkeypatch.setattr(WebSearcher, "search_duckduckgo", mock_ddg)
-        monkeypatch.setattr(WebSearcher, "search_html_duckduckgo", AsyncMock(return_value=[]))
+        monkeypatch.setattr(
+            WebSearcher, "search_html_duckduckgo", AsyncMock(return_value=[])
+        )
         monkeypatch.setattr(WebSearcher, "search_google", AsyncMock(return_value=[]))
         monkeypatch.setattr(WebSearcher, "search_bing", AsyncMock(return_value=[]))
 
         await server.handle_call_tool(
-            "web_search", {"query": "test", "search_engine": "duckduckgo", "max_results": 1000}
+            "web_search",
+            {"query": "test", "search_engine": "duckduckgo", "max_results": 1000},
+        )
+        assert received_max[-1] == 20, (
+            f"max_results should be clamped to 20, got {received_max[-1]}"
         )
-        assert received_max[-1] == 20, f"max_results should be clamped to 20, got {received_max[-1]}"
 
     @pytest.mark.asyncio
     async def test_max_results_clamped_below_minimum(self, monkeypatch):
@@ -1505,14 +2185,19 @@ class TestHandleCallTool:
         monkeypatch.setattr(WebSearcher, "__aenter__", mock_init)
         monkeypatch.setattr(WebSearcher, "__aexit__", mock_close)
         monkeypatch.setattr(WebSearcher, "search_duckduckgo", mock_ddg)
-        monkeypatch.setattr(WebSearcher, "search_html_duckduckgo", AsyncMock(return_value=[]))
+        monkeypatch.setattr(
+            WebSearcher, "search_html_duckduckgo", AsyncMock(return_value=[])
+        )
         monkeypatch.setattr(WebSearcher, "search_google", AsyncMock(return_value=[]))
         monkeypatch.setattr(WebSearcher, "search_bing", AsyncMock(return_value=[]))
 
         await server.handle_call_tool(
-            "web_search", {"query": "test", "search_engine": "duckduckgo", "max_results": -5}
+            "web_search",
+            {"query": "test", "search_engine": "duckduckgo", "max_results": -5},
+        )
+        assert received_max[-1] == 1, (
+            f"max_results should be clamped to 1, got {received_max[-1]}"
         )
-        assert received_max[-1] == 1, f"max_results should be clamped to 1, got {received_max[-1]}"
 
     @pytest.mark.asyncio
     async def test_max_results_non_integer_handled(self, monkeypatch):
@@ -1532,15 +2217,20 @@ class TestHandleCallTool:
         monkeypatch.setattr(WebSearcher, "__aenter__", mock_init)
         monkeypatch.setattr(WebSearcher, "__aexit__", mock_close)
         monkeypatch.setattr(WebSearcher, "search_duckduckgo", mock_ddg)
-        monkeypatch.setattr(WebSearcher, "search_html_duckduckgo", AsyncMock(return_value=[]))
+        monkeypatch.setattr(
+            WebSearcher, "search_html_duckduckgo", AsyncMock(return_value=[])
+        )
         monkeypatch.setattr(WebSearcher, "search_google", AsyncMock(return_value=[]))
         monkeypatch.setattr(WebSearcher, "search_bing", AsyncMock(return_value=[]))
 
         # String that looks like a number
         await server.handle_call_tool(
-            "web_search", {"query": "test", "search_engine": "duckduckgo", "max_results": "15"}
+            "web_search",
+            {"query": "test", "search_engine": "duckduckgo", "max_results": "15"},
+        )
+        assert received_max[-1] == 15, (
+            f"String '15' should be coerced to int 15, got {received_max[-1]}"
         )
-        assert received_max[-1] == 15, f"String '15' should be coerced to int 15, got {received_max[-1]}"
 
     @pytest.mark.asyncio
     async def test_max_results_non_numeric_string_defaults(self, monkeypatch):
@@ -1552,14 +2242,19 @@ class TestHandleCallTool:
             return []
 
         monkeypatch.setattr(WebSearcher, "search_duckduckgo", mock_search)
-        monkeypatch.setattr(WebSearcher, "search_html_duckduckgo", AsyncMock(return_value=[]))
+        monkeypatch.setattr(
+            WebSearcher, "search_html_duckduckgo", AsyncMock(return_value=[])
+        )
         monkeypatch.setattr(WebSearcher, "search_google", AsyncMock(return_value=[]))
         monkeypatch.setattr(WebSearcher, "search_bing", AsyncMock(return_value=[]))
 
         await server.handle_call_tool(
-            "web_search", {"query": "test", "search_engine": "duckduckgo", "max_results": "abc"}
+            "web_search",
+            {"query": "test", "search_engine": "duckduckgo", "max_results": "abc"},
+        )
+        assert received_max[-1] == 10, (
+            f"Non-numeric 'abc' should default to 10, got {received_max[-1]}"
         )
-        assert received_max[-1] == 10, f"Non-numeric 'abc' should default to 10, got {received_max[-1]}"
 
 
 class TestSSRFValidation:
@@ -1587,7 +2282,10 @@ class TestSSRFValidation:
 
     def test_validate_url_rejects_data_scheme(self):
         """data: 协议应被拒绝"""
-        assert WebSearcher._validate_url("data:text/html,<script>alert(1)</script>") is None
+        assert (
+            WebSearcher._validate_url("data:text/html,<script>alert(1)</script>")
+            is None
+        )
 
     def test_validate_url_rejects_javascript_scheme(self):
         """javascript: 协议应被拒绝"""
@@ -1628,8 +2326,13 @@ class TestSSRFValidation:
 
     def test_validate_url_rejects_cloud_metadata(self):
         """AWS/GCP/Azure 元数据端点应被拒绝"""
-        assert WebSearcher._validate_url("http://169.254.169.254/latest/meta-data/") is None
-        assert WebSearcher._validate_url("http://169.254.169.254/latest/user-data") is None
+        assert (
+            WebSearcher._validate_url("http://169.254.169.254/latest/meta-data/")
+            is None
+        )
+        assert (
+            WebSearcher._validate_url("http://169.254.169.254/latest/user-data") is None
+        )
 
     def test_validate_url_rejects_unspecified(self):
         """0.0.0.0 未指定地址应被拒绝"""
@@ -1663,7 +2366,9 @@ class TestSSRFValidation:
 
     def test_validate_url_allows_ipv6_public(self):
         """公网 IPv6 应通过验证"""
-        assert WebSearcher._validate_url("http://[2606:4700::1]") is not None  # Cloudflare IPv6
+        assert (
+            WebSearcher._validate_url("http://[2606:4700::1]") is not None
+        )  # Cloudflare IPv6
 
     @pytest.mark.asyncio
     async def test_get_webpage_content_rejects_ssrf(self, monkeypatch):
@@ -1715,57 +2420,14 @@ class TestSSRFRedirectBypass:
         WebSearcher.clear_cache()
         return WebSearcher()
 
-    def test_is_ip_private_resolves_private_hostname(self, monkeypatch):
-        """主机名解析到私有 IP 时应返回 True"""
-        import socket as _socket
-
-        def mock_getaddrinfo(host, port, *args, **kwargs):
-            return [
-                (_socket.AF_INET, _socket.SOCK_STREAM, 0, "", ("10.0.0.1", 0)),
-            ]
-
-        monkeypatch.setattr(_socket, "getaddrinfo", mock_getaddrinfo)
-        assert WebSearcher._is_ip_private("metadata.google.internal") is True
-
-    def test_is_ip_private_resolves_public_hostname(self, monkeypatch):
-        """主机名解析到公网 IP 时应返回 False"""
-        import socket as _socket
-
-        def mock_getaddrinfo(host, port, *args, **kwargs):
-            return [
-                (_socket.AF_INET, _socket.SOCK_STREAM, 0, "", ("93.184.216.34", 0)),
-            ]
-
-        monkeypatch.setattr(_socket, "getaddrinfo", mock_getaddrinfo)
-        assert WebSearcher._is_ip_private("example.com") is False
-
-    def test_is_ip_private_dns_failure_treated_as_private(self, monkeypatch):
-        """DNS 解析失败时应返回 True（安全默认值）"""
-        import socket as _socket
-
-        def mock_getaddrinfo(host, port, *args, **kwargs):
-            raise _socket.gaierror("Name resolution failed")
-
-        monkeypatch.setattr(_socket, "getaddrinfo", mock_getaddrinfo)
-        assert WebSearcher._is_ip_private("nonexistent.invalid") is True
-
-    def test_is_ip_private_raw_private_ip(self):
-        """原始私有 IP 字符串应返回 True"""
-        assert WebSearcher._is_ip_private("10.0.0.1") is True
-        assert WebSearcher._is_ip_private("192.168.1.1") is True
-        assert WebSearcher._is_ip_private("127.0.0.1") is True
-
-    def test_is_ip_private_raw_public_ip(self):
-        """原始公网 IP 字符串应返回 False"""
-        assert WebSearcher._is_ip_private("8.8.8.8") is False
-        assert WebSearcher._is_ip_private("1.1.1.1") is False
-
     @pytest.mark.asyncio
     async def test_safe_get_blocks_redirect_to_private_ip(self, searcher):
         """_safe_get 应阻止重定向到私有 IP（如 169.254.169.254）"""
         redirect_response = AsyncMock()
         redirect_response.status = 302
-        redirect_response.headers = {"Location": "http://169.254.169.254/latest/meta-data/"}
+        redirect_response.headers = {
+            "Location": "http://169.254.169.254/latest/meta-data/"
+        }
 
         mock_cm = MagicMock()
         mock_cm.__aenter__ = AsyncMock(return_value=redirect_response)
@@ -1828,3 +2490,2022 @@ class TestSSRFRedirectBypass:
         result = await searcher._safe_get("https://example.com/start")
         assert result == final_response
         assert mock_session.get.call_count == 2
+
+
+class FakeResolver:
+    """记录调用次数的假 DNS 解析器"""
+
+    def __init__(self, addresses, error=None):
+        self.addresses = addresses
+        self.error = error
+        self.calls = 0
+
+    async def resolve(self, host, port=0, family=0):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if self.error:
+            raise self.error
+        return [
+            {
+                "hostname": host,
+                "host": addr,
+                "port": port,
+                "family": family,
+                "proto": 0,
+                "flags": 0,
+            }
+            for addr in self.addresses
+        ]
+
+    async def close(self):
+        pass
+
+
+class TestCachingResolver:
+    """异步 DNS 缓存解析器测试"""
+
+    @pytest.fixture
+    def resolver(self, monkeypatch):
+        resolver = server.CachingResolver(ttl=60)
+        monkeypatch.setattr(WebSearcher, "_resolver", resolver)
+        return resolver
+
+    @staticmethod
+    def _install(resolver, fake, monkeypatch):
+        monkeypatch.setattr(resolver, "_get_resolver", lambda: fake)
+
+    @pytest.mark.asyncio
+    async def test_ssrf_check_and_connect_share_one_lookup(self, resolver, monkeypatch):
+        """SSRF 检查后连接器解析同一主机命中缓存，只解析一次"""
+        fake = FakeResolver(["93.184.216.34"])
+        self._install(resolver, fake, monkeypatch)
+
+        assert await WebSearcher._is_host_private("example.com") is False
+        hosts = await resolver.resolve("example.com", 443, family=0)
+        assert hosts[0]["host"] == "93.184.216.34"
+        assert hosts[0]["port"] == 443
+        assert fake.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_private_resolution_flagged(self, resolver, monkeypatch):
+        """任一解析地址为私有地址时判定为私有"""
+        self._install(
+            resolver, FakeResolver(["93.184.216.34", "10.0.0.1"]), monkeypatch
+        )
+        assert await WebSearcher._is_host_private("rebind.example") is True
+
+    @pytest.mark.asyncio
+    async def test_dns_failure_treated_as_private(self, resolver, monkeypatch):
+        """解析失败视为私有，且不缓存失败结果"""
+        fake = FakeResolver([], error=OSError("no such host"))
+        self._install(resolver, fake, monkeypatch)
+        assert await WebSearcher._is_host_private("nonexistent.invalid") is True
+        assert await WebSearcher._is_host_private("nonexistent.invalid") is True
+        assert fake.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_raw_ip_checked_without_lookup(self, resolver, monkeypatch):
+        """IP 字面量直接判断，不做 DNS 解析"""
+        fake = FakeResolver([], error=OSError("should not resolve"))
+        self._install(resolver, fake, monkeypatch)
+        for ip in ("10.0.0.1", "192.168.1.1", "127.0.0.1"):
+            assert await WebSearcher._is_host_private(ip) is True
+        for ip in ("8.8.8.8", "1.1.1.1"):
+            assert await WebSearcher._is_host_private(ip) is False
+        assert fake.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_lookups_deduplicated(self, resolver, monkeypatch):
+        """并发检查同一主机只触发一次解析"""
+        fake = FakeResolver(["93.184.216.34"])
+        self._install(resolver, fake, monkeypatch)
+        verdicts = await asyncio.gather(
+            *(WebSearcher._is_host_private("example.com") for _ in range(5))
+        )
+        assert verdicts == [False] * 5
+        assert fake.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_entry_resolved_again(self, resolver, monkeypatch):
+        """TTL 过期后重新解析"""
+        fake = FakeResolver(["93.184.216.34"])
+        self._install(resolver, fake, monkeypatch)
+        await resolver.resolve("example.com", 80, family=0)
+        hosts, private, _ = resolver._cache[("example.com", 0)]
+        resolver._cache[("example.com", 0)] = (hosts, private, 0)
+        await resolver.resolve("example.com", 80, family=0)
+        assert fake.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_safe_get_blocks_redirect_to_hostname_resolving_private(
+        self, resolver, monkeypatch
+    ):
+        """重定向到解析为私有地址的域名时被阻止"""
+        self._install(resolver, FakeResolver(["169.254.169.254"]), monkeypatch)
+
+        redirect_response = AsyncMock()
+        redirect_response.status = 302
+        redirect_response.headers = {"Location": "http://metadata.internal/latest"}
+        mock_cm = MagicMock()
+        mock_cm.__aenter__ = AsyncMock(return_value=redirect_response)
+        mock_cm.__aexit__ = AsyncMock(return_value=None)
+        mock_session = MagicMock()
+        mock_session.get = MagicMock(return_value=mock_cm)
+
+        searcher = WebSearcher()
+        searcher.session = mock_session
+        assert await searcher._safe_get("https://example.com/start") is None
+        assert mock_session.get.call_count == 1
+
+
+class TestRequestCoalescing:
+    """进行中请求合并（singleflight）测试"""
+
+    @pytest.fixture
+    def searcher(self):
+        WebSearcher.clear_cache()
+        return WebSearcher()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_searches_hit_network_once(self, searcher):
+        """相同查询并发调用只请求一次引擎"""
+        calls = 0
+
+        async def slow_fetch(query, max_results):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return [
+                {
+                    "title": "T",
+                    "url": "https://a.com",
+                    "snippet": "",
+                    "type": "bing_result",
+                }
+            ]
+
+        searcher._search_bing = slow_fetch
+        results = await asyncio.gather(
+            *(searcher.search_bing("Same  Query", 5) for _ in range(5))
+        )
+        assert calls == 1
+        assert all(r == results[0] for r in results)
+        assert not WebSearcher._inflight
+
+    @pytest.mark.asyncio
+    async def test_different_queries_not_coalesced(self, searcher):
+        """不同查询各自请求"""
+        calls = []
+
+        async def fetch(query, max_results):
+            calls.append(query)
+            await asyncio.sleep(0)
+            return []
+
+        searcher._search_google = fetch
+        await asyncio.gather(
+            searcher.search_google("a", 5), searcher.search_google("b", 5)
+        )
+        assert sorted(calls) == ["a", "b"]
+
+    @pytest.mark.asyncio
+    async def test_leader_cancellation_does_not_fail_followers(self, searcher):
+        """首个调用者被取消时，等待中的调用者仍能拿到结果"""
+        started = asyncio.Event()
+
+        async def fetch(query, max_results):
+            started.set()
+            await asyncio.sleep(0.02)
+            return [{"title": "T", "url": "https://a.com", "snippet": "", "type": "x"}]
+
+        searcher._search_duckduckgo = fetch
+        leader = asyncio.create_task(searcher.search_duckduckgo("q", 5))
+        await started.wait()
+        follower = asyncio.create_task(searcher.search_duckduckgo("q", 5))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert len(await follower) == 1
+
+    @pytest.mark.asyncio
+    async def test_leader_budget_does_not_apply_to_followers(self, searcher):
+        """首个调用者预算很短时，没有预算的等待者仍能拿到完整结果"""
+        started = asyncio.Event()
+
+        async def fetch(query, max_results):
+            started.set()
+            assert server._remaining_budget() is None
+            await asyncio.sleep(0.2)
+            return [{"title": "T", "url": "https://a.com", "snippet": "", "type": "x"}]
+
+        async def leader_search():
+            with server._deadline_scope(100):
+                return await searcher.search_bing("q", 5)
+
+        searcher._search_bing = fetch
+        leader = asyncio.create_task(leader_search())
+        await started.wait()
+        follower = asyncio.create_task(searcher.search_bing("q", 5))
+        assert await leader == []
+        assert len(await follower) == 1
+
+    @pytest.mark.asyncio
+    async def test_follower_wait_bounded_by_own_budget(self, searcher):
+        """等待者只等待自己的剩余预算，超时返回空结果"""
+        started = asyncio.Event()
+
+        async def fetch(url, page=None):
+            started.set()
+            await asyncio.sleep(0.3)
+            return "content"
+
+        async def follower_read():
+            with server._deadline_scope(50):
+                return await searcher.get_page_content("https://example.com/doc")
+
+        searcher._fetch_page_content = fetch
+        leader = asyncio.create_task(
+            searcher.get_page_content("https://example.com/doc")
+        )
+        await started.wait()
+        begin = server.time.monotonic()
+        assert await follower_read() == ""
+        assert server.time.monotonic() - begin < 0.2
+        assert await leader == "content"
+
+    @pytest.mark.asyncio
+    async def test_page_content_coalesced_by_url(self, searcher):
+        """相同 URL 的并发页面请求只下载一次"""
+        calls = 0
+
+        async def fetch(url, page=None):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "content"
+
+        searcher._fetch_page_content = fetch
+        contents = await asyncio.gather(
+            *(searcher.get_page_content("https://example.com/doc") for _ in range(3))
+        )
+        assert contents == ["content"] * 3
+        assert calls == 1
+
+
+class TestPageCache:
+    """网页内容缓存测试"""
+
+    @pytest.fixture
+    def searcher(self):
+        WebSearcher.clear_cache()
+        return WebSearcher()
+
+    def test_canonicalize_url(self):
+        """协议/主机小写、去掉片段、默认端口和跟踪参数"""
+        canonical = WebSearcher._canonicalize_url(
+            "HTTPS://Example.COM:443/Path?b=2&utm_source=x&a=1&fbclid=y#section"
+        )
+        assert canonical == "https://example.com/Path?b=2&a=1"
+        assert (
+            WebSearcher._canonicalize_url("http://example.com") == "http://example.com/"
+        )
+        assert (
+            WebSearcher._canonicalize_url("http://example.com:8080/?gclid=1")
+            == "http://example.com:8080/"
+        )
+
+    def test_canonicalize_url_with_invalid_port(self):
+        """端口非法时不抛出异常，保留原始主机和端口"""
+        assert (
+            WebSearcher._canonicalize_url("http://User@Example.com:99999/x")
+            == "http://example.com:99999/x"
+        )
+        assert (
+            WebSearcher._canonicalize_url("http://example.com:abc/")
+            == "http://example.com:abc/"
+        )
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("close_session")
+    async def test_invalid_port_returns_fetch_failure(self):
+        """端口非法的 URL 返回正常的无法获取提示，而不是抛出异常"""
+        WebSearcher.clear_cache()
+        result = await server.handle_call_tool(
+            "get_webpage_content", {"url": "http://example.com:99999/x"}
+        )
+        assert "无法获取" in result[0].text
+
+    @pytest.mark.asyncio
+    async def test_equivalent_urls_share_cache_entry(self, searcher):
+        """规范化后相同的 URL 只下载一次"""
+        searcher._fetch_page_content = AsyncMock(return_value="content")
+        assert (
+            await searcher.get_page_content("https://example.com/doc#top") == "content"
+        )
+        assert (
+            await searcher.get_page_content("https://EXAMPLE.com/doc?utm_medium=email")
+            == "content"
+        )
+        searcher._fetch_page_content.assert_awaited_once()
+        assert WebSearcher._metrics["page.cache_hit"] >= 1
+
+    @pytest.mark.asyncio
+    async def test_expired_page_refetched(self, searcher, monkeypatch):
+        """超过 TTL 的页面重新下载"""
+        searcher._fetch_page_content = AsyncMock(side_effect=["old", "new"])
+        assert await searcher.get_page_content("https://example.com/a") == "old"
+        key = "page:https://example.com/a"
+        page, ts = WebSearcher._page_cache[key]
+        WebSearcher._page_cache[key] = (page, ts - server.PAGE_CACHE_TTL - 1)
+        assert await searcher.get_page_content("https://example.com/a") == "new"
+
+    @pytest.mark.asyncio
+    async def test_empty_content_not_cached(self, searcher):
+        """下载失败（空内容）不缓存"""
+        searcher._fetch_page_content = AsyncMock(return_value="")
+        await searcher.get_page_content("https://example.com/missing")
+        assert "page:https://example.com/missing" not in WebSearcher._page_cache
+
+    def test_page_cache_separate_from_search_cache(self):
+        """网页缓存与搜索缓存分别限制大小"""
+        assert WebSearcher._page_cache is not WebSearcher._search_cache
+        assert WebSearcher._page_cache.max_entries == server.PAGE_CACHE_MAX_ENTRIES
+
+
+class TestPageRevalidation:
+    """网页内容条件请求（ETag / Last-Modified）测试"""
+
+    @pytest.fixture
+    def searcher(self):
+        WebSearcher.clear_cache()
+        return WebSearcher()
+
+    @staticmethod
+    def _session(*responses):
+        """依次返回给定响应的 mock session"""
+        cms = []
+        for response in responses:
+            cm = MagicMock()
+            cm.__aenter__ = AsyncMock(return_value=response)
+            cm.__aexit__ = AsyncMock(return_value=None)
+            cms.append(cm)
+        session = MagicMock()
+        session.get = MagicMock(side_effect=cms)
+        return session
+
+    @staticmethod
+    def _response(status, headers=None, body=""):
+        response = MagicMock()
+        response.status = status
+        response.headers = headers or {}
+        response.text = AsyncMock(return_value=body)
+        return response
+
+    @staticmethod
+    def _expire(url):
+        key = f"page:{url}"
+        page, ts = WebSearcher._page_cache[key]
+        WebSearcher._page_cache[key] = (page, ts - server.PAGE_CACHE_TTL - 1)
+
+    @pytest.mark.asyncio
+    async def test_not_modified_reuses_cached_content(self, searcher):
+        """304 响应刷新 TTL，不重新读取和解析正文"""
+        first = self._response(
+            200,
+            {"ETag": '"v1"', "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"},
+            "<p>Docs body</p>",
+        )
+        second = self._response(304)
+        searcher.session = self._session(first, second)
+
+        url = "https://example.com/docs"
+        assert await searcher.get_page_content(url) == "Docs body"
+        self._expire(url)
+        assert await searcher.get_page_content(url) == "Docs body"
+
+        headers = searcher.session.get.call_args_list[1].kwargs["headers"]
+        assert headers["If-None-Match"] == '"v1"'
+        assert headers["If-Modified-Since"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+        second.text.assert_not_awaited()
+        # TTL 已刷新：再次读取直接命中缓存
+        assert await searcher.get_page_content(url) == "Docs body"
+        assert searcher.session.get.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_changed_page_replaces_validators(self, searcher):
+        """页面变化（200）时更新正文和校验器"""
+        first = self._response(200, {"ETag": '"v1"'}, "<p>old</p>")
+        second = self._response(200, {"ETag": '"v2"'}, "<p>new</p>")
+        searcher.session = self._session(first, second)
+
+        url = "https://example.com/changing"
+        await searcher.get_page_content(url)
+        self._expire(url)
+        assert await searcher.get_page_content(url) == "new"
+        page, _ = WebSearcher._page_cache[f"page:{url}"]
+        assert page["etag"] == '"v2"'
+
+    @pytest.mark.asyncio
+    async def test_no_conditional_headers_without_validators(self, searcher):
+        """没有校验器的页面过期后普通重新下载"""
+        first = self._response(200, {}, "<p>a</p>")
+        second = self._response(200, {}, "<p>b</p>")
+        searcher.session = self._session(first, second)
+
+        url = "https://example.com/plain"
+        await searcher.get_page_content(url)
+        self._expire(url)
+        assert await searcher.get_page_content(url) == "b"
+        assert "headers" not in searcher.session.get.call_args_list[1].kwargs
+
+
+class TestHedgedSearch:
+    """对冲多引擎搜索测试"""
+
+    @pytest.fixture
+    def searcher(self):
+        WebSearcher.clear_cache()
+        return WebSearcher()
+
+    @staticmethod
+    def _results(prefix, n):
+        return [
+            {
+                "title": f"{prefix}{i}",
+                "url": f"https://{prefix}.com/{i}",
+                "snippet": "",
+                "type": "x",
+            }
+            for i in range(n)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_returns_when_enough_results_and_cancels_straggler(self, searcher):
+        """结果足够后立即返回并取消慢引擎"""
+        cancelled = asyncio.Event()
+
+        async def fast(prefix):
+            return self._results(prefix, 3)
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return []
+
+        finished = await asyncio.wait_for(
+            searcher._hedged_gather(
+                {"duckduckgo": fast("d"), "google": slow(), "bing": fast("b")}, 5
+            ),
+            timeout=1,
+        )
+        assert set(finished) == {"duckduckgo", "bing"}
+        assert cancelled.is_set()
+
+    @pytest.mark.asyncio
+    async def test_waits_for_all_when_not_enough(self, searcher):
+        """结果不足时等待所有引擎"""
+
+        async def engine(prefix, delay):
+            await asyncio.sleep(delay)
+            return self._results(prefix, 1)
+
+        finished = await searcher._hedged_gather(
+            {"duckduckgo": engine("d", 0), "google": engine("g", 0.02)}, 10
+        )
+        assert set(finished) == {"duckduckgo", "google"}
+
+    @pytest.mark.asyncio
+    async def test_soft_deadline_returns_partial_results(self, searcher, monkeypatch):
+        """超过软截止时间后返回已有结果"""
+        monkeypatch.setattr(server, "HEDGE_SOFT_DEADLINE", 0.05)
+
+        async def fast():
+            return self._results("d", 1)
+
+        async def slow():
+            await asyncio.sleep(10)
+            return []
+
+        finished = await asyncio.wait_for(
+            searcher._hedged_gather({"duckduckgo": fast(), "google": slow()}, 10),
+            timeout=1,
+        )
+        assert list(finished) == ["duckduckgo"]
+
+    @pytest.mark.asyncio
+    async def test_soft_deadline_keeps_waiting_without_results(
+        self, searcher, monkeypatch
+    ):
+        """软截止时还没有任何结果时继续等待"""
+        monkeypatch.setattr(server, "HEDGE_SOFT_DEADLINE", 0.01)
+
+        async def late():
+            await asyncio.sleep(0.05)
+            return self._results("g", 1)
+
+        finished = await searcher._hedged_gather({"google": late()}, 10)
+        assert finished["google"]
+
+    @pytest.mark.asyncio
+    async def test_disabled_waits_for_all(self, searcher, monkeypatch):
+        """关闭对冲时等待全部引擎"""
+        monkeypatch.setattr(server, "HEDGE_ENABLED", False)
+
+        async def engine(prefix, delay):
+            await asyncio.sleep(delay)
+            return self._results(prefix, 5)
+
+        finished = await searcher._hedged_gather(
+            {
+                "duckduckgo": engine("d", 0),
+                "bing": engine("b", 0),
+                "google": engine("g", 0.02),
+            },
+            5,
+        )
+        assert set(finished) == {"duckduckgo", "bing", "google"}
+
+    @pytest.mark.asyncio
+    async def test_cancelling_last_waiter_cancels_fetch(self, searcher):
+        """唯一的等待者取消后，合并中的底层请求也被取消"""
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def fetch(query, max_results):
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return []
+
+        searcher._search_google = fetch
+        task = asyncio.create_task(searcher.search_google("q", 5))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        assert cancelled.is_set()
+        assert not WebSearcher._inflight
+
+
+class TestDeadline:
+    """调用时间预算（deadline_ms）测试"""
+
+    @pytest.fixture
+    def searcher(self):
+        WebSearcher.clear_cache()
+        return WebSearcher()
+
+    def test_no_deadline_by_default(self):
+        assert server._remaining_budget() is None
+        assert server._client_timeout(10).total == 10
+
+    def test_client_timeout_clipped_to_budget(self):
+        with server._deadline_scope(200):
+            assert server._client_timeout(10).total <= 0.2
+            # 嵌套的作用域只能收紧截止时间
+            with server._deadline_scope(60000):
+                assert server._remaining_budget() <= 0.2
+        assert server._remaining_budget() is None
+
+    @pytest.mark.asyncio
+    async def test_safe_get_stops_when_budget_exhausted(self, searcher):
+        """预算用尽时不再发出请求"""
+        searcher.session = MagicMock()
+        with server._deadline_scope(1):
+            await asyncio.sleep(0.01)
+            assert await searcher._safe_get("https://example.com") is None
+        searcher.session.get.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_deadline_failure_not_negative_cached(self, searcher):
+        """时间预算用尽导致的失败不写入负缓存"""
+
+        async def fetch(query, max_results):
+            server._note_failure("deadline")
+            return []
+
+        searcher._search_bing = fetch
+        await searcher.search_bing("q", 5)
+        assert len(WebSearcher._negative_cache) == 0
+
+    @pytest.mark.asyncio
+    async def test_mirrors_not_launched_after_deadline(self, searcher, monkeypatch):
+        """进入时预算已用尽：不请求镜像，也不当作空结果写入负缓存和引擎统计"""
+        monkeypatch.setattr(WebSearcher, "_metrics", server.Counter())
+        searcher.session = MagicMock()
+        WebSearcher._engine_stats.clear()
+        with server._deadline_scope(1):
+            await asyncio.sleep(0.01)
+            assert await searcher.search_google("hello world") == []
+        searcher.session.get.assert_not_called()
+        assert len(WebSearcher._negative_cache) == 0
+        assert WebSearcher.get_metrics().get("google.failure.empty", 0) == 0
+        assert "google" not in WebSearcher.get_engine_stats()
+
+    @pytest.mark.asyncio
+    async def test_web_search_returns_partial_results(self, monkeypatch):
+        """预算用尽时返回已完成引擎的结果"""
+
+        async def fast(self_inner, query, max_results=10):
+            return [
+                {"title": "Fast", "url": "https://fast.com", "snippet": "", "type": "x"}
+            ]
+
+        async def slow(self_inner, query, max_results=10):
+            await asyncio.sleep(10)
+            return []
+
+        monkeypatch.setattr(server, "SERPAPI_KEY", None)
+        monkeypatch.setattr(server, "TAVILY_API_KEY", None)
+        monkeypatch.setattr(WebSearcher, "search_duckduckgo", fast)
+        monkeypatch.setattr(WebSearcher, "search_google", slow)
+        monkeypatch.setattr(WebSearcher, "search_bing", slow)
+
+        result = await asyncio.wait_for(
+            server.handle_call_tool(
+                "web_search",
+                {"query": "q", "search_engine": "both", "deadline_ms": 100},
+            ),
+            timeout=2,
+        )
+        assert "Fast" in result[0].text
+
+
+class TestMirrorRacing:
+    """镜像域名竞速测试"""
+
+    @pytest.fixture
+    def searcher(self):
+        WebSearcher.clear_cache()
+        WebSearcher._mirror_stats.clear()
+        yield WebSearcher()
+        WebSearcher._mirror_stats.clear()
+
+    @staticmethod
+    def _results(host):
+        return [{"title": host, "url": f"https://{host}/r", "snippet": "", "type": "x"}]
+
+    @pytest.mark.asyncio
+    async def test_failed_primary_starts_next_immediately(self, searcher):
+        """主镜像失败后立即尝试下一个，并记录成功率"""
+        calls = []
+
+        async def attempt(url):
+            calls.append(url)
+            return [] if "a.test" in url else self._results("b.test")
+
+        results = await searcher._race_mirrors(
+            "google", ["https://a.test/s", "https://b.test/s"], attempt
+        )
+        assert results[0]["title"] == "b.test"
+        assert calls == ["https://a.test/s", "https://b.test/s"]
+        assert WebSearcher._mirror_stats["a.test"][0] == 0
+        assert WebSearcher._mirror_stats["b.test"][0] == 1
+
+    @pytest.mark.asyncio
+    async def test_slow_primary_hedged_and_cancelled(self, searcher, monkeypatch):
+        """主镜像超过对冲延迟无响应时启动下一个，先返回者胜出并取消其余"""
+        monkeypatch.setattr(server, "MIRROR_HEDGE_DELAY", 0.01)
+        cancelled = asyncio.Event()
+
+        async def attempt(url):
+            if "slow" in url:
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+            return self._results(urlparse(url).hostname)
+
+        results = await asyncio.wait_for(
+            searcher._race_mirrors(
+                "bing", ["https://slow.test/s", "https://fast.test/s"], attempt
+            ),
+            timeout=1,
+        )
+        assert results[0]["title"] == "fast.test"
+        assert cancelled.is_set()
+
+    @pytest.mark.asyncio
+    async def test_sequential_when_racing_disabled(self, searcher, monkeypatch):
+        """对冲延迟 < 0 时逐个尝试"""
+        monkeypatch.setattr(server, "MIRROR_HEDGE_DELAY", -1)
+        calls = []
+
+        async def attempt(url):
+            calls.append(url)
+            await asyncio.sleep(0.02)
+            return self._results("a.test")
+
+        await searcher._race_mirrors(
+            "google", ["https://a.test/s", "https://b.test/s"], attempt
+        )
+        assert calls == ["https://a.test/s"]
+
+    def test_order_follows_success_rate(self):
+        """成功率高的镜像排在前面，没有统计时保持默认顺序"""
+        WebSearcher._mirror_stats.clear()
+        urls = ["https://a.test/s", "https://b.test/s", "https://c.test/s"]
+        assert WebSearcher._order_mirrors(urls) == urls
+        for _ in range(3):
+            WebSearcher._record_mirror("https://a.test/s", False)
+            WebSearcher._record_mirror("https://c.test/s", True)
+        assert WebSearcher._order_mirrors(urls) == [
+            "https://c.test/s",
+            "https://b.test/s",
+            "https://a.test/s",
+        ]
+        WebSearcher._mirror_stats.clear()
+
+
+class TestDuckDuckGoModes:
+    """DuckDuckGo 即时答案 API / HTML 组合方式测试"""
+
+    API_RESULT = [
+        {"title": "IA", "url": "https://ia.com", "snippet": "", "type": "abstract"}
+    ]
+    HTML_RESULT = [
+        {"title": "H", "url": "https://h.com", "snippet": "", "type": "web_result"}
+    ]
+
+    @pytest.fixture
+    def searcher(self):
+        WebSearcher.clear_cache()
+        WebSearcher._ddg_api_stats.clear()
+        yield WebSearcher()
+        WebSearcher._ddg_api_stats.clear()
+
+    @pytest.mark.asyncio
+    async def test_parallel_mode_starts_html_before_api_returns(
+        self, searcher, monkeypatch
+    ):
+        """parallel 模式同时请求 API 和 HTML"""
+        monkeypatch.setattr(server, "DDG_MODE", "parallel")
+        html_started = asyncio.Event()
+
+        async def api(query, max_results):
+            await asyncio.wait_for(html_started.wait(), timeout=1)
+            return []
+
+        async def html(query, max_results):
+            html_started.set()
+            return self.HTML_RESULT
+
+        searcher._search_duckduckgo_api = api
+        searcher._search_html_duckduckgo = html
+        assert await searcher.search_duckduckgo("plain words", 5) == self.HTML_RESULT
+
+    @pytest.mark.asyncio
+    async def test_parallel_mode_prefers_api_and_cancels_html(
+        self, searcher, monkeypatch
+    ):
+        """API 有结果时返回 API 结果并取消 HTML 请求"""
+        monkeypatch.setattr(server, "DDG_MODE", "parallel")
+        cancelled = asyncio.Event()
+
+        async def html(query, max_results):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return self.HTML_RESULT
+
+        async def api(query, max_results):
+            await asyncio.sleep(0.01)
+            return self.API_RESULT
+
+        searcher._search_duckduckgo_api = api
+        searcher._search_html_duckduckgo = html
+        results = await asyncio.wait_for(
+            searcher.search_duckduckgo("python", 5), timeout=1
+        )
+        assert results == self.API_RESULT
+        assert cancelled.is_set()
+
+    @pytest.mark.asyncio
+    async def test_adaptive_mode_skips_api_for_low_hit_shape(
+        self, searcher, monkeypatch
+    ):
+        """adaptive 模式对 API 命中率低的查询形态直接使用 HTML"""
+        monkeypatch.setattr(server, "DDG_MODE", "adaptive")
+        monkeypatch.setattr(server, "DDG_API_EXPLORE_RATE", 0)
+        shape = WebSearcher._query_shape("best laptop 2025")
+        for _ in range(server.DDG_API_MIN_SAMPLES + 1):
+            WebSearcher._record_ddg_api(shape, False)
+
+        searcher._search_duckduckgo_api = AsyncMock(return_value=self.API_RESULT)
+        searcher._search_html_duckduckgo = AsyncMock(return_value=self.HTML_RESULT)
+        assert (
+            await searcher.search_duckduckgo("cheap phone 2025", 5) == self.HTML_RESULT
+        )
+        searcher._search_duckduckgo_api.assert_not_awaited()
+        assert WebSearcher._metrics["duckduckgo.api_skipped"] >= 1
+
+    def test_query_shape(self):
+        assert WebSearcher._query_shape("python") == "1:k:latin"
+        assert WebSearcher._query_shape("what is asyncio") == "2-3:q:latin"
+        assert WebSearcher._query_shape("Python编程教程") == "1:k:cjk"
+
+    @pytest.mark.asyncio
+    async def test_html_results_cached(self, searcher):
+        """HTML 页面的结果写入缓存"""
+        searcher._search_html_duckduckgo = AsyncMock(return_value=self.HTML_RESULT)
+        await searcher.search_html_duckduckgo("cached html", 5)
+        await searcher.search_html_duckduckgo("cached html", 5)
+        searcher._search_html_duckduckgo.assert_awaited_once()
+
+
+class TestCircuitBreaker:
+    """引擎熔断器测试"""
+
+    @pytest.fixture
+    def searcher(self):
+        WebSearcher.clear_cache()
+        yield WebSearcher()
+        WebSearcher.clear_cache()
+
+    def test_state_transitions(self, monkeypatch):
+        breaker = server.CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "closed"
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow()
+
+        # 冷却期结束后只放行一个试探请求
+        breaker.opened_at -= 31
+        assert breaker.allow()
+        assert breaker.state == "half_open"
+        assert not breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+        breaker.opened_at -= 31
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed"
+        assert breaker.failures == 0
+
+    def test_release_returns_trial_slot(self):
+        breaker = server.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.release()
+        assert breaker.allow()
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_skips_engine(self, searcher, monkeypatch):
+        """连续失败后熔断，后续查询不再请求引擎"""
+        monkeypatch.setattr(server, "CIRCUIT_FAILURE_THRESHOLD", 3)
+        calls = 0
+
+        async def failing(query, max_results):
+            nonlocal calls
+            calls += 1
+            server._note_failure("http_status")
+            return []
+
+        searcher._search_google = failing
+        for i in range(5):
+            assert await searcher.search_google(f"query {i}", 5) == []
+        assert calls == 3
+        assert WebSearcher.get_circuit_states()["google"] == "open"
+        assert WebSearcher._metrics["google.circuit_open"] >= 2
+
+    @pytest.mark.asyncio
+    async def test_empty_results_do_not_trip(self, searcher, monkeypatch):
+        """没有失败原因的空结果不计入熔断"""
+        monkeypatch.setattr(server, "CIRCUIT_FAILURE_THRESHOLD", 2)
+        searcher._search_bing = AsyncMock(return_value=[])
+        for i in range(4):
+            await searcher.search_bing(f"rare {i}", 5)
+        assert searcher._search_bing.await_count == 4
+        assert WebSearcher.get_circuit_states()["bing"] == "closed"
+
+    @pytest.mark.asyncio
+    async def test_half_open_success_closes_circuit(self, searcher, monkeypatch):
+        """冷却期后的试探请求成功则恢复"""
+        monkeypatch.setattr(server, "CIRCUIT_FAILURE_THRESHOLD", 1)
+
+        async def failing(query, max_results):
+            server._note_failure("captcha")
+            return []
+
+        searcher._search_google = failing
+        await searcher.search_google("a", 5)
+        breaker = WebSearcher._breakers["google"]
+        assert breaker.state == "open"
+
+        breaker.opened_at -= server.CIRCUIT_RESET_SECONDS + 1
+        WebSearcher._negative_cache.clear()
+        searcher._search_google = AsyncMock(
+            return_value=[
+                {"title": "T", "url": "https://t.com", "snippet": "", "type": "x"}
+            ]
+        )
+        assert len(await searcher.search_google("b", 5)) == 1
+        assert breaker.state == "closed"
+
+
+class TestEngineLimiter:
+    """引擎令牌桶限流与并发上限测试"""
+
+    @pytest.mark.asyncio
+    async def test_burst_then_rate_limited(self):
+        """突发容量用完后按速率放行，等待超过上限时放弃"""
+        limiter = server.EngineLimiter(rate=100, burst=2, max_in_flight=0)
+        assert await limiter.acquire(0)
+        assert await limiter.acquire(0)
+        assert not await limiter.acquire(0)
+        start = asyncio.get_running_loop().time()
+        assert await limiter.acquire(1)
+        assert asyncio.get_running_loop().time() - start >= 0.005
+
+    @pytest.mark.asyncio
+    async def test_max_in_flight(self):
+        """并发名额用完时排队，释放后唤醒"""
+        limiter = server.EngineLimiter(rate=0, burst=0, max_in_flight=1)
+        assert await limiter.acquire(None)
+        assert not await limiter.acquire(0.01)
+        waiter = asyncio.create_task(limiter.acquire(1))
+        await asyncio.sleep(0)
+        limiter.release()
+        assert await waiter
+        assert limiter.in_flight == 1
+
+    @pytest.mark.asyncio
+    async def test_token_returned_when_in_flight_wait_fails(self):
+        """拿不到并发名额（超时或取消）时归还预约的令牌"""
+        limiter = server.EngineLimiter(rate=1, burst=3, max_in_flight=1)
+        assert await limiter.acquire(None)
+        tokens = limiter.tokens
+        assert not await limiter.acquire(0.05)
+        assert limiter.tokens == pytest.approx(tokens, abs=0.1)
+        waiter = asyncio.create_task(limiter.acquire(None))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.tokens == pytest.approx(tokens, abs=0.1)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_wakeup_passed_to_next_waiter(self):
+        """被唤醒的排队者在恢复前被取消时，下一个排队者立即拿到名额"""
+        limiter = server.EngineLimiter(rate=0, burst=0, max_in_flight=1)
+        assert await limiter.acquire(None)
+        first = asyncio.create_task(limiter.acquire(5))
+        second = asyncio.create_task(limiter.acquire(5))
+        await asyncio.sleep(0)
+        limiter.release()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert await asyncio.wait_for(second, 0.5)
+        assert limiter.in_flight == 1
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_search_skipped_without_negative_cache(
+        self, monkeypatch
+    ):
+        """排队超时的搜索直接返回空结果，不写入负缓存也不计入熔断"""
+        WebSearcher.clear_cache()
+        monkeypatch.setitem(server.ENGINE_RATE_LIMITS, "google", (0.001, 1, 0))
+        searcher = WebSearcher()
+        searcher._search_google = AsyncMock(return_value=[])
+        with server._deadline_scope(50):
+            await searcher.search_google("first", 5)
+            assert await searcher.search_google("second", 5) == []
+        assert searcher._search_google.await_count == 1
+        assert WebSearcher._metrics["google.rate_limited"] >= 1
+        assert "google:second" not in WebSearcher._negative_cache
+        assert WebSearcher.get_circuit_states().get("google") == "closed"
+
+
+class TestEngineStats:
+    """引擎滚动统计与 auto 引擎选择测试"""
+
+    @pytest.fixture(autouse=True)
+    def clean_stats(self, monkeypatch):
+        WebSearcher.clear_cache()
+        WebSearcher._engine_stats.clear()
+        monkeypatch.setattr(server, "AUTO_EXPLORE_RATE", 0)
+        yield
+        WebSearcher._engine_stats.clear()
+
+    @staticmethod
+    def _seed(engine, latency, count, n=10):
+        stats = WebSearcher._get_engine_stats(engine)
+        for _ in range(n):
+            stats.record(latency, count)
+        return stats
+
+    def test_percentiles_and_rates(self):
+        stats = server.EngineStats(window=10)
+        for i in range(1, 11):
+            stats.record(i / 10, 0 if i <= 2 else 5)
+        assert stats.percentile(50) == 0.5
+        assert stats.percentile(95) == 1.0
+        assert stats.success_rate == 0.8
+        snapshot = stats.snapshot()
+        assert snapshot["p50_ms"] == 500
+        assert snapshot["samples"] == 10
+
+    def test_window_is_rolling(self):
+        stats = server.EngineStats(window=3)
+        for latency in (10, 10, 10, 0.1, 0.1, 0.1):
+            stats.record(latency, 1)
+        assert stats.percentile(95) == 0.1
+
+    def test_select_cheapest_sufficient_subset(self):
+        """选择单位成本最低且足以凑够结果数的引擎"""
+        self._seed("duckduckgo", 0.3, 10)
+        self._seed("google", 2.0, 10)
+        self._seed("bing", 1.0, 10)
+        assert WebSearcher._select_engines(["duckduckgo", "google", "bing"], 10) == [
+            "duckduckgo"
+        ]
+        # 单个引擎不够时继续加入次便宜的
+        assert WebSearcher._select_engines(["duckduckgo", "google", "bing"], 15) == [
+            "duckduckgo",
+            "bing",
+        ]
+
+    def test_unsampled_engine_always_selected(self):
+        self._seed("duckduckgo", 0.3, 10)
+        self._seed("google", 2.0, 10)
+        assert "bing" in WebSearcher._select_engines(
+            ["duckduckgo", "google", "bing"], 10
+        )
+
+    def test_slow_engine_excluded_under_deadline(self):
+        """p95 耗时超过剩余预算的引擎不被选中"""
+        self._seed("duckduckgo", 0.3, 2)
+        self._seed("google", 5.0, 10)
+        self._seed("bing", 0.5, 2)
+        with server._deadline_scope(1000):
+            engines = WebSearcher._select_engines(["duckduckgo", "google", "bing"], 10)
+        assert engines == ["duckduckgo", "bing"]
+
+    def test_open_circuit_excluded(self):
+        self._seed("duckduckgo", 0.3, 10)
+        breaker = WebSearcher._get_breaker("duckduckgo")
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        self._seed("bing", 1.0, 10)
+        self._seed("google", 1.0, 10)
+        assert "duckduckgo" not in WebSearcher._select_engines(
+            ["duckduckgo", "google", "bing"], 10
+        )
+
+    def test_open_circuit_selectable_after_reset_timeout(self):
+        """熔断超过 reset_timeout 后重新参与选择，由 allow() 放行试探请求"""
+        self._seed("duckduckgo", 0.3, 10)
+        breaker = WebSearcher._get_breaker("duckduckgo")
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        breaker.opened_at -= breaker.reset_timeout + 1
+        self._seed("bing", 1.0, 10)
+        self._seed("google", 1.0, 10)
+        assert WebSearcher._select_engines(["duckduckgo", "google", "bing"], 10) == [
+            "duckduckgo"
+        ]
+
+    def test_explore_includes_excluded_engines(self, monkeypatch):
+        """探索也会选中因没有结果或过慢而被排除的引擎，让其统计得以更新"""
+        monkeypatch.setattr(server, "AUTO_EXPLORE_RATE", 1.0)
+        self._seed("duckduckgo", 0.3, 10)
+        self._seed("google", 1.0, 0)
+        assert WebSearcher._select_engines(["duckduckgo", "google"], 10) == [
+            "duckduckgo",
+            "google",
+        ]
+
+    def test_record_contributions(self):
+        def r(*urls):
+            return [{"url": u} for u in urls]
+
+        WebSearcher._record_contributions(
+            {"duckduckgo": r("a", "b"), "google": r("b", "c", "d"), "bing": r()}
+        )
+        assert WebSearcher._engine_stats["duckduckgo"].unique[-1] == 1
+        assert WebSearcher._engine_stats["google"].unique[-1] == 2
+        assert WebSearcher._engine_stats["bing"].unique[-1] == 0
+
+    @pytest.mark.asyncio
+    async def test_fetch_records_latency(self):
+        searcher = WebSearcher()
+        searcher._search_bing = AsyncMock(
+            return_value=[
+                {"title": "T", "url": "https://t.com", "snippet": "", "type": "x"}
+            ]
+        )
+        await searcher.search_bing("stats", 5)
+        assert WebSearcher.get_engine_stats()["bing"]["samples"] == 1
+
+    @pytest.mark.asyncio
+    async def test_auto_mode_uses_selected_engines(self, monkeypatch):
+        monkeypatch.setattr(server, "SERPAPI_KEY", None)
+        monkeypatch.setattr(server, "TAVILY_API_KEY", None)
+        self._seed("duckduckgo", 0.3, 10)
+        self._seed("google", 2.0, 10)
+        self._seed("bing", 1.0, 10)
+        google = AsyncMock(return_value=[])
+        monkeypatch.setattr(
+            WebSearcher,
+            "search_duckduckgo",
+            AsyncMock(
+                return_value=[
+                    {"title": "D", "url": "https://d.com", "snippet": "", "type": "x"}
+                ]
+            ),
+        )
+        monkeypatch.setattr(WebSearcher, "search_google", google)
+        monkeypatch.setattr(WebSearcher, "search_bing", google)
+
+        result = await server.handle_call_tool(
+            "web_search", {"query": "q", "search_engine": "auto", "max_results": 5}
+        )
+        assert "自动选择: DuckDuckGo" in result[0].text
+        google.assert_not_awaited()
+
+
+class TestAdaptiveTimeout:
+    """按引擎和阶段耗时自适应的请求超时测试"""
+
+    @pytest.fixture(autouse=True)
+    def clean_phases(self):
+        WebSearcher._phase_latency.clear()
+        yield
+        WebSearcher._phase_latency.clear()
+
+    @staticmethod
+    def _seed(engine, phase, latency, n=server.ADAPTIVE_TIMEOUT_MIN_SAMPLES):
+        for _ in range(n):
+            WebSearcher._record_phase(engine, phase, latency)
+
+    def test_static_timeout_without_samples(self):
+        token = server._current_engine.set("duckduckgo")
+        try:
+            timeout = WebSearcher._request_timeout(10)
+        finally:
+            server._current_engine.reset(token)
+        assert timeout.total == 10
+        assert timeout.sock_read is None
+
+    def test_fast_engine_gets_tight_timeouts(self):
+        """健康时很快的引擎得到较短的连接/读取超时（不低于下限）"""
+        self._seed("duckduckgo", "ttfb", 0.5)
+        self._seed("duckduckgo", "connect", 0.1)
+        token = server._current_engine.set("duckduckgo")
+        try:
+            timeout = WebSearcher._request_timeout(10)
+        finally:
+            server._current_engine.reset(token)
+        assert timeout.total == 10
+        assert timeout.sock_read == pytest.approx(0.5 * server.ADAPTIVE_TIMEOUT_FACTOR)
+        assert timeout.sock_connect == server.ADAPTIVE_TIMEOUT_FLOOR
+        # 等待连接池空闲连接的时间不受自适应超时限制
+        assert timeout.connect is None
+
+    def test_slow_engine_capped_by_default_total(self):
+        """较慢的引擎不超过调用处的默认总超时"""
+        self._seed("serpapi", "ttfb", 20)
+        token = server._current_engine.set("serpapi")
+        try:
+            timeout = WebSearcher._request_timeout(30)
+        finally:
+            server._current_engine.reset(token)
+        assert timeout.sock_read == 30
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(server, "ADAPTIVE_TIMEOUT", False)
+        self._seed("bing", "ttfb", 0.5)
+        token = server._current_engine.set("bing")
+        try:
+            assert WebSearcher._request_timeout(10).sock_read is None
+        finally:
+            server._current_engine.reset(token)
+
+    @pytest.mark.asyncio
+    async def test_trace_config_records_phases(self):
+        """连接追踪按当前引擎记录 connect 和 ttfb 耗时"""
+        from aiohttp import web
+        from aiohttp.test_utils import TestServer
+
+        async def handler(request):
+            return web.Response(text="ok")
+
+        app = web.Application()
+        app.router.add_get("/", handler)
+        async with TestServer(app) as test_server:
+            async with aiohttp.ClientSession(
+                trace_configs=[WebSearcher._create_trace_config()]
+            ) as session:
+                token = server._current_engine.set("bing")
+                try:
+                    async with session.get(test_server.make_url("/")) as response:
+                        assert await response.text() == "ok"
+                finally:
+                    server._current_engine.reset(token)
+                # 不属于任何引擎的请求不记录
+                async with session.get(test_server.make_url("/")) as response:
+                    await response.text()
+        assert len(WebSearcher._phase_latency[("bing", "ttfb")]) == 1
+        assert len(WebSearcher._phase_latency[("bing", "connect")]) == 1
+        assert all(engine == "bing" for engine, _ in WebSearcher._phase_latency)
+
+    @pytest.mark.asyncio
+    async def test_timed_out_requests_widen_timeout(self, monkeypatch):
+        """引擎变慢导致超时后，超时样本让自适应超时放宽，而不是一直超时"""
+        monkeypatch.setattr(server, "ADAPTIVE_TIMEOUT_FLOOR", 0.0)
+        from aiohttp import web
+        from aiohttp.test_utils import TestServer
+
+        async def handler(request):
+            await asyncio.sleep(0.3)
+            return web.Response(text="ok")
+
+        self._seed("bing", "ttfb", 0.01)
+        app = web.Application()
+        app.router.add_get("/", handler)
+        async with TestServer(app) as test_server:
+            async with aiohttp.ClientSession(
+                trace_configs=[WebSearcher._create_trace_config()]
+            ) as session:
+                token = server._current_engine.set("bing")
+                try:
+                    with pytest.raises(asyncio.TimeoutError):
+                        async with session.get(
+                            test_server.make_url("/"),
+                            timeout=server._client_timeout(10, sock_read=0.1),
+                        ):
+                            pass
+                    timeout = WebSearcher._request_timeout(10)
+                finally:
+                    server._current_engine.reset(token)
+        assert timeout.sock_read >= 0.1 * server.ADAPTIVE_TIMEOUT_FACTOR
+
+
+class TestRetry:
+    """重试策略与进程级重试预算测试"""
+
+    @pytest.fixture
+    def searcher(self, monkeypatch):
+        monkeypatch.setattr(server, "RETRY_BASE_DELAY", 0.001)
+        monkeypatch.setattr(
+            WebSearcher,
+            "_retry_budget",
+            server.RetryBudget(0.1, server.RETRY_BUDGET_RESERVE),
+        )
+        return WebSearcher()
+
+    @staticmethod
+    def _cm(response=None, error=None):
+        cm = MagicMock()
+        if error is not None:
+            cm.__aenter__ = AsyncMock(side_effect=error)
+        else:
+            cm.__aenter__ = AsyncMock(return_value=response)
+        cm.__aexit__ = AsyncMock(return_value=None)
+        return cm
+
+    @staticmethod
+    def _response(status):
+        response = MagicMock()
+        response.status = status
+        return response
+
+    @pytest.mark.asyncio
+    async def test_retries_connection_reset(self, searcher):
+        ok = self._response(200)
+        searcher.session = MagicMock()
+        searcher.session.get = MagicMock(
+            side_effect=[
+                self._cm(error=aiohttp.ServerDisconnectedError()),
+                self._cm(ok),
+            ]
+        )
+        async with searcher._request("get", "https://example.com") as response:
+            assert response is ok
+        assert searcher.session.get.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_retries_5xx_and_releases_failed_response(self, searcher):
+        failed = self._cm(self._response(503))
+        searcher.session = MagicMock()
+        searcher.session.get = MagicMock(
+            side_effect=[failed, self._cm(self._response(200))]
+        )
+        async with searcher._request("get", "https://example.com") as response:
+            assert response.status == 200
+        failed.__aexit__.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_attempts(self, searcher):
+        searcher.session = MagicMock()
+        searcher.session.get = MagicMock(
+            side_effect=[self._cm(self._response(502)) for _ in range(5)]
+        )
+        async with searcher._request("get", "https://example.com") as response:
+            assert response.status == 502
+        assert searcher.session.get.call_count == server.RETRY_MAX_ATTEMPTS
+
+    @pytest.mark.asyncio
+    async def test_timeouts_and_4xx_not_retried(self, searcher):
+        searcher.session = MagicMock()
+        searcher.session.get = MagicMock(side_effect=[self._cm(error=TimeoutError())])
+        with pytest.raises(TimeoutError):
+            async with searcher._request("get", "https://example.com"):
+                pass
+        searcher.session.get = MagicMock(side_effect=[self._cm(self._response(404))])
+        async with searcher._request("get", "https://example.com") as response:
+            assert response.status == 404
+        assert searcher.session.get.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_post_not_retried_after_request_sent(self, searcher):
+        """POST 在服务端可能已处理后（断开、5xx）不重试，避免重复计费"""
+        searcher.session = MagicMock()
+        searcher.session.post = MagicMock(
+            side_effect=[self._cm(error=aiohttp.ServerDisconnectedError())]
+        )
+        with pytest.raises(aiohttp.ServerDisconnectedError):
+            async with searcher._request("post", "https://api.example.com"):
+                pass
+        searcher.session.post = MagicMock(side_effect=[self._cm(self._response(503))])
+        async with searcher._request("post", "https://api.example.com") as response:
+            assert response.status == 503
+        assert searcher.session.post.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_post_retried_when_connection_fails(self, searcher):
+        """连接没能建立时请求尚未发出，POST 也可以重试"""
+        error = aiohttp.ClientConnectorError(MagicMock(), OSError("refused"))
+        ok = self._response(200)
+        searcher.session = MagicMock()
+        searcher.session.post = MagicMock(
+            side_effect=[self._cm(error=error), self._cm(ok)]
+        )
+        async with searcher._request("post", "https://api.example.com") as response:
+            assert response is ok
+        assert searcher.session.post.call_count == 2
+
+    def test_retry_budget_limits_retries(self):
+        budget = server.RetryBudget(ratio=0.1, reserve=2)
+        assert budget.try_spend()
+        assert budget.try_spend()
+        assert not budget.try_spend()
+        for _ in range(10):
+            budget.record_request()
+        assert budget.try_spend()
+        assert not budget.try_spend()
+
+    @pytest.mark.asyncio
+    async def test_no_retry_when_budget_exhausted(self, searcher, monkeypatch):
+        monkeypatch.setattr(WebSearcher, "_retry_budget", server.RetryBudget(0.1, 0))
+        searcher.session = MagicMock()
+        searcher.session.get = MagicMock(
+            side_effect=[self._cm(error=aiohttp.ServerDisconnectedError())]
+        )
+        with pytest.raises(aiohttp.ServerDisconnectedError):
+            async with searcher._request("get", "https://example.com"):
+                pass
+        assert WebSearcher._metrics["retry.budget_exhausted"] >= 1
+
+    def test_backoff_bounded_by_deadline(self, monkeypatch):
+        monkeypatch.setattr(server, "RETRY_BASE_DELAY", 5.0)
+        monkeypatch.setattr(server.random, "uniform", lambda a, b: b)
+        with server._deadline_scope(100):
+            assert WebSearcher._retry_delay(0, status=503) is None
+
+
+@pytest.mark.usefixtures("close_session")
+class TestStreaming:
+    """流式推送各引擎部分结果测试"""
+
+    @pytest.fixture
+    def request_context(self):
+        from types import SimpleNamespace
+
+        from mcp.server.lowlevel.server import request_ctx
+
+        session = MagicMock()
+        session.send_log_message = AsyncMock()
+        session.send_progress_notification = AsyncMock()
+        ctx = SimpleNamespace(
+            request_id=1, meta=SimpleNamespace(progressToken="tok"), session=session
+        )
+        token = request_ctx.set(ctx)
+        yield session
+        request_ctx.reset(token)
+
+    @pytest.fixture
+    def engines(self, monkeypatch):
+        monkeypatch.setattr(server, "SERPAPI_KEY", None)
+        monkeypatch.setattr(server, "TAVILY_API_KEY", None)
+
+        def engine(name):
+            return AsyncMock(
+                return_value=[
+                    {
+                        "title": name,
+                        "url": f"https://{name}.com",
+                        "snippet": "",
+                        "type": "x",
+                    }
+                ]
+            )
+
+        monkeypatch.setattr(WebSearcher, "search_duckduckgo", engine("ddg"))
+        monkeypatch.setattr(WebSearcher, "search_google", engine("google"))
+        monkeypatch.setattr(WebSearcher, "search_bing", engine("bing"))
+
+    @pytest.mark.asyncio
+    async def test_stream_sends_per_engine_notifications(
+        self, request_context, engines
+    ):
+        result = await server.handle_call_tool(
+            "web_search", {"query": "q", "search_engine": "both", "stream": True}
+        )
+        assert request_context.send_log_message.await_count == 3
+        streamed = {
+            call.kwargs["data"]["engine"]
+            for call in request_context.send_log_message.await_args_list
+        }
+        assert streamed == {"duckduckgo", "google", "bing"}
+        progress = [
+            c.args[1:]
+            for c in request_context.send_progress_notification.await_args_list
+        ]
+        assert sorted(progress) == [(1, 3), (2, 3), (3, 3)]
+        # 最终仍返回合并后的结果
+        assert "ddg" in result[0].text and "bing" in result[0].text
+
+    @pytest.mark.asyncio
+    async def test_final_progress_when_engines_cancelled(
+        self, request_context, engines, monkeypatch
+    ):
+        """对冲取消较慢的引擎时，返回前仍把进度补齐到总数"""
+
+        async def slow(self_inner, query, max_results=10):
+            await asyncio.sleep(10)
+            return []
+
+        monkeypatch.setattr(WebSearcher, "search_bing", slow)
+        monkeypatch.setattr(server, "HEDGE_MIN_RESULTS", 2)
+        await server.handle_call_tool(
+            "web_search", {"query": "q", "search_engine": "both", "stream": True}
+        )
+        assert request_context.send_log_message.await_count == 2
+        progress = [
+            c.args[1:]
+            for c in request_context.send_progress_notification.await_args_list
+        ]
+        assert progress[-1] == (3, 3)
+        assert len(progress) == 3
+
+    @pytest.mark.asyncio
+    async def test_no_notifications_without_stream(self, request_context, engines):
+        await server.handle_call_tool(
+            "web_search", {"query": "q", "search_engine": "both"}
+        )
+        request_context.send_log_message.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_notification_failure_does_not_break_search(
+        self, request_context, engines
+    ):
+        request_context.send_log_message.side_effect = RuntimeError("closed")
+        result = await server.handle_call_tool(
+            "web_search", {"query": "q", "search_engine": "both", "stream": True}
+        )
+        assert "google" in result[0].text
+
+    def test_notifier_outside_request_context(self):
+        assert server._stream_notifier("web_search", "q", 3) is None
+
+
+@pytest.mark.usefixtures("close_session")
+class TestWebSearchBatch:
+    """web_search_batch 批量搜索工具测试"""
+
+    @pytest.fixture
+    def ddg(self, monkeypatch):
+        monkeypatch.setattr(server, "SERPAPI_KEY", None)
+        monkeypatch.setattr(server, "TAVILY_API_KEY", None)
+
+        async def search(self_inner, query, max_results=10):
+            return [
+                {
+                    "title": f"{query}-{i}",
+                    "url": f"https://{query}.com/{i}",
+                    "snippet": "",
+                    "type": "x",
+                }
+                for i in range(max_results)
+            ]
+
+        calls = []
+
+        async def recorded(self_inner, query, max_results=10):
+            calls.append((query, max_results))
+            return await search(self_inner, query, max_results)
+
+        monkeypatch.setattr(WebSearcher, "search_duckduckgo", recorded)
+        return calls
+
+    @pytest.mark.asyncio
+    async def test_results_grouped_by_query_in_input_order(self, ddg):
+        result = await server.handle_call_tool(
+            "web_search_batch",
+            {
+                "queries": [{"query": "beta"}, {"query": "alpha"}],
+                "search_engine": "duckduckgo",
+            },
+        )
+        text = result[0].text
+        assert text.index("## 搜索查询: beta") < text.index("## 搜索查询: alpha")
+        assert "https://beta.com/0" in text and "https://alpha.com/0" in text
+
+    @pytest.mark.asyncio
+    async def test_identical_queries_searched_once(self, ddg):
+        result = await server.handle_call_tool(
+            "web_search_batch",
+            {
+                "queries": [
+                    {"query": "Python", "max_results": 2},
+                    {"query": "  python ", "max_results": 4},
+                    "python",
+                ],
+                "max_results": 3,
+                "search_engine": "duckduckgo",
+            },
+        )
+        # 重复查询只搜索一次，并取最大的 max_results
+        assert ddg == [("Python", 4)]
+        assert "去重后 1 个" in result[0].text
+
+    @pytest.mark.asyncio
+    async def test_per_query_engine(self, ddg, monkeypatch):
+        bing = AsyncMock(
+            return_value=[
+                {"title": "b", "url": "https://bing.com/r", "snippet": "", "type": "x"}
+            ]
+        )
+        monkeypatch.setattr(WebSearcher, "search_bing", bing)
+        result = await server.handle_call_tool(
+            "web_search_batch",
+            {
+                "queries": [
+                    {"query": "q", "search_engine": "bing"},
+                    {"query": "q", "search_engine": "duckduckgo"},
+                ]
+            },
+        )
+        # 引擎不同不算重复
+        assert bing.await_count == 1 and len(ddg) == 1
+        assert (
+            "https://bing.com/r" in result[0].text
+            and "https://q.com/0" in result[0].text
+        )
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(server, "BATCH_CONCURRENCY", 2)
+        active = peak = 0
+
+        async def search(self_inner, query, max_results=10):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return []
+
+        monkeypatch.setattr(WebSearcher, "search_duckduckgo", search)
+        await server.handle_call_tool(
+            "web_search_batch",
+            {"queries": [f"q{i}" for i in range(6)], "search_engine": "duckduckgo"},
+        )
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_empty_and_oversized_batches_rejected(self, monkeypatch):
+        result = await server.handle_call_tool("web_search_batch", {"queries": []})
+        assert "不能为空" in result[0].text
+        result = await server.handle_call_tool(
+            "web_search_batch", {"queries": [{"query": " "}]}
+        )
+        assert "不能为空" in result[0].text
+        monkeypatch.setattr(server, "BATCH_MAX_QUERIES", 2)
+        result = await server.handle_call_tool(
+            "web_search_batch", {"queries": ["a", "b", "c"]}
+        )
+        assert "最多 2 个" in result[0].text
+
+    @pytest.mark.asyncio
+    async def test_deadline_returns_completed_queries(self, monkeypatch):
+        async def search(self_inner, query, max_results=10):
+            if query == "slow":
+                await asyncio.sleep(5)
+            return [
+                {
+                    "title": query,
+                    "url": f"https://{query}.com",
+                    "snippet": "",
+                    "type": "x",
+                }
+            ]
+
+        monkeypatch.setattr(WebSearcher, "search_duckduckgo", search)
+        result = await server.handle_call_tool(
+            "web_search_batch",
+            {
+                "queries": ["fast", "slow"],
+                "search_engine": "duckduckgo",
+                "deadline_ms": 100,
+            },
+        )
+        assert "https://fast.com" in result[0].text
+        assert "未完成" in result[0].text
+
+    @pytest.mark.asyncio
+    async def test_stream_notifies_each_query(self, ddg):
+        from types import SimpleNamespace
+
+        from mcp.server.lowlevel.server import request_ctx
+
+        session = MagicMock()
+        session.send_log_message = AsyncMock()
+        session.send_progress_notification = AsyncMock()
+        token = request_ctx.set(
+            SimpleNamespace(request_id=1, meta=None, session=session)
+        )
+        try:
+            await server.handle_call_tool(
+                "web_search_batch",
+                {
+                    "queries": ["a", "b", "a"],
+                    "search_engine": "duckduckgo",
+                    "stream": True,
+                },
+            )
+        finally:
+            request_ctx.reset(token)
+        streamed = sorted(
+            c.kwargs["data"]["query"] for c in session.send_log_message.await_args_list
+        )
+        assert streamed == ["a", "b"]
+
+
+@pytest.mark.usefixtures("close_session")
+class TestGetWebpageContentBatch:
+    """get_webpage_content_batch 批量获取网页测试"""
+
+    @pytest.fixture
+    def pages(self, monkeypatch):
+        calls = []
+
+        async def get_page_content(self_inner, url):
+            calls.append(url)
+            await asyncio.sleep(0.01)
+            return "" if "empty" in url else f"content of {url}"
+
+        monkeypatch.setattr(WebSearcher, "get_page_content", get_page_content)
+        return calls
+
+    @pytest.mark.asyncio
+    async def test_per_url_content_and_errors(self, pages):
+        result = await server.handle_call_tool(
+            "get_webpage_content_batch",
+            {
+                "urls": [
+                    "https://a.example.com/1",
+                    "http://127.0.0.1/admin",
+                    "https://b.example.com/empty",
+                    "https://a.example.com/1",
+                ]
+            },
+        )
+        text = result[0].text
+        assert "批量获取网页: 3 个 URL" in text
+        assert "content of https://a.example.com/1" in text
+        assert "URL 不安全" in text
+        assert "无法获取网页内容" in text
+        assert "耗时:" in text
+        # 不安全的 URL 不发起请求，重复的 URL 只下载一次
+        assert sorted(pages) == [
+            "https://a.example.com/1",
+            "https://b.example.com/empty",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_per_host_concurrency_cap(self, monkeypatch):
+        monkeypatch.setattr(server, "BATCH_PER_HOST", 2)
+        active: dict[str, int] = {}
+        peak: dict[str, int] = {}
+
+        async def get_page_content(self_inner, url):
+            host = urlparse(url).hostname
+            active[host] = active.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), active[host])
+            await asyncio.sleep(0.01)
+            active[host] -= 1
+            return "ok"
+
+        monkeypatch.setattr(WebSearcher, "get_page_content", get_page_content)
+        urls = [f"https://a.example.com/{i}" for i in range(5)] + [
+            f"https://b.example.com/{i}" for i in range(3)
+        ]
+        await server.handle_call_tool("get_webpage_content_batch", {"urls": urls})
+        assert peak == {"a.example.com": 2, "b.example.com": 2}
+
+    @pytest.mark.asyncio
+    async def test_deadline_marks_unfinished(self, monkeypatch):
+        async def get_page_content(self_inner, url):
+            if "slow" in url:
+                await asyncio.sleep(5)
+            return "done"
+
+        monkeypatch.setattr(WebSearcher, "get_page_content", get_page_content)
+        result = await server.handle_call_tool(
+            "get_webpage_content_batch",
+            {
+                "urls": ["https://fast.example.com", "https://slow.example.com"],
+                "deadline_ms": 100,
+            },
+        )
+        assert "内容:\ndone" in result[0].text
+        assert "未完成" in result[0].text
+
+    @pytest.mark.asyncio
+    async def test_invalid_batches_rejected(self, monkeypatch):
+        result = await server.handle_call_tool(
+            "get_webpage_content_batch", {"urls": []}
+        )
+        assert "不能为空" in result[0].text
+        monkeypatch.setattr(server, "BATCH_MAX_URLS", 1)
+        result = await server.handle_call_tool(
+            "get_webpage_content_batch", {"urls": ["https://a.com", "https://b.com"]}
+        )
+        assert "最多 1 个" in result[0].text
+
+
+@pytest.mark.usefixtures("close_session")
+class TestSearchAndRead:
+    """search_and_read 搜索并读取网页测试"""
+
+    @pytest.fixture
+    def engines(self, monkeypatch):
+        monkeypatch.setattr(server, "SERPAPI_KEY", None)
+        monkeypatch.setattr(server, "TAVILY_API_KEY", None)
+        monkeypatch.setattr(server, "HEDGE_ENABLED", False)
+
+        def engine(name, delay):
+            async def search(self_inner, query, max_results=10):
+                await asyncio.sleep(delay)
+                return [
+                    {
+                        "title": f"{name}{i}",
+                        "url": f"https://{name}.com/{i}",
+                        "snippet": "",
+                        "type": "x",
+                    }
+                    for i in range(3)
+                ]
+
+            return search
+
+        monkeypatch.setattr(WebSearcher, "search_duckduckgo", engine("ddg", 0.2))
+        monkeypatch.setattr(WebSearcher, "search_google", engine("google", 0.0))
+        monkeypatch.setattr(WebSearcher, "search_bing", engine("bing", 0.0))
+
+    @pytest.mark.asyncio
+    async def test_excerpts_attached_to_top_results(self, engines, monkeypatch):
+        async def get_page_content(self_inner, url):
+            return f"body of {url} " * 10
+
+        monkeypatch.setattr(WebSearcher, "get_page_content", get_page_content)
+        monkeypatch.setattr(server, "READ_EXCERPT_CHARS", 24)
+        result = await server.handle_call_tool(
+            "search_and_read", {"query": "q", "read_count": 2, "search_engine": "both"}
+        )
+        text = result[0].text
+        # 合并后排在前面的是 DuckDuckGo 的结果
+        assert text.count("内容摘录:") == 2
+        assert "内容摘录: body of https://ddg.com/\n" in text
+
+    @pytest.mark.asyncio
+    async def test_page_fetches_start_before_merge(self, engines, monkeypatch):
+        started = []
+        loop = asyncio.get_running_loop()
+
+        async def get_page_content(self_inner, url):
+            started.append((url, loop.time()))
+            await asyncio.sleep(0.3)
+            return "body"
+
+        monkeypatch.setattr(WebSearcher, "get_page_content", get_page_content)
+        begin = loop.time()
+        await server.handle_call_tool(
+            "search_and_read", {"query": "q", "read_count": 1, "search_engine": "both"}
+        )
+        # Google/必应先返回，其网页在 DuckDuckGo 完成之前就已开始下载
+        assert any(
+            url.startswith("https://google.com") and t - begin < 0.2
+            for url, t in started
+        )
+        # 最终只读取合并后的第一个结果，提前开始的其余下载被取消
+        elapsed = loop.time() - begin
+        assert elapsed < 0.7
+
+    @pytest.mark.asyncio
+    async def test_deadline_bounds_page_reads(self, engines, monkeypatch):
+        async def get_page_content(self_inner, url):
+            await asyncio.sleep(5)
+            return "body"
+
+        monkeypatch.setattr(WebSearcher, "get_page_content", get_page_content)
+        result = await server.handle_call_tool(
+            "search_and_read",
+            {
+                "query": "q",
+                "read_count": 1,
+                "search_engine": "google",
+                "deadline_ms": 200,
+            },
+        )
+        assert "https://google.com/0" in result[0].text
+        assert "无法获取网页内容" in result[0].text
+
+    @pytest.mark.asyncio
+    async def test_empty_query(self):
+        result = await server.handle_call_tool("search_and_read", {"query": ""})
+        assert "不能为空" in result[0].text
+
+
+@pytest.mark.usefixtures("close_session")
+class TestPrefetch:
+    """搜索结果网页后台预取测试"""
+
+    @pytest.fixture(autouse=True)
+    def prefetch(self, monkeypatch):
+        monkeypatch.setattr(server, "PREFETCH_COUNT", 2)
+        monkeypatch.setattr(server, "PREFETCH_PER_HOST", 1)
+        monkeypatch.setattr(WebSearcher, "_metrics", server.Counter())
+        monkeypatch.setattr(WebSearcher, "_prefetch_logged", 0)
+        WebSearcher._page_cache.clear()
+        WebSearcher._prefetched.clear()
+        WebSearcher._prefetch_queued.clear()
+        yield
+        WebSearcher._page_cache.clear()
+        WebSearcher._prefetched.clear()
+        WebSearcher._prefetch_queued.clear()
+
+    @pytest.fixture
+    def fetch(self, monkeypatch):
+        calls = []
+
+        async def fetch_page(self_inner, url, page=None):
+            calls.append(url)
+            await asyncio.sleep(0.01)
+            return f"content of {url}"
+
+        monkeypatch.setattr(WebSearcher, "_fetch_page_content", fetch_page)
+        return calls
+
+    async def drain(self):
+        await asyncio.gather(*WebSearcher._prefetch_tasks)
+
+    @pytest.mark.asyncio
+    async def test_web_search_prefetches_top_results(self, fetch, monkeypatch):
+        monkeypatch.setattr(server, "SERPAPI_KEY", None)
+        monkeypatch.setattr(server, "TAVILY_API_KEY", None)
+        monkeypatch.setattr(
+            WebSearcher,
+            "search_duckduckgo",
+            AsyncMock(
+                return_value=[
+                    {
+                        "title": str(i),
+                        "url": f"https://h{i}.com/p",
+                        "snippet": "",
+                        "type": "x",
+                    }
+                    for i in range(4)
+                ]
+            ),
+        )
+        await server.handle_call_tool(
+            "web_search", {"query": "q", "search_engine": "duckduckgo"}
+        )
+        await self.drain()
+        assert sorted(fetch) == ["https://h0.com/p", "https://h1.com/p"]
+
+        # 随后的读取命中缓存，不再下载
+        result = await server.handle_call_tool(
+            "get_webpage_content", {"url": "https://h0.com/p"}
+        )
+        assert "content of https://h0.com/p" in result[0].text
+        assert len(fetch) == 2
+        stats = WebSearcher.get_prefetch_stats()
+        assert stats["hits"] == 1 and stats["pending"] == 1
+
+    @pytest.mark.asyncio
+    async def test_per_host_limit(self, fetch):
+        scheduled = WebSearcher.schedule_prefetch(
+            ["https://a.com/1", "https://a.com/2"]
+        )
+        assert scheduled == 1
+        assert WebSearcher.get_metrics()["prefetch.skipped_host"] == 1
+        await self.drain()
+        assert WebSearcher._prefetch_hosts == {}
+
+    @pytest.mark.asyncio
+    async def test_byte_budget(self, fetch, monkeypatch):
+        monkeypatch.setattr(server, "PREFETCH_MAX_BYTES", server.PREFETCH_PENDING_BYTES)
+        assert (
+            WebSearcher.schedule_prefetch(["https://a.com/1", "https://b.com/1"]) == 1
+        )
+        assert WebSearcher.get_metrics()["prefetch.skipped_budget"] == 1
+
+    @pytest.mark.asyncio
+    async def test_malformed_url_skipped(self, fetch, monkeypatch):
+        """无法处理的 URL 只跳过，不影响其余 URL 的预取"""
+        canonicalize = WebSearcher._canonicalize_url
+
+        def fragile(url):
+            if "bad" in url:
+                raise ValueError("Port could not be cast to integer value")
+            return canonicalize(url)
+
+        monkeypatch.setattr(WebSearcher, "_canonicalize_url", staticmethod(fragile))
+        assert (
+            WebSearcher.schedule_prefetch(["http://bad.com:abc/", "https://a.com/1"])
+            == 1
+        )
+        await self.drain()
+        assert fetch == ["https://a.com/1"]
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self, fetch, monkeypatch):
+        monkeypatch.setattr(server, "PREFETCH_COUNT", 0)
+        assert WebSearcher.schedule_prefetch(["https://a.com/1"]) == 0
+
+    @pytest.mark.asyncio
+    async def test_evicted_prefetch_counts_as_waste(self, fetch):
+        WebSearcher.schedule_prefetch(["https://a.com/1", "https://b.com/1"])
+        await self.drain()
+        await WebSearcher().get_page_content("https://a.com/1")
+        WebSearcher._page_cache.clear()
+        stats = WebSearcher.get_prefetch_stats()
+        assert stats["hits"] == 1 and stats["wasted"] == 1
+        assert stats["hit_ratio"] == 0.5 and stats["waste_ratio"] == 0.5
+
+    @pytest.mark.asyncio
+    async def test_prefetch_ignores_call_deadline(self, monkeypatch):
+        async def fetch_page(self_inner, url, page=None):
+            await asyncio.sleep(0.1)
+            return "late content"
+
+        monkeypatch.setattr(WebSearcher, "_fetch_page_content", fetch_page)
+        with server._deadline_scope(10):
+            WebSearcher.schedule_prefetch(["https://a.com/1"])
+        await self.drain()
+        assert WebSearcher.get_prefetch_stats()["pending_bytes"] > 0
+
+    @pytest.mark.asyncio
+    async def test_read_before_prefetch_starts_is_not_a_hit(self, fetch, monkeypatch):
+        """读取时预取还在通道中排队：由读取自己下载，不计为命中"""
+        monkeypatch.setattr(server, "PREFETCH_CONCURRENCY", 1)
+        monkeypatch.setattr(WebSearcher, "_prefetch_lane", None)
+        WebSearcher.schedule_prefetch(["https://a.com/1", "https://b.com/1"])
+        await asyncio.sleep(0)
+        await WebSearcher().get_page_content("https://b.com/1")
+        await self.drain()
+        assert sorted(fetch) == ["https://a.com/1", "https://b.com/1"]
+        stats = WebSearcher.get_prefetch_stats()
+        assert stats["hits"] == 0 and stats["late"] == 1
+        assert stats["hit_ratio"] == 0.0
+
+    @pytest.mark.asyncio
+    async def test_stats_logged(self, fetch, caplog):
+        """命中/浪费统计写入日志，stdio 部署也能看到；没有变化时不重复记录"""
+        WebSearcher.schedule_prefetch(["https://a.com/1"])
+        await self.drain()
+        await WebSearcher().get_page_content("https://a.com/1")
+        with caplog.at_level("INFO", logger="web-search-server"):
+            WebSearcher._log_prefetch_stats()
+            WebSearcher._log_prefetch_stats()
+        lines = [r.message for r in caplog.records if "预取统计" in r.message]
+        assert len(lines) == 1
+        assert "命中 1" in lines[0] and "命中率 1.0" in lines[0]